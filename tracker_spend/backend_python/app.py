@@ -1,145 +1,85 @@
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Blueprint, current_app, request, jsonify, send_from_directory, Response, stream_with_context
 from flask_cors import CORS
-import mysql.connector
 from mysql.connector import Error
-import json
 from datetime import datetime, timedelta
 import os
 import tempfile
 import logging
-from csv_parser import CSVTransactionParser
-from transaction_service import TransactionService
-from category_service import CategoryService
-from budget_service import BudgetService
-from goal_service import GoalService
-from dashboard_service import DashboardService
-from railway_config import get_database_config, get_jwt_config, get_cors_config
-
-app = Flask(__name__)
-
-# Configurazione CORS per Railway
-cors_config = get_cors_config()
-CORS(app, resources={
-    r"/api/*": {
-        "origins": cors_config['origins'],
-        "methods": cors_config['methods'],
-        "allow_headers": cors_config['allow_headers']
-    }
-})
+from db import get_connection
+import metrics
+import sql_debug
+import profiler
+from profiler import profiled
+from memory_profile import ImportMemoryTracker
+from services import (
+    get_db_config, get_transaction_service, get_category_service,
+    get_budget_service, get_goal_service, get_dashboard_service, get_transaction_exporter,
+    get_upload_job_service, get_upload_session_store, get_delete_job_service
+)
+from delete_job_service import DELETE_BACKGROUND_THRESHOLD
+from upload_job_service import UploadJobConflict
+from upload_sessions import UploadSessionError
+from upload_import import import_file
+from railway_config import get_cors_config
 
 # Configurazione logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Database configuration per Railway
-DB_CONFIG = get_database_config()
-
-# Inizializza servizi
-csv_parser = CSVTransactionParser()
-transaction_service = TransactionService(DB_CONFIG)
-category_service = CategoryService(DB_CONFIG)
-budget_service = BudgetService(DB_CONFIG)
-goal_service = GoalService(DB_CONFIG)
-dashboard_service = DashboardService(DB_CONFIG)
-
-# Crea tabelle se non esistono
-transaction_service.create_transactions_table()
-category_service.create_categories_table()
-budget_service.create_budgets_table()
-goal_service.create_goals_table()
+DB_CONFIG = get_db_config()
+
+# Tutte le route dell'API; i servizi sono creati al primo utilizzo (vedi services.py)
+api = Blueprint('api', __name__)
+
+def create_app(check_schema: bool = True) -> Flask:
+    """Application factory: configura Flask e registra le route senza toccare il database"""
+    app = Flask(__name__)
+
+    # Configurazione CORS per Railway
+    cors_config = get_cors_config()
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": cors_config['origins'],
+            "methods": cors_config['methods'],
+            "allow_headers": cors_config['allow_headers']
+        }
+    })
 
+    # Prima del blueprint, così anche le preflight gestite da handle_preflight sono misurate
+    metrics.init_app(app)
+    sql_debug.init_app(app)
+    profiler.init_app(app)
+    app.register_blueprint(api)
 
+    if check_schema:
+        # Lo schema è gestito da migrations.py: all'avvio solo un controllo di versione, nessuna DDL
+        from migrations import check_schema_version
+        check_schema_version(DB_CONFIG)
 
-# Crea tabelle per autenticazione e preferenze
-def create_auth_tables():
-    """Create authentication and user preference tables"""
-    connection = get_db_connection()
-    if not connection:
-        return False
+    return app
 
-    try:
-        cursor = connection.cursor()
-        
-        # Create users table first
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(50) UNIQUE NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                first_name VARCHAR(50),
-                last_name VARCHAR(50),
-                phone VARCHAR(20),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                is_active BOOLEAN DEFAULT TRUE,
-                role ENUM('user', 'admin') DEFAULT 'user'
-            )
-        """)
-        
-        # Create user_sessions table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_sessions (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL,
-                token VARCHAR(255) NOT NULL UNIQUE,
-                expires_at TIMESTAMP NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create user_preferences table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_preferences (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                user_id INT NOT NULL UNIQUE,
-                timezone VARCHAR(50) DEFAULT 'UTC',
-                notifications_enabled BOOLEAN DEFAULT TRUE,
-                currency VARCHAR(3) DEFAULT 'EUR',
-                language VARCHAR(5) DEFAULT 'it',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-            )
-        """)
-        
-        connection.commit()
-        cursor.close()
-        connection.close()
-        logger.info("Authentication tables created successfully")
-        return True
-
-    except Error as e:
-        logger.error(f"Error creating authentication tables: {e}")
-        if connection:
-            connection.close()
-        return False
-
-@app.before_request
+@api.before_app_request
 def handle_preflight():
     """Gestisce le richieste OPTIONS preflight"""
     if request.method == "OPTIONS":
         response = jsonify({'status': 'ok'})
         response.headers.add('Access-Control-Allow-Origin', 'http://localhost:5173')
-        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
+        response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization,Content-Range,Idempotency-Key')
         response.headers.add('Access-Control-Allow-Methods', 'GET,POST,PUT,DELETE,OPTIONS')
         return response
 
 def get_db_connection():
     """Create database connection"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
+        connection = get_connection(DB_CONFIG)
         return connection
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
 
-# Crea tabelle per autenticazione e preferenze
-create_auth_tables()
-
-@app.route('/health', methods=['GET'])
-@app.route('/api/health', methods=['GET'])
+@api.route('/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint per Railway"""
     try:
@@ -160,7 +100,7 @@ def health_check():
         'environment': os.environ.get('NODE_ENV', 'development')
     })
 
-@app.route('/api/auth/register', methods=['POST'])
+@api.route('/api/auth/register', methods=['POST'])
 def register():
     """User registration endpoint"""
     try:
@@ -238,7 +178,7 @@ def register():
         logger.error(f"Registration error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/login', methods=['POST'])
+@api.route('/api/auth/login', methods=['POST'])
 def login():
     """User login endpoint"""
     try:
@@ -296,7 +236,7 @@ def login():
         logger.error(f"Login error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/logout', methods=['POST'])
+@api.route('/api/auth/logout', methods=['POST'])
 def logout():
     """User logout endpoint"""
     try:
@@ -329,7 +269,7 @@ def logout():
         logger.error(f"Logout error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/me', methods=['GET'])
+@api.route('/api/auth/me', methods=['GET'])
 def get_current_user():
     """Get current user information"""
     try:
@@ -365,7 +305,7 @@ def get_current_user():
         logger.error(f"Get current user error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/profile', methods=['PUT'])
+@api.route('/api/auth/profile', methods=['PUT'])
 def update_user_profile():
     """Update user profile information"""
     try:
@@ -419,7 +359,7 @@ def update_user_profile():
         logger.error(f"Update profile error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/auth/preferences', methods=['PUT'])
+@api.route('/api/auth/preferences', methods=['PUT'])
 def update_user_preferences():
     """Update user preferences"""
     try:
@@ -475,9 +415,15 @@ def update_user_preferences():
         logger.error(f"Update preferences error: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/transactions/upload', methods=['POST', 'OPTIONS'])
+@api.route('/api/transactions/upload', methods=['POST', 'OPTIONS'])
+@profiled
 def upload_transactions():
-    """Endpoint per l'upload di file CSV e Excel di estratti conto"""
+    """Endpoint per l'upload di file CSV e Excel di estratti conto.
+
+    Con l'header Idempotency-Key un nuovo invio dello stesso file non duplica le
+    transazioni: se l'upload era completato si riceve il risultato salvato, se si
+    era interrotto riprende dall'ultimo blocco committato.
+    """
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'}), 200
         
@@ -492,110 +438,331 @@ def upload_transactions():
         if not user_id:
             return jsonify({'error': 'Token non valido'}), 401
         
-        # Verifica presenza del file
-        if 'file' not in request.files:
-            return jsonify({'error': 'Nessun file caricato'}), 400
+        idempotency_key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+        return _handle_upload_request(user_id, idempotency_key)
+                
+    except Exception as e:
+        logger.error(f"Errore upload transazioni: {e}")
+        logger.error(f"Tipo di errore: {type(e)}")
+        import traceback
+        logger.error(f"Traceback completo: {traceback.format_exc()}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/uploads', methods=['GET', 'OPTIONS'])
+def list_uploads():
+    """Ultimi upload dell'utente con stato e checkpoint"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
+        
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
+        
+        idempotency_key = request.args.get('idempotency_key')
+        if idempotency_key:
+            job = get_upload_job_service().find_job(user_id, idempotency_key)
+            return jsonify({'uploads': [job] if job else []}), 200
         
-        file = request.files['file']
-        if file.filename == '':
-            return jsonify({'error': 'Nessun file selezionato'}), 400
+        limit = min(request.args.get('limit', 20, type=int), 100)
+        return jsonify({'uploads': get_upload_job_service().list_jobs(user_id, limit)}), 200
         
-        # Verifica estensione
-        file_extension = file.filename.lower()
-        if not (file_extension.endswith('.csv') or file_extension.endswith('.xlsx') or file_extension.endswith('.xls')):
-            return jsonify({'error': 'Solo file CSV e Excel (.csv, .xlsx, .xls) sono supportati'}), 400
+    except Exception as e:
+        logger.error(f"Errore lista upload: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/uploads/<int:upload_id>', methods=['GET', 'OPTIONS'])
+def get_upload(upload_id):
+    """Stato di un upload: status, righe committate, risultato se completato"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
         
-        # Determina l'estensione per il file temporaneo
-        temp_suffix = '.csv' if file_extension.endswith('.csv') else '.xlsx'
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
         
-        # Salva file temporaneo
-        with tempfile.NamedTemporaryFile(delete=False, suffix=temp_suffix) as temp_file:
-            file.save(temp_file.name)
-            temp_file_path = temp_file.name
+        job = get_upload_job_service().get_job(user_id, upload_id)
+        if not job:
+            return jsonify({'error': 'Upload non trovato'}), 404
+        return jsonify({'upload': job}), 200
+        
+    except Exception as e:
+        logger.error(f"Errore recupero upload {upload_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/uploads/<int:upload_id>/resume', methods=['POST', 'OPTIONS'])
+def resume_upload(upload_id):
+    """Riprende un upload interrotto: il client reinvia lo stesso file"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
+        
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
+        
+        job = get_upload_job_service().get_job(user_id, upload_id)
+        if not job:
+            return jsonify({'error': 'Upload non trovato'}), 404
+        return _handle_upload_request(user_id, job['idempotency_key'])
+        
+    except Exception as e:
+        logger.error(f"Errore ripresa upload {upload_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# ============================================================================
+# UPLOAD A BLOCCHI (file grandi: init -> PUT blocchi -> finalize)
+# ============================================================================
+
+@api.route('/api/uploads/sessions', methods=['POST', 'OPTIONS'])
+def create_upload_session():
+    """Apre una sessione di upload a blocchi.
+
+    Corpo JSON: filename, size (byte), sha256 (opzionale qui, obbligatorio entro
+    il finalize), mode, skip_duplicates, idempotency_key. Risponde con session_id e chunk_size.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
+        
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
+        
+        data = request.get_json(silent=True) or {}
+        mode = (data.get('mode') or 'partial').lower()
+        if mode not in ('partial', 'strict'):
+            return jsonify({'error': "Modalità non valida: usare 'partial' o 'strict'"}), 400
+        
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key and len(idempotency_key) > 64:
+            return jsonify({'error': 'Idempotency-Key troppo lunga (massimo 64 caratteri)'}), 400
+        
+        # Le righe già presenti nel database vengono saltate, salvo skip_duplicates: false
+        skip_duplicates = data.get('skip_duplicates', True) not in (False, 'false')
+        
+        session = get_upload_session_store().create(
+            user_id, data.get('filename'), data.get('size'), data.get('sha256'), mode, idempotency_key,
+            skip_duplicates
+        )
+        return jsonify({'session': session}), 201
+        
+    except UploadSessionError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+    except Exception as e:
+        logger.error(f"Errore creazione sessione di upload: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/uploads/sessions/<session_id>', methods=['GET', 'OPTIONS'])
+def get_upload_session(session_id):
+    """Byte ricevuti della sessione: il client riprende a inviare da `received`"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
+        
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
+        
+        return jsonify({'session': get_upload_session_store().get(user_id, session_id)}), 200
+        
+    except UploadSessionError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+    except Exception as e:
+        logger.error(f"Errore recupero sessione di upload {session_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/uploads/sessions/<session_id>', methods=['PUT'])
+def upload_session_chunk(session_id):
+    """Riceve un blocco grezzo (application/octet-stream) all'offset indicato.
+
+    L'offset arriva da `Content-Range: bytes <inizio>-<fine>/<totale>` o dal
+    parametro `offset`. Il corpo è copiato su disco a pezzi senza bufferizzarlo.
+    """
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
+        
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
+        
+        offset = _chunk_offset()
+        if offset is None:
+            return jsonify({'error': 'Offset mancante: usare Content-Range o il parametro offset'}), 400
         
+        session = get_upload_session_store().write_chunk(
+            user_id, session_id, offset, request.content_length, request.stream
+        )
+        return jsonify({'session': session}), 200
+        
+    except UploadSessionError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+    except Exception as e:
+        logger.error(f"Errore scrittura blocco sessione {session_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/uploads/sessions/<session_id>', methods=['DELETE'])
+def delete_upload_session(session_id):
+    """Annulla la sessione e rimuove i byte ricevuti"""
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
+        
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
+        
+        store = get_upload_session_store()
+        store.get(user_id, session_id)
+        store.delete(session_id)
+        return jsonify({'message': 'Sessione di upload annullata'}), 200
+        
+    except UploadSessionError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
+    except Exception as e:
+        logger.error(f"Errore eliminazione sessione {session_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/uploads/sessions/<session_id>/finalize', methods=['POST', 'OPTIONS'])
+@profiled
+def finalize_upload_session(session_id):
+    """Verifica dimensione e sha256 del file assemblato e ne mette in coda l'import.
+
+    L'import di un file grande supera il timeout di una richiesta: lo esegue
+    job_worker.py e la risposta è 202 con upload_id, il cui stato (e a import
+    concluso il risultato) è su GET /api/uploads/<upload_id>. Come idempotency
+    key si usa quella dell'init o, in mancanza, il session_id: ripetere il
+    finalize dopo un errore rimette il job in coda e riprende dal checkpoint.
+    """
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
+        
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
+        
+        data = request.get_json(silent=True) or {}
+        store = get_upload_session_store()
+        session = store.verify(user_id, session_id, data.get('sha256'))
         try:
-            logger.info("=== INIZIO PROCESSING UPLOAD ===")
-            logger.info(f"File ricevuto: {file.filename}")
-            logger.info(f"Tipo file: {temp_suffix}")
-            logger.info(f"Path temporaneo: {temp_file_path}")
-            
-            # Parsa il file (CSV o Excel)
-            logger.info(f"1. Parsing file: {file.filename} (tipo: {temp_suffix})")
-            try:
-                transactions = csv_parser.parse_file(temp_file_path)
-                logger.info(f"2. Transazioni parsate: {len(transactions)}")
-                if transactions:
-                    logger.info(f"3. Prima transazione: {transactions[0]}")
-                    logger.info(f"3b. Chiavi prima transazione: {list(transactions[0].keys())}")
-                else:
-                    logger.warning("3. Nessuna transazione parsata!")
-            except Exception as parse_error:
-                logger.error(f"Errore durante il parsing: {parse_error}")
-                return jsonify({
-                    'error': 'Errore durante il parsing del file',
-                    'details': [str(parse_error)]
-                }), 400
-            
-            # Valida le transazioni
-            logger.info("4. Inizio validazione transazioni")
-            validation_result = csv_parser.validate_transactions(transactions)
-            logger.info(f"5. Risultato validazione: {validation_result}")
-            logger.info(f"6. Tipo risultato validazione: {type(validation_result)}")
-            logger.info(f"7. Chiavi risultato validazione: {validation_result.keys() if isinstance(validation_result, dict) else 'Non è un dict'}")
-            
-            if not validation_result['valid']:
-                logger.error(f"8. Validazione fallita: {validation_result}")
-                logger.info(f"9. Stats: {validation_result.get('stats', 'Stats non trovato')}")
-                logger.info(f"9b. Errori: {validation_result.get('stats', {}).get('errors', 'Errori non trovati')}")
-                return jsonify({
-                    'error': 'Errore nella validazione del file',
-                    'details': validation_result.get('stats', {}).get('errors', ['Errore sconosciuto'])
-                }), 400
-            
-            logger.info("10. Validazione completata con successo")
-            
-            # Salva nel database
-            logger.info("11. Inizio salvataggio nel database")
-            save_result = transaction_service.save_transactions(user_id, validation_result['transactions'])
-            logger.info(f"12. Risultato salvataggio: {save_result}")
-            
-            if not save_result['success']:
-                logger.error(f"13. Salvataggio fallito: {save_result}")
-                return jsonify({
-                    'error': 'Errore nel salvataggio delle transazioni',
-                    'details': save_result.get('error', 'Errore sconosciuto')
-                }), 500
-            
-            logger.info("14. Salvataggio completato con successo")
-            
-            # Prepara risposta
-            logger.info("15. Preparazione risposta")
-            response_data = {
-                'success': True,
-                'message': f'Caricati {save_result["saved_count"]} transazioni con successo',
-                'stats': validation_result['stats'],
-                'saved_count': save_result['saved_count'],
-                'total_count': save_result['total_count'],
-                'errors': save_result.get('errors', [])
-            }
-            
-            logger.info(f"16. Upload completato per utente {user_id}: {save_result['saved_count']} transazioni salvate")
-            logger.info("=== FINE PROCESSING UPLOAD ===")
-            return jsonify(response_data), 200
-            
-        finally:
-            # Pulisci file temporaneo
-            if os.path.exists(temp_file_path):
-                os.unlink(temp_file_path)
-                
+            job = get_upload_job_service().enqueue_job(
+                user_id, session['idempotency_key'] or session_id, session['filename'],
+                session['sha256'], session_id
+            )
+        except UploadJobConflict as conflict:
+            return jsonify({'error': str(conflict), 'session_id': session_id}), 409
+        
+        if job['status'] == 'completed':
+            store.delete(session_id)
+            return jsonify({**(job['result'] or {}), 'upload_id': job['id'], 'replayed': True,
+                            'session_id': session_id}), 200
+        return jsonify({
+            'success': True,
+            'upload_id': job['id'],
+            'status': job['status'],
+            'session_id': session_id
+        }), 202
+        
+    except UploadSessionError as e:
+        return jsonify({'error': str(e), **e.details}), e.status
     except Exception as e:
-        logger.error(f"Errore upload transazioni: {e}")
-        logger.error(f"Tipo di errore: {type(e)}")
+        logger.error(f"Errore finalize sessione {session_id}: {e}")
         import traceback
         logger.error(f"Traceback completo: {traceback.format_exc()}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/transactions', methods=['GET', 'OPTIONS'])
+def _chunk_offset():
+    """Offset del blocco da Content-Range (bytes 0-1023/4096) o dal parametro offset"""
+    content_range = request.headers.get('Content-Range')
+    if content_range:
+        try:
+            unit, _, spec = content_range.partition(' ')
+            return int(spec.split('-', 1)[0]) if unit == 'bytes' else None
+        except ValueError:
+            return None
+    return request.args.get('offset', type=int)
+
+def _handle_upload_request(user_id, idempotency_key):
+    """Controlla il file multipart, lo salva su disco e lo passa alla pipeline di import"""
+    # Verifica presenza del file
+    if 'file' not in request.files:
+        return jsonify({'error': 'Nessun file caricato'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'Nessun file selezionato'}), 400
+    
+    # Verifica estensione
+    file_extension = file.filename.lower()
+    if not (file_extension.endswith('.csv') or file_extension.endswith('.xlsx') or file_extension.endswith('.xls')):
+        return jsonify({'error': 'Solo file CSV e Excel (.csv, .xlsx, .xls) sono supportati'}), 400
+    
+    # partial (default): salva le righe valide e riporta gli scarti; strict: tutto o niente
+    mode = (request.form.get('mode') or request.args.get('mode') or 'partial').lower()
+    if mode not in ('partial', 'strict'):
+        return jsonify({'error': "Modalità non valida: usare 'partial' o 'strict'"}), 400
+    
+    if idempotency_key and len(idempotency_key) > 64:
+        return jsonify({'error': 'Idempotency-Key troppo lunga (massimo 64 caratteri)'}), 400
+    
+    # Le righe già presenti nel database vengono saltate, salvo skip_duplicates=false
+    skip_duplicates = (request.form.get('skip_duplicates') or request.args.get('skip_duplicates')
+                       or 'true').lower() != 'false'
+    
+    # Determina l'estensione per il file temporaneo
+    temp_suffix = '.csv' if file_extension.endswith('.csv') else '.xlsx'
+    
+    # Misura dei picchi di memoria per fase, solo con IMPORT_MEMORY_DEBUG
+    memory = ImportMemoryTracker().start()
+    temp_file_path = None
+    
+    try:
+        # Salva file temporaneo
+        with memory.stage('read'):
+            with tempfile.NamedTemporaryFile(delete=False, suffix=temp_suffix) as temp_file:
+                file.save(temp_file.name)
+                temp_file_path = temp_file.name
+        
+        body, status = import_file(user_id, temp_file_path, file.filename, mode, idempotency_key, memory,
+                                   skip_duplicates=skip_duplicates)
+        return jsonify(body), status
+        
+    finally:
+        # Pulisci file temporaneo
+        if temp_file_path and os.path.exists(temp_file_path):
+            os.unlink(temp_file_path)
+        memory.stop()
+
+@api.route('/api/transactions', methods=['GET', 'OPTIONS'])
 def get_transactions():
     """Endpoint per recuperare le transazioni di un utente"""
     if request.method == 'OPTIONS':
@@ -613,24 +780,50 @@ def get_transactions():
             return jsonify({'error': 'Token non valido'}), 401
         
         # Estrai filtri dalla query string
-        filters = {}
-        if request.args.get('start_date'):
-            filters['start_date'] = request.args.get('start_date')
-        if request.args.get('end_date'):
-            filters['end_date'] = request.args.get('end_date')
-        if request.args.get('type'):
-            filters['type'] = request.args.get('type')
-        if request.args.get('category'):
-            filters['category'] = request.args.get('category')
-        if request.args.get('min_amount'):
-            filters['min_amount'] = float(request.args.get('min_amount'))
-        if request.args.get('max_amount'):
-            filters['max_amount'] = float(request.args.get('max_amount'))
-        if request.args.get('limit'):
-            filters['limit'] = int(request.args.get('limit'))
+        filters = _transaction_filters_from_args()
+        
+        # Proiezione colonne: ?fields=id,transaction_date,amount
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()] or None
+        
+        # Streaming: ?stream=ndjson (una transazione per riga) oppure ?stream=json
+        stream_format = request.args.get('stream')
+        if stream_format in ('json', 'ndjson'):
+            chunks = get_transaction_service().iter_user_transactions(user_id, filters, fields)
+            if stream_format == 'ndjson':
+                body = _stream_ndjson(chunks)
+                mimetype = 'application/x-ndjson'
+            else:
+                body = _stream_json_list(chunks)
+                mimetype = 'application/json'
+            return Response(stream_with_context(body), mimetype=mimetype,
+                            headers={'X-Accel-Buffering': 'no'})
+        
+        # Paginazione keyset: ?page_size=N&cursor=<token>
+        if request.args.get('page_size') or request.args.get('cursor'):
+            try:
+                page = get_transaction_service().get_user_transactions_page(
+                    user_id,
+                    filters,
+                    page_size=request.args.get('page_size', 100, type=int),
+                    cursor_token=request.args.get('cursor'),
+                    fields=fields,
+                    include_total=request.args.get('include_total', 'false').lower() == 'true'
+                )
+            except ValueError as ve:
+                return jsonify({'error': str(ve)}), 400
+            
+            response_data = {
+                'success': True,
+                'transactions': page['transactions'],
+                'count': len(page['transactions']),
+                'next_cursor': page['next_cursor']
+            }
+            if 'total' in page:
+                response_data['total'] = page['total']
+            return jsonify(response_data), 200
         
         # Recupera transazioni
-        transactions = transaction_service.get_user_transactions(user_id, filters)
+        transactions = get_transaction_service().get_user_transactions(user_id, filters, fields)
         
         return jsonify({
             'success': True,
@@ -642,7 +835,53 @@ def get_transactions():
         logger.error(f"Errore recupero transazioni: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/transactions/stats', methods=['GET', 'OPTIONS'])
+def _transaction_filters_from_args():
+    """Estrae i filtri delle transazioni dalla query string (lista ed export)"""
+    filters = {}
+    if request.args.get('start_date'):
+        filters['start_date'] = request.args.get('start_date')
+    if request.args.get('end_date'):
+        filters['end_date'] = request.args.get('end_date')
+    if request.args.get('type'):
+        filters['type'] = request.args.get('type')
+    if request.args.get('category'):
+        filters['category'] = request.args.get('category')
+    if request.args.get('min_amount'):
+        filters['min_amount'] = float(request.args.get('min_amount'))
+    if request.args.get('max_amount'):
+        filters['max_amount'] = float(request.args.get('max_amount'))
+    if request.args.get('limit'):
+        filters['limit'] = int(request.args.get('limit'))
+    return filters
+
+def _stream_ndjson(chunks):
+    """Serializza i blocchi di righe come NDJSON, un blocco di testo per chunk.
+
+    Un errore del database a metà non viene intercettato: la risposta si
+    interrompe senza il chunk finale e il client vede un trasferimento incompleto.
+    """
+    for rows in chunks:
+        yield ''.join(current_app.json.dumps(row) + '\n' for row in rows)
+
+def _stream_json_list(chunks):
+    """Serializza i blocchi di righe nello stesso formato JSON di get_transactions.
+
+    success è scritto in fondo: se la lettura si interrompe il corpo termina con
+    "success": false ed error, invece di sembrare una lista completa.
+    """
+    yield '{"transactions": ['
+    count = 0
+    try:
+        for rows in chunks:
+            prefix = ',' if count else ''
+            yield prefix + ','.join(current_app.json.dumps(row) for row in rows)
+            count += len(rows)
+    except Error:
+        yield f'], "count": {count}, "success": false, "error": "Lettura delle transazioni interrotta"}}'
+        return
+    yield f'], "count": {count}, "success": true}}'
+
+@api.route('/api/transactions/stats', methods=['GET', 'OPTIONS'])
 def get_transaction_stats():
     """Endpoint per recuperare le statistiche delle transazioni"""
     if request.method == 'OPTIONS':
@@ -660,7 +899,7 @@ def get_transaction_stats():
             return jsonify({'error': 'Token non valido'}), 401
         
         # Recupera statistiche
-        stats = transaction_service.get_transaction_stats(user_id)
+        stats = get_transaction_service().get_transaction_stats(user_id)
         
         return jsonify({
             'success': True,
@@ -671,7 +910,7 @@ def get_transaction_stats():
         logger.error(f"Errore recupero statistiche: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/transactions/<int:transaction_id>', methods=['PUT', 'OPTIONS'])
+@api.route('/api/transactions/<int:transaction_id>', methods=['PUT', 'OPTIONS'])
 def update_transaction(transaction_id):
     """Endpoint per aggiornare una transazione specifica"""
     if request.method == 'OPTIONS':
@@ -694,7 +933,7 @@ def update_transaction(transaction_id):
             return jsonify({'error': 'Dati di aggiornamento richiesti'}), 400
         
         # Aggiorna transazione
-        success = transaction_service.update_transaction(user_id, transaction_id, data)
+        success = get_transaction_service().update_transaction(user_id, transaction_id, data)
         
         if success:
             return jsonify({
@@ -708,9 +947,16 @@ def update_transaction(transaction_id):
         logger.error(f"Errore aggiornamento transazione: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/transactions', methods=['DELETE', 'OPTIONS'])
+@api.route('/api/transactions', methods=['DELETE', 'OPTIONS'])
 def delete_transactions():
-    """Endpoint per eliminare transazioni"""
+    """Endpoint per eliminare transazioni.
+
+    Corpo JSON: `transaction_ids`, oppure i filtri `start_date`/`end_date`
+    (YYYY-MM-DD) e `upload_id`; senza nulla elimina tutte le transazioni.
+    L'eliminazione avviene a blocchi brevi. Con `background: true`, o per filtri
+    che coinvolgono almeno DELETE_BACKGROUND_THRESHOLD righe, risponde 202 con
+    un job da seguire su /api/transactions/delete-jobs/<id>.
+    """
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'}), 200
         
@@ -725,17 +971,57 @@ def delete_transactions():
         if not user_id:
             return jsonify({'error': 'Token non valido'}), 401
         
-        # Estrai ID transazioni da eliminare (opzionale)
-        data = request.get_json() or {}
+        # Estrai ID transazioni o filtri dell'eliminazione (opzionali)
+        data = request.get_json(silent=True) or {}
         transaction_ids = data.get('transaction_ids')
+        if transaction_ids is not None:
+            if not isinstance(transaction_ids, list) or not all(
+                isinstance(transaction_id, int) and not isinstance(transaction_id, bool)
+                for transaction_id in transaction_ids
+            ):
+                return jsonify({'error': 'transaction_ids deve essere una lista di interi'}), 400
+            transaction_ids = list(dict.fromkeys(transaction_ids))
+            # Una lista vuota non elimina nulla (senza transaction_ids si elimina tutto)
+            if not transaction_ids:
+                return jsonify({'success': True, 'message': 'Nessuna transazione da eliminare',
+                                'deleted_count': 0}), 200
+        
+        filters = {}
+        for field in ('start_date', 'end_date'):
+            if data.get(field):
+                try:
+                    filters[field] = datetime.strptime(data[field], '%Y-%m-%d').date().isoformat()
+                except (TypeError, ValueError):
+                    return jsonify({'error': f'{field} non valida (formato YYYY-MM-DD)'}), 400
+        if data.get('upload_id') is not None:
+            if not isinstance(data['upload_id'], int) or isinstance(data['upload_id'], bool):
+                return jsonify({'error': 'upload_id deve essere un intero'}), 400
+            filters['upload_id'] = data['upload_id']
+        
+        if transaction_ids and filters:
+            return jsonify({'error': 'Usare transaction_ids oppure i filtri, non entrambi'}), 400
+        
+        # Le eliminazioni per filtro grandi vanno in background
+        if not transaction_ids:
+            background = data.get('background')
+            total_rows = get_transaction_service().count_user_transactions(user_id, filters)
+            if background is None:
+                background = total_rows >= DELETE_BACKGROUND_THRESHOLD
+            if background:
+                # Lo esegue job_worker.py, fuori dai worker web
+                job = get_delete_job_service().create_job(user_id, filters, total_rows)
+                if not job:
+                    return jsonify({'error': 'Impossibile avviare l\'eliminazione in background'}), 500
+                return jsonify({'success': True, 'job': job}), 202
         
         # Elimina transazioni
-        success = transaction_service.delete_user_transactions(user_id, transaction_ids)
+        deleted_count = get_transaction_service().delete_user_transactions(user_id, transaction_ids, filters)
         
-        if success:
+        if deleted_count is not None:
             return jsonify({
                 'success': True,
-                'message': 'Transazioni eliminate con successo'
+                'message': 'Transazioni eliminate con successo',
+                'deleted_count': deleted_count
             }), 200
         else:
             return jsonify({'error': 'Errore nell\'eliminazione delle transazioni'}), 500
@@ -744,11 +1030,61 @@ def delete_transactions():
         logger.error(f"Errore eliminazione transazioni: {e}")
         return jsonify({'error': str(e)}), 500
 
+@api.route('/api/transactions/delete-jobs/<int:job_id>', methods=['GET', 'OPTIONS'])
+def get_delete_job(job_id):
+    """Stato di un'eliminazione in background: status, deleted_count su total_rows"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
+        
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
+        
+        job = get_delete_job_service().get_job(user_id, job_id)
+        if not job:
+            return jsonify({'error': 'Eliminazione non trovata'}), 404
+        return jsonify({'job': job}), 200
+        
+    except Exception as e:
+        logger.error(f"Errore recupero delete job {job_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/transactions/delete-jobs/<int:job_id>/resume', methods=['POST', 'OPTIONS'])
+def resume_delete_job(job_id):
+    """Rimette in coda un'eliminazione fallita o interrotta (worker terminato)"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+    
+    try:
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Token di autenticazione richiesto'}), 401
+        
+        user_id = get_user_id_from_token(auth_header[7:])
+        if not user_id:
+            return jsonify({'error': 'Token non valido'}), 401
+        
+        job = get_delete_job_service().get_job(user_id, job_id)
+        if not job:
+            return jsonify({'error': 'Eliminazione non trovata'}), 404
+        if not get_delete_job_service().requeue_job(user_id, job_id):
+            return jsonify({'error': 'Eliminazione già completata o in corso', 'job': job}), 409
+        return jsonify({'success': True, 'job': get_delete_job_service().get_job(user_id, job_id)}), 202
+        
+    except Exception as e:
+        logger.error(f"Errore ripresa delete job {job_id}: {e}")
+        return jsonify({'error': str(e)}), 500
+
 # ============================================================================
 # CATEGORIES ENDPOINTS
 # ============================================================================
 
-@app.route('/api/categories', methods=['GET', 'OPTIONS'])
+@api.route('/api/categories', methods=['GET', 'OPTIONS'])
 def get_categories():
     """Get all categories for the authenticated user"""
     if request.method == 'OPTIONS':
@@ -766,7 +1102,7 @@ def get_categories():
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get categories
-        categories = category_service.get_categories(user_id)
+        categories = get_category_service().get_categories(user_id)
         
         return jsonify({
             'data': categories,
@@ -777,7 +1113,7 @@ def get_categories():
         logger.error(f"Error getting categories: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/categories/<int:category_id>', methods=['GET', 'OPTIONS'])
+@api.route('/api/categories/<int:category_id>', methods=['GET', 'OPTIONS'])
 def get_category(category_id):
     """Get a specific category"""
     if request.method == 'OPTIONS':
@@ -795,7 +1131,7 @@ def get_category(category_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get category
-        category = category_service.get_category(category_id)
+        category = get_category_service().get_category(category_id)
         
         if not category:
             return jsonify({'error': 'Category not found'}), 404
@@ -806,7 +1142,7 @@ def get_category(category_id):
         logger.error(f"Error getting category {category_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/categories', methods=['POST', 'OPTIONS'])
+@api.route('/api/categories', methods=['POST', 'OPTIONS'])
 def create_category():
     """Create a new category"""
     if request.method == 'OPTIONS':
@@ -832,7 +1168,7 @@ def create_category():
         data['user_id'] = user_id
         
         # Create category
-        category = category_service.create_category(data)
+        category = get_category_service().create_category(data)
         
         if not category:
             return jsonify({'error': 'Failed to create category'}), 500
@@ -846,7 +1182,7 @@ def create_category():
         logger.error(f"Error creating category: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/categories/<int:category_id>', methods=['PUT', 'OPTIONS'])
+@api.route('/api/categories/<int:category_id>', methods=['PUT', 'OPTIONS'])
 def update_category(category_id):
     """Update a category"""
     if request.method == 'OPTIONS':
@@ -869,7 +1205,7 @@ def update_category(category_id):
             return jsonify({'error': 'Request data required'}), 400
         
         # Update category
-        category = category_service.update_category(category_id, data)
+        category = get_category_service().update_category(category_id, data)
         
         if not category:
             return jsonify({'error': 'Category not found or update failed'}), 404
@@ -883,7 +1219,7 @@ def update_category(category_id):
         logger.error(f"Error updating category {category_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/categories/<int:category_id>', methods=['DELETE', 'OPTIONS'])
+@api.route('/api/categories/<int:category_id>', methods=['DELETE', 'OPTIONS'])
 def delete_category(category_id):
     """Delete a category"""
     if request.method == 'OPTIONS':
@@ -901,7 +1237,7 @@ def delete_category(category_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Delete category
-        success = category_service.delete_category(category_id)
+        success = get_category_service().delete_category(category_id)
         
         if not success:
             return jsonify({'error': 'Category not found or cannot be deleted'}), 404
@@ -914,7 +1250,7 @@ def delete_category(category_id):
         logger.error(f"Error deleting category {category_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/categories/type/<category_type>', methods=['GET', 'OPTIONS'])
+@api.route('/api/categories/type/<category_type>', methods=['GET', 'OPTIONS'])
 def get_categories_by_type(category_type):
     """Get categories filtered by type"""
     if request.method == 'OPTIONS':
@@ -932,7 +1268,7 @@ def get_categories_by_type(category_type):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get categories by type
-        categories = category_service.get_categories_by_type(category_type, user_id)
+        categories = get_category_service().get_categories_by_type(category_type, user_id)
         
         return jsonify({
             'data': categories,
@@ -947,7 +1283,7 @@ def get_categories_by_type(category_type):
 # BUDGETS ENDPOINTS
 # ============================================================================
 
-@app.route('/api/budgets', methods=['GET', 'OPTIONS'])
+@api.route('/api/budgets', methods=['GET', 'OPTIONS'])
 def get_budgets():
     """Get all budgets for the authenticated user"""
     if request.method == 'OPTIONS':
@@ -965,7 +1301,7 @@ def get_budgets():
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get budgets
-        budgets = budget_service.get_budgets(user_id)
+        budgets = get_budget_service().get_budgets(user_id)
         
         return jsonify({
             'data': budgets,
@@ -976,7 +1312,7 @@ def get_budgets():
         logger.error(f"Error getting budgets: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/budgets/<int:budget_id>', methods=['GET', 'OPTIONS'])
+@api.route('/api/budgets/<int:budget_id>', methods=['GET', 'OPTIONS'])
 def get_budget(budget_id):
     """Get a specific budget"""
     if request.method == 'OPTIONS':
@@ -994,7 +1330,7 @@ def get_budget(budget_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get budget
-        budget = budget_service.get_budget(budget_id, user_id)
+        budget = get_budget_service().get_budget(budget_id, user_id)
         
         if not budget:
             return jsonify({'error': 'Budget not found'}), 404
@@ -1005,7 +1341,7 @@ def get_budget(budget_id):
         logger.error(f"Error getting budget {budget_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/budgets', methods=['POST', 'OPTIONS'])
+@api.route('/api/budgets', methods=['POST', 'OPTIONS'])
 def create_budget():
     """Create a new budget"""
     if request.method == 'OPTIONS':
@@ -1031,7 +1367,7 @@ def create_budget():
         data['user_id'] = user_id
         
         # Create budget
-        budget = budget_service.create_budget(data)
+        budget = get_budget_service().create_budget(data)
         
         if not budget:
             return jsonify({'error': 'Failed to create budget'}), 500
@@ -1045,7 +1381,7 @@ def create_budget():
         logger.error(f"Error creating budget: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/budgets/<int:budget_id>', methods=['PUT', 'OPTIONS'])
+@api.route('/api/budgets/<int:budget_id>', methods=['PUT', 'OPTIONS'])
 def update_budget(budget_id):
     """Update a budget"""
     if request.method == 'OPTIONS':
@@ -1068,7 +1404,7 @@ def update_budget(budget_id):
             return jsonify({'error': 'Request data required'}), 400
         
         # Update budget
-        budget = budget_service.update_budget(budget_id, user_id, data)
+        budget = get_budget_service().update_budget(budget_id, user_id, data)
         
         if not budget:
             return jsonify({'error': 'Budget not found or update failed'}), 404
@@ -1082,7 +1418,7 @@ def update_budget(budget_id):
         logger.error(f"Error updating budget {budget_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/budgets/<int:budget_id>', methods=['DELETE', 'OPTIONS'])
+@api.route('/api/budgets/<int:budget_id>', methods=['DELETE', 'OPTIONS'])
 def delete_budget(budget_id):
     """Delete a budget"""
     if request.method == 'OPTIONS':
@@ -1100,7 +1436,7 @@ def delete_budget(budget_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Delete budget
-        success = budget_service.delete_budget(budget_id, user_id)
+        success = get_budget_service().delete_budget(budget_id, user_id)
         
         if not success:
             return jsonify({'error': 'Budget not found or cannot be deleted'}), 404
@@ -1113,7 +1449,7 @@ def delete_budget(budget_id):
         logger.error(f"Error deleting budget {budget_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/budgets/<int:budget_id>/progress', methods=['GET', 'OPTIONS'])
+@api.route('/api/budgets/<int:budget_id>/progress', methods=['GET', 'OPTIONS'])
 def get_budget_progress(budget_id):
     """Get budget progress with spent amount and remaining"""
     if request.method == 'OPTIONS':
@@ -1131,7 +1467,7 @@ def get_budget_progress(budget_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get budget progress
-        progress = budget_service.get_budget_progress(budget_id, user_id)
+        progress = get_budget_service().get_budget_progress(budget_id, user_id)
         
         if not progress:
             return jsonify({'error': 'Budget not found'}), 404
@@ -1142,7 +1478,7 @@ def get_budget_progress(budget_id):
         logger.error(f"Error getting budget progress {budget_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/budgets/active', methods=['GET', 'OPTIONS'])
+@api.route('/api/budgets/active', methods=['GET', 'OPTIONS'])
 def get_active_budgets():
     """Get all active budgets with progress"""
     if request.method == 'OPTIONS':
@@ -1160,7 +1496,7 @@ def get_active_budgets():
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get active budgets
-        budgets = budget_service.get_active_budgets(user_id)
+        budgets = get_budget_service().get_active_budgets(user_id)
         
         return jsonify({
             'data': budgets,
@@ -1171,7 +1507,77 @@ def get_active_budgets():
         logger.error(f"Error getting active budgets: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/budgets/<int:budget_id>/statistics', methods=['GET', 'OPTIONS'])
+@api.route('/api/budgets/reconcile', methods=['POST', 'OPTIONS'])
+def reconcile_budgets():
+    """Recompute budget spent counters from transactions"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+
+    try:
+        # Verify authentication
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Authentication token required'}), 401
+
+        token = auth_header[7:]
+        user_id = get_user_id_from_token(token)
+        if not user_id:
+            return jsonify({'error': 'Invalid token'}), 401
+
+        # Reconcile the user's budget counters
+        corrected = get_budget_service().reconcile_spent_amounts(user_id)
+
+        return jsonify({
+            'data': {'corrected': corrected},
+            'message': 'Budget counters reconciled successfully'
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error reconciling budgets: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/budgets/progress', methods=['GET', 'POST', 'OPTIONS'])
+def get_budgets_progress():
+    """Get progress, statistics and recommendations for many budgets at once"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+        
+    try:
+        # Verify authentication
+        auth_header = request.headers.get('Authorization')
+        if not auth_header or not auth_header.startswith('Bearer '):
+            return jsonify({'error': 'Authentication token required'}), 401
+        
+        token = auth_header[7:]
+        user_id = get_user_id_from_token(token)
+        if not user_id:
+            return jsonify({'error': 'Invalid token'}), 401
+        
+        # Budget ids from JSON body (POST) or ?ids=1,2,3 (GET); none means all
+        if request.method == 'POST':
+            budget_ids = (request.get_json(silent=True) or {}).get('budget_ids')
+        else:
+            ids_param = request.args.get('ids', '')
+            budget_ids = [part for part in ids_param.split(',') if part.strip()]
+        
+        try:
+            budget_ids = [int(budget_id) for budget_id in budget_ids] if budget_ids else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'budget_ids must be a list of integers'}), 400
+        
+        # Get progress for all requested budgets
+        results = get_budget_service().get_budgets_progress(user_id, budget_ids)
+        
+        return jsonify({
+            'data': results,
+            'total': len(results)
+        }), 200
+        
+    except Exception as e:
+        logger.error(f"Error getting budgets progress: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/budgets/<int:budget_id>/statistics', methods=['GET', 'OPTIONS'])
 def get_budget_statistics(budget_id):
     """Get budget statistics (alias for progress)"""
     if request.method == 'OPTIONS':
@@ -1189,7 +1595,7 @@ def get_budget_statistics(budget_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get budget progress (same as statistics)
-        progress = budget_service.get_budget_progress(budget_id, user_id)
+        progress = get_budget_service().get_budget_progress(budget_id, user_id)
         
         if not progress:
             return jsonify({'error': 'Budget not found'}), 404
@@ -1200,7 +1606,7 @@ def get_budget_statistics(budget_id):
         logger.error(f"Error getting budget statistics {budget_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/budgets/<int:budget_id>/recommendations', methods=['GET', 'OPTIONS'])
+@api.route('/api/budgets/<int:budget_id>/recommendations', methods=['GET', 'OPTIONS'])
 def get_budget_recommendations(budget_id):
     """Get budget recommendations"""
     if request.method == 'OPTIONS':
@@ -1218,33 +1624,13 @@ def get_budget_recommendations(budget_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get budget progress for recommendations
-        progress = budget_service.get_budget_progress(budget_id, user_id)
+        progress = get_budget_service().get_budget_progress(budget_id, user_id)
         
         if not progress:
             return jsonify({'error': 'Budget not found'}), 404
         
         # Generate recommendations based on progress
-        recommendations = []
-        percentage_used = progress['percentage_used']
-        
-        if percentage_used > 90:
-            recommendations.append({
-                'type': 'warning',
-                'message': 'Budget quasi esaurito! Considera di ridurre le spese.',
-                'action': 'reduce_spending'
-            })
-        elif percentage_used > 75:
-            recommendations.append({
-                'type': 'info',
-                'message': 'Budget al 75%. Monitora attentamente le spese.',
-                'action': 'monitor_spending'
-            })
-        elif percentage_used < 25:
-            recommendations.append({
-                'type': 'success',
-                'message': 'Ottimo! Hai ancora molto budget disponibile.',
-                'action': 'continue_current_plan'
-            })
+        recommendations = get_budget_service().get_recommendations(progress['percentage_used'])
         
         return jsonify({
             'data': {
@@ -1261,7 +1647,7 @@ def get_budget_recommendations(budget_id):
 # GOALS ENDPOINTS
 # ============================================================================
 
-@app.route('/api/goals', methods=['GET', 'OPTIONS'])
+@api.route('/api/goals', methods=['GET', 'OPTIONS'])
 def get_goals():
     """Get all goals for the authenticated user"""
     if request.method == 'OPTIONS':
@@ -1279,7 +1665,7 @@ def get_goals():
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get goals
-        goals = goal_service.get_goals(user_id)
+        goals = get_goal_service().get_goals(user_id)
         
         return jsonify({
             'data': goals,
@@ -1290,7 +1676,7 @@ def get_goals():
         logger.error(f"Error getting goals: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goals/<int:goal_id>', methods=['GET', 'OPTIONS'])
+@api.route('/api/goals/<int:goal_id>', methods=['GET', 'OPTIONS'])
 def get_goal(goal_id):
     """Get a specific goal"""
     if request.method == 'OPTIONS':
@@ -1308,7 +1694,7 @@ def get_goal(goal_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get goal
-        goal = goal_service.get_goal(goal_id, user_id)
+        goal = get_goal_service().get_goal(goal_id, user_id)
         
         if not goal:
             return jsonify({'error': 'Goal not found'}), 404
@@ -1319,7 +1705,7 @@ def get_goal(goal_id):
         logger.error(f"Error getting goal {goal_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goals', methods=['POST', 'OPTIONS'])
+@api.route('/api/goals', methods=['POST', 'OPTIONS'])
 def create_goal():
     """Create a new goal"""
     if request.method == 'OPTIONS':
@@ -1345,7 +1731,7 @@ def create_goal():
         data['user_id'] = user_id
         
         # Create goal
-        goal = goal_service.create_goal(data)
+        goal = get_goal_service().create_goal(data)
         
         if not goal:
             return jsonify({'error': 'Failed to create goal'}), 500
@@ -1359,7 +1745,7 @@ def create_goal():
         logger.error(f"Error creating goal: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goals/<int:goal_id>', methods=['PUT', 'OPTIONS'])
+@api.route('/api/goals/<int:goal_id>', methods=['PUT', 'OPTIONS'])
 def update_goal(goal_id):
     """Update a goal"""
     if request.method == 'OPTIONS':
@@ -1382,7 +1768,7 @@ def update_goal(goal_id):
             return jsonify({'error': 'Request data required'}), 400
         
         # Update goal
-        goal = goal_service.update_goal(goal_id, user_id, data)
+        goal = get_goal_service().update_goal(goal_id, user_id, data)
         
         if not goal:
             return jsonify({'error': 'Goal not found or update failed'}), 404
@@ -1396,7 +1782,7 @@ def update_goal(goal_id):
         logger.error(f"Error updating goal {goal_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goals/<int:goal_id>', methods=['DELETE', 'OPTIONS'])
+@api.route('/api/goals/<int:goal_id>', methods=['DELETE', 'OPTIONS'])
 def delete_goal(goal_id):
     """Delete a goal"""
     if request.method == 'OPTIONS':
@@ -1414,7 +1800,7 @@ def delete_goal(goal_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Delete goal
-        success = goal_service.delete_goal(goal_id, user_id)
+        success = get_goal_service().delete_goal(goal_id, user_id)
         
         if not success:
             return jsonify({'error': 'Goal not found or cannot be deleted'}), 404
@@ -1427,7 +1813,7 @@ def delete_goal(goal_id):
         logger.error(f"Error deleting goal {goal_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goals/<int:goal_id>/progress', methods=['GET', 'OPTIONS'])
+@api.route('/api/goals/<int:goal_id>/progress', methods=['GET', 'OPTIONS'])
 def get_goal_progress(goal_id):
     """Get goal progress with calculated metrics"""
     if request.method == 'OPTIONS':
@@ -1445,7 +1831,7 @@ def get_goal_progress(goal_id):
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get goal progress
-        progress = goal_service.get_goal_progress(goal_id, user_id)
+        progress = get_goal_service().get_goal_progress(goal_id, user_id)
         
         if not progress:
             return jsonify({'error': 'Goal not found'}), 404
@@ -1456,7 +1842,7 @@ def get_goal_progress(goal_id):
         logger.error(f"Error getting goal progress {goal_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goals/<int:goal_id>/update-progress', methods=['POST', 'OPTIONS'])
+@api.route('/api/goals/<int:goal_id>/update-progress', methods=['POST', 'OPTIONS'])
 def update_goal_progress(goal_id):
     """Update goal progress by adding amount"""
     if request.method == 'OPTIONS':
@@ -1479,7 +1865,7 @@ def update_goal_progress(goal_id):
             return jsonify({'error': 'Amount is required'}), 400
         
         # Update goal progress
-        goal = goal_service.update_goal_progress(goal_id, user_id, data['amount'])
+        goal = get_goal_service().update_goal_progress(goal_id, user_id, data['amount'])
         
         if not goal:
             return jsonify({'error': 'Goal not found or update failed'}), 404
@@ -1493,7 +1879,7 @@ def update_goal_progress(goal_id):
         logger.error(f"Error updating goal progress {goal_id}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/goals/active', methods=['GET', 'OPTIONS'])
+@api.route('/api/goals/active', methods=['GET', 'OPTIONS'])
 def get_active_goals():
     """Get all active goals with progress"""
     if request.method == 'OPTIONS':
@@ -1511,7 +1897,7 @@ def get_active_goals():
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get active goals
-        goals = goal_service.get_active_goals(user_id)
+        goals = get_goal_service().get_active_goals(user_id)
         
         return jsonify({
             'data': goals,
@@ -1528,7 +1914,8 @@ def get_active_goals():
 # ANALYTICS ENDPOINTS
 # ============================================================================
 
-@app.route('/api/analytics/dashboard-stats', methods=['GET', 'OPTIONS'])
+@api.route('/api/analytics/dashboard-stats', methods=['GET', 'OPTIONS'])
+@profiled
 def get_dashboard_stats():
     """Get comprehensive dashboard statistics"""
     if request.method == 'OPTIONS':
@@ -1551,9 +1938,9 @@ def get_dashboard_stats():
         
         # Get dashboard stats
         if year and month:
-            stats = dashboard_service.get_monthly_stats(user_id, year, month)
+            stats = get_dashboard_service().get_monthly_stats(user_id, year, month)
         else:
-            stats = dashboard_service.get_dashboard_stats(user_id)
+            stats = get_dashboard_service().get_dashboard_stats(user_id)
         
         return jsonify({'data': stats}), 200
         
@@ -1561,7 +1948,8 @@ def get_dashboard_stats():
         logger.error(f"Error getting dashboard stats: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/analytics/monthly-stats', methods=['GET', 'OPTIONS'])
+@api.route('/api/analytics/monthly-stats', methods=['GET', 'OPTIONS'])
+@profiled
 def get_monthly_stats():
     """Get statistics for a specific month"""
     if request.method == 'OPTIONS':
@@ -1586,7 +1974,7 @@ def get_monthly_stats():
             return jsonify({'error': 'Year and month parameters are required'}), 400
         
         # Get monthly stats
-        stats = dashboard_service.get_monthly_stats(user_id, year, month)
+        stats = get_dashboard_service().get_monthly_stats(user_id, year, month)
         
         return jsonify({'data': stats}), 200
         
@@ -1594,7 +1982,8 @@ def get_monthly_stats():
         logger.error(f"Error getting monthly stats for {year}-{month}: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/analytics/category-stats', methods=['GET', 'OPTIONS'])
+@api.route('/api/analytics/category-stats', methods=['GET', 'OPTIONS'])
+@profiled
 def get_category_stats():
     """Get category statistics for a date range"""
     if request.method == 'OPTIONS':
@@ -1625,7 +2014,7 @@ def get_category_stats():
             end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
         
         # Get category stats
-        stats = dashboard_service.get_category_stats(user_id, start_date_obj, end_date_obj)
+        stats = get_dashboard_service().get_category_stats(user_id, start_date_obj, end_date_obj)
         
         return jsonify({
             'data': stats,
@@ -1636,7 +2025,8 @@ def get_category_stats():
         logger.error(f"Error getting category stats: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/dashboard/trends', methods=['GET', 'OPTIONS'])
+@api.route('/api/dashboard/trends', methods=['GET', 'OPTIONS'])
+@profiled
 def get_spending_trends():
     """Get spending trends over the last N months"""
     if request.method == 'OPTIONS':
@@ -1657,7 +2047,7 @@ def get_spending_trends():
         months = request.args.get('months', 6, type=int)
         
         # Get spending trends
-        trends = dashboard_service.get_spending_trends(user_id, months)
+        trends = get_dashboard_service().get_spending_trends(user_id, months)
         
         return jsonify({
             'data': trends,
@@ -1668,7 +2058,8 @@ def get_spending_trends():
         logger.error(f"Error getting spending trends: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/analytics/general-stats', methods=['GET', 'OPTIONS'])
+@api.route('/api/analytics/general-stats', methods=['GET', 'OPTIONS'])
+@profiled
 def get_general_stats():
     """Get general statistics (all time totals)"""
     if request.method == 'OPTIONS':
@@ -1686,9 +2077,7 @@ def get_general_stats():
             return jsonify({'error': 'Invalid token'}), 401
         
         # Get general stats from transaction service
-        from transaction_service import TransactionService
-        transaction_service = TransactionService(DB_CONFIG)
-        stats = transaction_service.get_general_stats(user_id)
+        stats = get_transaction_service().get_general_stats(user_id)
         
         return jsonify({'data': stats}), 200
         
@@ -1700,7 +2089,7 @@ def get_general_stats():
 # LEGACY ENDPOINTS (per compatibilità)
 # ============================================================================
 
-@app.route('/api/transactions/import', methods=['POST', 'OPTIONS'])
+@api.route('/api/transactions/import', methods=['POST', 'OPTIONS'])
 def import_transactions():
     """Legacy endpoint for importing transactions"""
     if request.method == 'OPTIONS':
@@ -1709,9 +2098,9 @@ def import_transactions():
     # Redirect to upload endpoint
     return upload_transactions()
 
-@app.route('/api/transactions/export', methods=['GET', 'OPTIONS'])
+@api.route('/api/transactions/export', methods=['GET', 'OPTIONS'])
 def export_transactions():
-    """Export transactions (placeholder)"""
+    """Export transactions as CSV, XLSX or Parquet (optionally gzipped), streamed"""
     if request.method == 'OPTIONS':
         return jsonify({'status': 'ok'}), 200
         
@@ -1726,17 +2115,33 @@ def export_transactions():
         if not user_id:
             return jsonify({'error': 'Invalid token'}), 401
         
-        # Placeholder for export functionality
-        return jsonify({
-            'data': { 'filePath': '/exports/transactions.csv' },
-            'message': 'Export functionality not yet implemented'
-        }), 200
+        # Same filters as GET /api/transactions
+        filters = _transaction_filters_from_args()
+        export_format = request.args.get('format', 'csv').lower()
+        compress = request.args.get('gzip', 'false').lower() == 'true'
+        
+        if export_format not in get_transaction_exporter().FORMATS:
+            return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
+        if not get_transaction_exporter().is_format_available(export_format):
+            return jsonify({'error': f'Export format {export_format} is not available on this server'}), 501
+        
+        body = get_transaction_exporter().export(user_id, filters, export_format, compress)
+        filename = get_transaction_exporter().filename(export_format, compress)
+        
+        return Response(
+            stream_with_context(body),
+            mimetype=get_transaction_exporter().content_type(export_format, compress),
+            headers={
+                'Content-Disposition': f'attachment; filename="{filename}"',
+                'X-Accel-Buffering': 'no'
+            }
+        )
         
     except Exception as e:
         logger.error(f"Error exporting transactions: {e}")
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/analytics/summary', methods=['GET', 'OPTIONS'])
+@api.route('/api/analytics/summary', methods=['GET', 'OPTIONS'])
 def get_analytics_summary():
     """Get analytics summary (alias for dashboard stats)"""
     if request.method == 'OPTIONS':
@@ -1745,7 +2150,7 @@ def get_analytics_summary():
     # Redirect to dashboard stats
     return get_dashboard_stats()
 
-@app.route('/api/analytics/category-totals', methods=['GET', 'OPTIONS'])
+@api.route('/api/analytics/category-totals', methods=['GET', 'OPTIONS'])
 def get_category_totals():
     """Get category totals (alias for category stats)"""
     if request.method == 'OPTIONS':
@@ -1754,7 +2159,7 @@ def get_category_totals():
     # Redirect to category stats
     return get_category_stats()
 
-@app.route('/api/analytics/monthly-totals', methods=['GET', 'OPTIONS'])
+@api.route('/api/analytics/monthly-totals', methods=['GET', 'OPTIONS'])
 def get_monthly_totals():
     """Get monthly totals (alias for trends)"""
     if request.method == 'OPTIONS':
@@ -1765,6 +2170,10 @@ def get_monthly_totals():
 
 def get_user_id_from_token(token):
     """Recupera l'ID utente dal token di sessione"""
+    with metrics.span('auth'):
+        return _lookup_session_user(token)
+
+def _lookup_session_user(token):
     try:
         connection = get_db_connection()
         if not connection:
@@ -1787,8 +2196,8 @@ def get_user_id_from_token(token):
         return None
 
 # Route per servire il frontend buildato
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
+@api.route('/', defaults={'path': ''})
+@api.route('/<path:path>')
 def serve_frontend(path):
     """Serve il frontend React buildato"""
     if path and os.path.exists(os.path.join('../frontend/dist', path)):
@@ -1798,4 +2207,5 @@ def serve_frontend(path):
 
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 3001))
+    app = create_app()
     app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,289 @@
+"""Percorso asincrono (ASGI) per gli endpoint di sola lettura.
+
+Serve /api/analytics/*, /api/dashboard/trends e GET /api/transactions con le
+stesse risposte di app.py, ma su aiomysql: una query lenta non blocca un thread
+e le sotto-query della dashboard girano in parallelo.
+
+Non viene servita da sola: asgi_router.py (avviato con hypercorn da serve.sh)
+instrada qui queste route e passa tutte le altre a gunicorn. Le route Flask
+equivalenti restano in app.py e servono le stesse richieste con
+ASYNC_READ_PATH=false.
+"""
+import logging
+from datetime import datetime
+
+import aiomysql
+from quart import Quart, request, jsonify, Response
+
+from async_service import AsyncReadService
+from railway_config import get_cors_config
+from services import get_db_config
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+app = Quart(__name__)
+read_service = AsyncReadService(get_db_config())
+cors_config = get_cors_config()
+
+@app.after_serving
+async def close_pool():
+    await read_service.close()
+
+@app.after_request
+async def add_cors_headers(response):
+    """Stessi header CORS configurati per l'app Flask"""
+    origin = request.headers.get('Origin')
+    if origin and origin in cors_config['origins']:
+        response.headers['Access-Control-Allow-Origin'] = origin
+        response.headers['Access-Control-Allow-Headers'] = ','.join(cors_config['allow_headers'])
+        response.headers['Access-Control-Allow-Methods'] = ','.join(cors_config['methods'])
+    response.vary.add('Origin')
+    return response
+
+# Messaggi di autenticazione delle route Flask: inglesi per le analytics,
+# italiani per le transazioni
+ANALYTICS_AUTH_ERRORS = ('Authentication token required', 'Invalid token')
+TRANSACTIONS_AUTH_ERRORS = ('Token di autenticazione richiesto', 'Token non valido')
+
+async def _authenticate(messages=ANALYTICS_AUTH_ERRORS):
+    """Restituisce (user_id, None) oppure (None, risposta di errore)"""
+    missing, invalid = messages
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None, (jsonify({'error': missing}), 401)
+
+    user_id = await read_service.get_user_id_from_token(auth_header[7:])
+    if not user_id:
+        return None, (jsonify({'error': invalid}), 401)
+    return user_id, None
+
+def _transaction_filters_from_args():
+    """Estrae i filtri delle transazioni dalla query string (come app.py)"""
+    filters = {}
+    if request.args.get('start_date'):
+        filters['start_date'] = request.args.get('start_date')
+    if request.args.get('end_date'):
+        filters['end_date'] = request.args.get('end_date')
+    if request.args.get('type'):
+        filters['type'] = request.args.get('type')
+    if request.args.get('category'):
+        filters['category'] = request.args.get('category')
+    if request.args.get('min_amount'):
+        filters['min_amount'] = float(request.args.get('min_amount'))
+    if request.args.get('max_amount'):
+        filters['max_amount'] = float(request.args.get('max_amount'))
+    if request.args.get('limit'):
+        filters['limit'] = int(request.args.get('limit'))
+    return filters
+
+# ============================================================================
+# ANALYTICS ENDPOINTS
+# ============================================================================
+
+@app.route('/api/analytics/dashboard-stats', methods=['GET', 'OPTIONS'])
+@app.route('/api/analytics/summary', methods=['GET', 'OPTIONS'])
+async def get_dashboard_stats():
+    """Get comprehensive dashboard statistics"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+
+    try:
+        user_id, error = await _authenticate()
+        if error:
+            return error
+
+        year = request.args.get('year', type=int)
+        month = request.args.get('month', type=int)
+
+        if year and month:
+            stats = await read_service.get_monthly_stats(user_id, year, month)
+        else:
+            stats = await read_service.get_dashboard_stats(user_id)
+
+        return jsonify({'data': stats}), 200
+
+    except Exception as e:
+        logger.error(f"Error getting dashboard stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/monthly-stats', methods=['GET', 'OPTIONS'])
+async def get_monthly_stats():
+    """Get statistics for a specific month"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+
+    try:
+        user_id, error = await _authenticate()
+        if error:
+            return error
+
+        year = request.args.get('year', type=int)
+        month = request.args.get('month', type=int)
+        if not year or not month:
+            return jsonify({'error': 'Year and month parameters are required'}), 400
+
+        stats = await read_service.get_monthly_stats(user_id, year, month)
+        return jsonify({'data': stats}), 200
+
+    except Exception as e:
+        logger.error(f"Error getting monthly stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/category-stats', methods=['GET', 'OPTIONS'])
+@app.route('/api/analytics/category-totals', methods=['GET', 'OPTIONS'])
+async def get_category_stats():
+    """Get category statistics for a date range"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+
+    try:
+        user_id, error = await _authenticate()
+        if error:
+            return error
+
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date() if start_date else None
+        end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date() if end_date else None
+
+        stats = await read_service.get_category_stats(user_id, start_date_obj, end_date_obj)
+        return jsonify({
+            'data': stats,
+            'total': len(stats)
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting category stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/dashboard/trends', methods=['GET', 'OPTIONS'])
+@app.route('/api/analytics/monthly-totals', methods=['GET', 'OPTIONS'])
+async def get_spending_trends():
+    """Get spending trends over the last N months"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+
+    try:
+        user_id, error = await _authenticate()
+        if error:
+            return error
+
+        months = request.args.get('months', 6, type=int)
+        trends = await read_service.get_spending_trends(user_id, months)
+        return jsonify({
+            'data': trends,
+            'total': len(trends)
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Error getting spending trends: {e}")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/analytics/general-stats', methods=['GET', 'OPTIONS'])
+async def get_general_stats():
+    """Get general statistics (all time totals)"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+
+    try:
+        user_id, error = await _authenticate()
+        if error:
+            return error
+
+        stats = await read_service.get_general_stats(user_id)
+        return jsonify({'data': stats}), 200
+
+    except Exception as e:
+        logger.error(f"Error getting general stats: {e}")
+        return jsonify({'error': str(e)}), 500
+
+# ============================================================================
+# TRANSACTIONS (sola lettura)
+# ============================================================================
+
+@app.route('/api/transactions', methods=['GET', 'OPTIONS'])
+async def get_transactions():
+    """Lista transazioni: completa, paginata (page_size/cursor) o in streaming (stream=ndjson|json)"""
+    if request.method == 'OPTIONS':
+        return jsonify({'status': 'ok'}), 200
+
+    try:
+        user_id, error = await _authenticate(TRANSACTIONS_AUTH_ERRORS)
+        if error:
+            return error
+
+        filters = _transaction_filters_from_args()
+        fields = [field.strip() for field in request.args.get('fields', '').split(',') if field.strip()] or None
+
+        stream_format = request.args.get('stream')
+        if stream_format in ('json', 'ndjson'):
+            chunks = read_service.iter_user_transactions(user_id, filters, fields)
+            if stream_format == 'ndjson':
+                return Response(_stream_ndjson(chunks), mimetype='application/x-ndjson',
+                                headers={'X-Accel-Buffering': 'no'})
+            return Response(_stream_json_list(chunks), mimetype='application/json',
+                            headers={'X-Accel-Buffering': 'no'})
+
+        if request.args.get('page_size') or request.args.get('cursor'):
+            try:
+                page = await read_service.get_user_transactions_page(
+                    user_id,
+                    filters,
+                    page_size=request.args.get('page_size', 100, type=int),
+                    cursor_token=request.args.get('cursor'),
+                    fields=fields,
+                    include_total=request.args.get('include_total', 'false').lower() == 'true'
+                )
+            except ValueError as ve:
+                return jsonify({'error': str(ve)}), 400
+
+            response_data = {
+                'success': True,
+                'transactions': page['transactions'],
+                'count': len(page['transactions']),
+                'next_cursor': page['next_cursor']
+            }
+            if 'total' in page:
+                response_data['total'] = page['total']
+            return jsonify(response_data), 200
+
+        transactions = await read_service.get_user_transactions(user_id, filters, fields)
+        return jsonify({
+            'success': True,
+            'transactions': transactions,
+            'count': len(transactions)
+        }), 200
+
+    except Exception as e:
+        logger.error(f"Errore recupero transazioni: {e}")
+        return jsonify({'error': str(e)}), 500
+
+async def _stream_ndjson(chunks):
+    """Serializza i blocchi di righe come NDJSON (come app.py: un errore interrompe la risposta)"""
+    async for rows in chunks:
+        yield ''.join(app.json.dumps(row) + '\n' for row in rows)
+
+async def _stream_json_list(chunks):
+    """Serializza i blocchi di righe nello stesso formato JSON di app.py, con success in fondo"""
+    yield '{"transactions": ['
+    count = 0
+    try:
+        async for rows in chunks:
+            prefix = ',' if count else ''
+            yield prefix + ','.join(app.json.dumps(row) for row in rows)
+            count += len(rows)
+    except aiomysql.Error as e:
+        logger.error(f"Errore streaming transazioni: {e}")
+        yield f'], "count": {count}, "success": false, "error": "Lettura delle transazioni interrotta"}}'
+        return
+    yield f'], "count": {count}, "success": true}}'
+
+@app.route('/api/health/async', methods=['GET'])
+async def health_check():
+    """Health check del percorso asincrono"""
+    try:
+        await read_service.fetchone("SELECT 1 AS ok", ())
+        return jsonify({'status': 'healthy', 'database': 'connected'}), 200
+    except Exception as e:
+        return jsonify({'status': 'unhealthy', 'error': str(e)}), 503
@@ -0,0 +1,159 @@
+"""Ingresso HTTP del servizio: divide le richieste tra percorso asincrono e WSGI.
+
+hypercorn serve questa app sulla porta pubblica (PORT, vedi serve.sh):
+/api/analytics/*, /api/dashboard/trends e GET /api/transactions vanno
+all'app Quart di asgi_app.py, tutto il resto viene inoltrato a gunicorn, che
+ascolta solo in locale su GUNICORN_BIND. Corpi di richiesta e risposta passano
+a blocchi in entrambe le direzioni: upload a blocchi, export e stream non
+vengono mai tenuti in memoria dal proxy.
+"""
+import asyncio
+import json
+import logging
+import os
+
+import httpx
+
+from asgi_app import app as read_app
+
+logger = logging.getLogger(__name__)
+# Una riga di log di httpx per ogni richiesta inoltrata duplicherebbe l'access log
+logging.getLogger('httpx').setLevel(logging.WARNING)
+
+# Indirizzo di gunicorn, lo stesso che legge gunicorn.conf.py
+GUNICORN_BIND = os.environ.get('GUNICORN_BIND', '127.0.0.1:3002')
+PROXY_CONNECT_TIMEOUT = float(os.environ.get('PROXY_CONNECT_TIMEOUT', 5))
+
+# Header che valgono per una sola connessione e non vanno inoltrati
+HOP_BY_HOP_HEADERS = {
+    b'connection', b'keep-alive', b'proxy-authenticate', b'proxy-authorization',
+    b'te', b'trailer', b'transfer-encoding', b'upgrade'
+}
+
+ASYNC_PATH_PREFIXES = ('/api/analytics/',)
+ASYNC_PATHS = {'/api/dashboard/trends', '/api/health/async'}
+# Su /api/transactions solo la lista: creazione ed eliminazione restano su Flask
+ASYNC_TRANSACTION_METHODS = {'GET', 'HEAD', 'OPTIONS'}
+
+def is_async_route(path: str, method: str) -> bool:
+    """True se la richiesta va servita dall'app Quart"""
+    if path.startswith(ASYNC_PATH_PREFIXES) or path in ASYNC_PATHS:
+        return True
+    return path == '/api/transactions' and method in ASYNC_TRANSACTION_METHODS
+
+class Router:
+    """App ASGI: instrada sull'app Quart o inoltra a gunicorn"""
+
+    def __init__(self, read_app, upstream: str = GUNICORN_BIND):
+        self.read_app = read_app
+        self.upstream = upstream
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Creato al primo uso, dentro l'event loop del server; le letture non
+        # hanno timeout perché export e stream possono durare a lungo
+        if self._client is None:
+            self._client = httpx.AsyncClient(
+                base_url=f"http://{self.upstream}",
+                timeout=httpx.Timeout(None, connect=PROXY_CONNECT_TIMEOUT),
+                follow_redirects=False
+            )
+        return self._client
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.read_app(scope, receive, self._lifespan_send(send))
+        elif scope['type'] == 'http' and not is_async_route(scope['path'], scope['method']):
+            await self.proxy(scope, receive, send)
+        else:
+            await self.read_app(scope, receive, send)
+
+    def _lifespan_send(self, send):
+        """Chiude il client verso gunicorn insieme al pool dell'app Quart"""
+        async def lifespan_send(message):
+            if message['type'] == 'lifespan.shutdown.complete' and self._client is not None:
+                await self._client.aclose()
+                self._client = None
+            await send(message)
+        return lifespan_send
+
+    async def proxy(self, scope, receive, send):
+        """Inoltra la richiesta a gunicorn e ne ritrasmette la risposta a blocchi"""
+        disconnected = asyncio.Event()
+
+        async def request_body():
+            while True:
+                message = await receive()
+                if message['type'] == 'http.disconnect':
+                    disconnected.set()
+                    return
+                if message.get('body'):
+                    yield message['body']
+                if not message.get('more_body', False):
+                    return
+
+        async def wait_disconnect():
+            # Dopo il corpo, receive() restituisce solo la disconnessione del client
+            while not disconnected.is_set():
+                if (await receive())['type'] == 'http.disconnect':
+                    disconnected.set()
+
+        # Gli header X-Forwarded-* del proxy di Railway restano, si aggiunge questo passaggio
+        headers = [(name, value) for name, value in scope['headers']
+                   if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != b'x-forwarded-for']
+        forwarded_for = [value for name, value in scope['headers'] if name.lower() == b'x-forwarded-for']
+        if scope.get('client'):
+            forwarded_for.append(scope['client'][0].encode('latin-1'))
+        if forwarded_for:
+            headers.append((b'x-forwarded-for', b', '.join(forwarded_for)))
+        if not any(name.lower() == b'x-forwarded-proto' for name, _ in headers):
+            headers.append((b'x-forwarded-proto', scope.get('scheme', 'http').encode('latin-1')))
+
+        target = scope.get('raw_path') or scope['path'].encode('utf-8')
+        if scope.get('query_string'):
+            target += b'?' + scope['query_string']
+
+        request = self.client.build_request(
+            scope['method'], target.decode('latin-1'), headers=headers, content=request_body()
+        )
+        try:
+            response = await self.client.send(request, stream=True)
+        except httpx.HTTPError as e:
+            logger.error(f"Backend WSGI non raggiungibile su {self.upstream}: {e}")
+            await self._send_error(send, 502, 'Backend non raggiungibile')
+            return
+
+        watcher = asyncio.create_task(wait_disconnect())
+        try:
+            await send({
+                'type': 'http.response.start',
+                'status': response.status_code,
+                'headers': [(name, value) for name, value in response.headers.raw
+                            if name.lower() not in HOP_BY_HOP_HEADERS]
+            })
+            async for chunk in response.aiter_raw():
+                if disconnected.is_set():
+                    # Il client se n'è andato: chiudere la risposta ferma anche gunicorn
+                    return
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+        except httpx.HTTPError as e:
+            # Risposta già iniziata: si può solo interromperla
+            logger.error(f"Risposta del backend WSGI interrotta: {e}")
+        finally:
+            watcher.cancel()
+            await response.aclose()
+
+    @staticmethod
+    async def _send_error(send, status: int, message: str):
+        body = json.dumps({'error': message}).encode('utf-8')
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'application/json'),
+                        (b'content-length', str(len(body)).encode('latin-1'))]
+        })
+        await send({'type': 'http.response.body', 'body': body, 'more_body': False})
+
+app = Router(read_app)
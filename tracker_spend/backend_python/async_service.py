@@ -0,0 +1,194 @@
+import asyncio
+import logging
+import os
+from datetime import date
+from typing import List, Dict, Any, Optional
+
+import aiomysql
+
+from dashboard_service import (
+    DashboardService, MONTH_TOTALS_SQL, TOP_EXPENSE_CATEGORIES_SQL, RECENT_TRANSACTIONS_SQL,
+    BUDGET_PROGRESS_SQL, CATEGORY_BREAKDOWN_SQL, DAILY_BREAKDOWN_SQL, CATEGORY_STATS_SQL
+)
+from transaction_service import TransactionService, GENERAL_STATS_SQL, MAX_PAGE_SIZE, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Connessioni del pool asincrono: ogni sotto-query concorrente ne occupa una
+ASYNC_DB_POOL_SIZE = int(os.environ.get('ASYNC_DB_POOL_SIZE', 20))
+
+class AsyncReadService:
+    """Letture di dashboard, analytics e lista transazioni su aiomysql.
+
+    Le query e la composizione dei risultati sono le stesse di DashboardService e
+    TransactionService; qui le sotto-query indipendenti vengono eseguite in parallelo.
+    """
+
+    def __init__(self, db_config: Dict[str, Any]):
+        self.db_config = db_config
+        self._pool = None
+        self._pool_lock = asyncio.Lock()
+        # Usato solo per costruire le query, non apre connessioni
+        self._transactions = TransactionService(db_config)
+
+    async def get_pool(self):
+        """Crea il pool al primo utilizzo, dentro l'event loop del server"""
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    self._pool = await aiomysql.create_pool(
+                        host=self.db_config['host'],
+                        port=self.db_config.get('port', 3306),
+                        user=self.db_config['user'],
+                        password=self.db_config.get('password', ''),
+                        db=self.db_config['database'],
+                        minsize=1,
+                        maxsize=ASYNC_DB_POOL_SIZE,
+                        autocommit=True
+                    )
+        return self._pool
+
+    async def close(self):
+        """Chiude il pool allo shutdown del server"""
+        if self._pool is not None:
+            self._pool.close()
+            await self._pool.wait_closed()
+            self._pool = None
+
+    async def fetchone(self, query: str, params) -> Optional[Dict[str, Any]]:
+        pool = await self.get_pool()
+        async with pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params)
+                return await cursor.fetchone()
+
+    async def fetchall(self, query: str, params) -> List[Dict[str, Any]]:
+        pool = await self.get_pool()
+        async with pool.acquire() as connection:
+            async with connection.cursor(aiomysql.DictCursor) as cursor:
+                await cursor.execute(query, params)
+                return list(await cursor.fetchall())
+
+    async def get_user_id_from_token(self, token: str) -> Optional[int]:
+        """Recupera l'ID utente dal token di sessione"""
+        session = await self.fetchone("""
+            SELECT user_id FROM user_sessions
+            WHERE token = %s AND expires_at > NOW()
+        """, (token,))
+        return session['user_id'] if session else None
+
+    async def get_dashboard_stats(self, user_id: int) -> Dict[str, Any]:
+        """Statistiche della dashboard: le cinque query girano in parallelo"""
+        current_month, next_month, prev_month = DashboardService.dashboard_months()
+
+        (current_month_stats, prev_month_stats, top_expense_categories,
+         recent_transactions, budget_progress) = await asyncio.gather(
+            self.fetchone(MONTH_TOTALS_SQL, (user_id, current_month, next_month)),
+            self.fetchone(MONTH_TOTALS_SQL, (user_id, prev_month, current_month)),
+            self.fetchall(TOP_EXPENSE_CATEGORIES_SQL, (user_id, current_month, next_month)),
+            self.fetchall(RECENT_TRANSACTIONS_SQL, (user_id,)),
+            self.fetchall(BUDGET_PROGRESS_SQL, (user_id,))
+        )
+
+        return DashboardService.compose_dashboard_stats(
+            current_month, next_month, current_month_stats, prev_month_stats,
+            top_expense_categories, recent_transactions, budget_progress
+        )
+
+    async def get_monthly_stats(self, user_id: int, year: int, month: int) -> Dict[str, Any]:
+        """Statistiche di un mese: totali, categorie e giorni in parallelo"""
+        start_date, end_date = DashboardService.month_range(year, month)
+        params = (user_id, start_date, end_date)
+
+        monthly_stats, category_stats, daily_stats = await asyncio.gather(
+            self.fetchone(MONTH_TOTALS_SQL, params),
+            self.fetchall(CATEGORY_BREAKDOWN_SQL, params),
+            self.fetchall(DAILY_BREAKDOWN_SQL, params)
+        )
+
+        return DashboardService.compose_monthly_stats(year, month, monthly_stats, category_stats, daily_stats)
+
+    async def get_category_stats(self, user_id: int, start_date: date = None,
+                                 end_date: date = None) -> List[Dict[str, Any]]:
+        """Statistiche per categoria in un intervallo di date"""
+        start_date, end_date = DashboardService.category_stats_range(start_date, end_date)
+        category_stats = await self.fetchall(CATEGORY_STATS_SQL, (user_id, start_date, end_date))
+        return DashboardService.format_category_stats(category_stats)
+
+    async def get_spending_trends(self, user_id: int, months: int = 6) -> List[Dict[str, Any]]:
+        """Andamento degli ultimi N mesi, una query per mese in parallelo"""
+        trend_months = DashboardService.trend_months(months)
+        results = await asyncio.gather(*[
+            self.fetchone(MONTH_TOTALS_SQL, (user_id, month_start, month_end))
+            for _, _, month_start, month_end in trend_months
+        ])
+
+        trends = [
+            DashboardService.compose_trend(year, month, month_start, month_stats)
+            for (year, month, month_start, _), month_stats in zip(trend_months, results)
+        ]
+        # Reverse to get chronological order
+        return list(reversed(trends))
+
+    async def get_general_stats(self, user_id: int) -> Dict[str, Any]:
+        """Totali di sempre dell'utente"""
+        stats = await self.fetchone(GENERAL_STATS_SQL, (user_id,))
+        return TransactionService.format_general_stats(stats)
+
+    async def get_user_transactions(self, user_id: int, filters: Optional[Dict[str, Any]] = None,
+                                    fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Lista transazioni (stesso ordinamento e limite di TransactionService)"""
+        query, params = self._transactions.build_list_query(user_id, filters, fields)
+        return await self.fetchall(query, params)
+
+    async def get_user_transactions_page(self, user_id: int, filters: Optional[Dict[str, Any]] = None,
+                                         page_size: int = 100, cursor_token: Optional[str] = None,
+                                         fields: Optional[List[str]] = None,
+                                         include_total: bool = False) -> Dict[str, Any]:
+        """Pagina keyset; il conteggio totale, se richiesto, gira in parallelo alla pagina.
+
+        Solleva ValueError se il cursore non è valido.
+        """
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        position = decode_cursor(cursor_token) if cursor_token else None
+
+        query, params = self._transactions.build_page_query(user_id, filters, page_size, position, fields)
+        queries = [self.fetchall(query, params)]
+        if include_total:
+            count_query, count_params = self._transactions.build_count_query(user_id, filters)
+            queries.append(self.fetchone(count_query, count_params))
+
+        results = await asyncio.gather(*queries)
+
+        result = {}
+        if include_total:
+            result['total'] = results[1]['total']
+        result['transactions'], result['next_cursor'] = TransactionService.finish_page(results[0], page_size)
+        return result
+
+    async def iter_user_transactions(self, user_id: int, filters: Optional[Dict[str, Any]] = None,
+                                     fields: Optional[List[str]] = None, chunk_size: int = 500):
+        """Itera le transazioni a blocchi da un cursore lato server (memoria costante).
+
+        Se lo stream si interrompe (client disconnesso, errore) le righe non lette
+        restano sul socket: la connessione viene chiusa invece di tornare al pool,
+        dove chiudere il cursore le leggerebbe tutte.
+        """
+        query, params = self._transactions.build_list_query(user_id, filters, fields, stable_order=True)
+        pool = await self.get_pool()
+        connection = await pool.acquire()
+        finished = False
+        try:
+            cursor = await connection.cursor(aiomysql.SSDictCursor)
+            await cursor.execute(query, params)
+            while True:
+                rows = await cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+            await cursor.close()
+            finished = True
+        finally:
+            if not finished:
+                connection.close()
+            pool.release(connection)
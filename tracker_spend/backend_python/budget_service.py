@@ -1,11 +1,25 @@
-import mysql.connector
 from mysql.connector import Error
+from db import get_connection
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime, date
+from collections import defaultdict
+from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
+# Recomputes the running spent_amount counter from transactions
+RECONCILE_SPENT_SQL = """
+    UPDATE budgets b
+    SET b.spent_amount = (
+        SELECT COALESCE(SUM(t.amount), 0)
+        FROM transactions t
+        WHERE t.user_id = b.user_id AND t.type = 'expense'
+        AND (b.category_id IS NULL OR t.category_id = b.category_id)
+        AND t.transaction_date BETWEEN b.start_date AND b.end_date
+    )
+"""
+
 class BudgetService:
     def __init__(self, db_config: Dict[str, Any]):
         self.db_config = db_config
@@ -13,53 +27,12 @@ class BudgetService:
     def get_db_connection(self):
         """Create database connection"""
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = get_connection(self.db_config)
             return connection
         except Error as e:
             logger.error(f"Error connecting to MySQL: {e}")
             return None
 
-    def create_budgets_table(self):
-        """Create budgets table if it doesn't exist"""
-        connection = self.get_db_connection()
-        if not connection:
-            return False
-
-        try:
-            cursor = connection.cursor()
-            
-            # Create budgets table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS budgets (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    name VARCHAR(100) NOT NULL,
-                    category_id INT,
-                    amount DECIMAL(10,2) NOT NULL,
-                    period ENUM('daily', 'weekly', 'monthly', 'yearly') NOT NULL,
-                    start_date DATE NOT NULL,
-                    end_date DATE,
-                    description TEXT,
-                    is_active BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
-                    FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
-                )
-            """)
-
-            connection.commit()
-            cursor.close()
-            connection.close()
-            logger.info("Budgets table created successfully")
-            return True
-
-        except Error as e:
-            logger.error(f"Error creating budgets table: {e}")
-            if connection:
-                connection.close()
-            return False
-
     def get_budgets(self, user_id: int) -> List[Dict[str, Any]]:
         """Get all budgets for a user"""
         connection = self.get_db_connection()
@@ -140,6 +113,7 @@ class BudgetService:
             ))
             
             budget_id = cursor.lastrowid
+            self._reconcile_spent(cursor, budget_id=budget_id)
             connection.commit()
             
             # Get the created budget with category info
@@ -201,6 +175,10 @@ class BudgetService:
                 connection.close()
                 return None
             
+            # Budget window or category changed: recompute the counter
+            if any(field in budget_data for field in ['category_id', 'start_date', 'end_date']):
+                self._reconcile_spent(cursor, budget_id=budget_id)
+            
             connection.commit()
             
             # Get the updated budget with category info
@@ -261,50 +239,26 @@ class BudgetService:
         try:
             cursor = connection.cursor(dictionary=True)
             
-            # Get budget info
+            # spent_amount is maintained on transaction writes, so progress is a PK read
             cursor.execute("""
                 SELECT * FROM budgets WHERE id = %s AND user_id = %s
             """, (budget_id, user_id))
             
             budget = cursor.fetchone()
+            cursor.close()
+            connection.close()
+            
             if not budget:
-                cursor.close()
-                connection.close()
                 return None
             
-            # Calculate spent amount
-            if budget['category_id']:
-                # Budget for specific category
-                cursor.execute("""
-                    SELECT COALESCE(SUM(amount), 0) as spent_amount
-                    FROM transactions 
-                    WHERE user_id = %s AND category_id = %s AND type = 'expense'
-                    AND transaction_date BETWEEN %s AND %s
-                """, (user_id, budget['category_id'], budget['start_date'], budget['end_date']))
-            else:
-                # General budget (all expenses)
-                cursor.execute("""
-                    SELECT COALESCE(SUM(amount), 0) as spent_amount
-                    FROM transactions 
-                    WHERE user_id = %s AND type = 'expense'
-                    AND transaction_date BETWEEN %s AND %s
-                """, (user_id, budget['start_date'], budget['end_date']))
-            
-            spent_result = cursor.fetchone()
-            spent_amount = float(spent_result['spent_amount']) if spent_result else 0
-            
-            # Calculate remaining and percentage
-            remaining_amount = budget['amount'] - spent_amount
-            percentage_used = (spent_amount / budget['amount']) * 100 if budget['amount'] > 0 else 0
-            
-            cursor.close()
-            connection.close()
+            spent_amount = float(budget['spent_amount'] or 0)
+            amount = float(budget['amount'])
             
             return {
                 'budget': budget,
                 'spent_amount': spent_amount,
-                'remaining_amount': remaining_amount,
-                'percentage_used': percentage_used
+                'remaining_amount': amount - spent_amount,
+                'percentage_used': (spent_amount / amount) * 100 if amount > 0 else 0
             }
 
         except Error as e:
@@ -322,7 +276,7 @@ class BudgetService:
         try:
             cursor = connection.cursor(dictionary=True)
             
-            # Get active budgets
+            # Get active budgets (spent_amount included)
             cursor.execute("""
                 SELECT b.*, c.name as category_name, c.color as category_color, c.icon as category_icon
                 FROM budgets b
@@ -332,38 +286,215 @@ class BudgetService:
             """, (user_id,))
 
             budgets = cursor.fetchall()
+            cursor.close()
+            connection.close()
             
-            # Calculate progress for each budget
             for budget in budgets:
-                if budget['category_id']:
-                    cursor.execute("""
-                        SELECT COALESCE(SUM(amount), 0) as spent_amount
-                        FROM transactions 
-                        WHERE user_id = %s AND category_id = %s AND type = 'expense'
-                        AND transaction_date BETWEEN %s AND %s
-                    """, (user_id, budget['category_id'], budget['start_date'], budget['end_date']))
-                else:
-                    cursor.execute("""
-                        SELECT COALESCE(SUM(amount), 0) as spent_amount
-                        FROM transactions 
-                        WHERE user_id = %s AND type = 'expense'
-                        AND transaction_date BETWEEN %s AND %s
-                    """, (user_id, budget['start_date'], budget['end_date']))
-                
-                spent_result = cursor.fetchone()
-                spent_amount = float(spent_result['spent_amount']) if spent_result else 0
-                
+                spent_amount = float(budget['spent_amount'] or 0)
+                amount = float(budget['amount'])
                 budget['spent_amount'] = spent_amount
-                budget['remaining_amount'] = budget['amount'] - spent_amount
-                budget['percentage_used'] = (spent_amount / budget['amount']) * 100 if budget['amount'] > 0 else 0
+                budget['remaining_amount'] = amount - spent_amount
+                budget['percentage_used'] = (spent_amount / amount) * 100 if amount > 0 else 0
+            
+            return budgets
+
+        except Error as e:
+            logger.error(f"Error getting active budgets for user {user_id}: {e}")
+            if connection:
+                connection.close()
+            return []
+
+    def get_budgets_progress(self, user_id: int, budget_ids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+        """Get progress, statistics and recommendations for many budgets in one query.
+
+        Returns every budget of the user when ``budget_ids`` is omitted.
+        """
+        connection = self.get_db_connection()
+        if not connection:
+            return []
+
+        try:
+            cursor = connection.cursor(dictionary=True)
             
+            query = """
+                SELECT b.*, c.name as category_name, c.color as category_color, c.icon as category_icon
+                FROM budgets b
+                LEFT JOIN categories c ON b.category_id = c.id
+                WHERE b.user_id = %s
+            """
+            params = [user_id]
+            if budget_ids:
+                placeholders = ','.join(['%s'] * len(budget_ids))
+                query += f" AND b.id IN ({placeholders})"
+                params.extend(budget_ids)
+            query += " ORDER BY b.created_at DESC"
+            
+            cursor.execute(query, params)
+            budgets = cursor.fetchall()
             cursor.close()
             connection.close()
             
-            return budgets
+            results = []
+            for budget in budgets:
+                spent_amount = float(budget['spent_amount'] or 0)
+                amount = float(budget['amount'])
+                progress = {
+                    'budget': budget,
+                    'spent_amount': spent_amount,
+                    'remaining_amount': amount - spent_amount,
+                    'percentage_used': (spent_amount / amount) * 100 if amount > 0 else 0
+                }
+                results.append({
+                    'budget_id': budget['id'],
+                    'progress': progress,
+                    # Statistics are the same payload as progress (see /statistics)
+                    'statistics': progress,
+                    'recommendations': self.get_recommendations(progress['percentage_used'])
+                })
+            
+            return results
 
         except Error as e:
-            logger.error(f"Error getting active budgets for user {user_id}: {e}")
+            logger.error(f"Error getting budgets progress for user {user_id}: {e}")
             if connection:
                 connection.close()
             return []
+
+    @staticmethod
+    def get_recommendations(percentage_used: float) -> List[Dict[str, str]]:
+        """Generate recommendations based on budget usage"""
+        recommendations = []
+        
+        if percentage_used > 90:
+            recommendations.append({
+                'type': 'warning',
+                'message': 'Budget quasi esaurito! Considera di ridurre le spese.',
+                'action': 'reduce_spending'
+            })
+        elif percentage_used > 75:
+            recommendations.append({
+                'type': 'info',
+                'message': 'Budget al 75%. Monitora attentamente le spese.',
+                'action': 'monitor_spending'
+            })
+        elif percentage_used < 25:
+            recommendations.append({
+                'type': 'success',
+                'message': 'Ottimo! Hai ancora molto budget disponibile.',
+                'action': 'continue_current_plan'
+            })
+        
+        return recommendations
+
+    def reconcile_spent_amounts(self, user_id: Optional[int] = None) -> int:
+        """Recompute spent_amount from transactions to correct counter drift.
+
+        Reconciles the budgets of ``user_id``, or every budget when omitted.
+        Returns the number of budgets whose counter was corrected.
+        """
+        connection = self.get_db_connection()
+        if not connection:
+            return 0
+
+        try:
+            cursor = connection.cursor()
+            corrected = self._reconcile_spent(cursor, user_id=user_id)
+            connection.commit()
+            cursor.close()
+            connection.close()
+
+            logger.info(f"Reconciled budget counters (user={user_id}): {corrected} corrected")
+            return corrected
+
+        except Error as e:
+            logger.error(f"Error reconciling budget counters: {e}")
+            if connection:
+                connection.rollback()
+                connection.close()
+            return 0
+
+    @staticmethod
+    def _reconcile_spent(cursor, user_id: Optional[int] = None, budget_id: Optional[int] = None) -> int:
+        """Set spent_amount to the SUM of matching expenses on the caller's cursor"""
+        query = RECONCILE_SPENT_SQL
+        conditions = []
+        params = []
+        if user_id is not None:
+            conditions.append("b.user_id = %s")
+            params.append(user_id)
+        if budget_id is not None:
+            conditions.append("b.id = %s")
+            params.append(budget_id)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        cursor.execute(query, params)
+        return cursor.rowcount
+
+    @staticmethod
+    def apply_spent_deltas(connection, user_id: int, deltas: List[tuple]) -> None:
+        """Apply expense deltas to the spent_amount of the user's matching budgets.
+
+        ``deltas`` holds ``(category_id, transaction_date, amount)`` tuples, with a
+        negative amount for removed expenses. Runs on the caller's connection
+        without committing, so counters change atomically with the transaction write.
+        """
+        if not deltas:
+            return
+
+        # Pre-aggregate so large uploads touch each (category, day) pair once.
+        # Decimal like the DECIMAL(10,2) columns, so the counter never drifts from the SUM
+        aggregated = defaultdict(Decimal)
+        for category_id, transaction_date, amount in deltas:
+            aggregated[(category_id, _to_date(transaction_date))] += _to_decimal(amount)
+
+        cursor = connection.cursor()
+        cursor.execute("""
+            SELECT id, category_id, start_date, end_date
+            FROM budgets WHERE user_id = %s
+        """, (user_id,))
+        budgets = cursor.fetchall()
+
+        updates = []
+        for budget_id, budget_category_id, start_date, end_date in budgets:
+            # Same predicate as the SUM in _reconcile_spent (NULL end_date never matches)
+            if end_date is None:
+                continue
+            delta = sum((
+                amount for (category_id, transaction_date), amount in aggregated.items()
+                if (budget_category_id is None or category_id == budget_category_id)
+                and start_date <= transaction_date <= end_date
+            ), Decimal(0))
+            if delta:
+                updates.append((delta, budget_id))
+
+        if updates:
+            cursor.executemany(
+                "UPDATE budgets SET spent_amount = spent_amount + %s WHERE id = %s",
+                updates
+            )
+        cursor.close()
+
+
+def _to_decimal(value) -> Decimal:
+    """Amounts come as Decimal from DECIMAL columns and as float from the parser"""
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def _to_date(value) -> date:
+    """Normalize DATE columns and ISO strings from the parser to date objects"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+if __name__ == '__main__':
+    # Reconcile job: python budget_service.py (e.g. nightly cron)
+    from railway_config import get_database_config
+
+    logging.basicConfig(level=logging.INFO)
+    BudgetService(get_database_config()).reconcile_spent_amounts()
@@ -1,5 +1,5 @@
-import mysql.connector
 from mysql.connector import Error
+from db import get_connection
 import logging
 from typing import List, Dict, Any, Optional
 
@@ -12,75 +12,12 @@ class CategoryService:
     def get_db_connection(self):
         """Create database connection"""
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = get_connection(self.db_config)
             return connection
         except Error as e:
             logger.error(f"Error connecting to MySQL: {e}")
             return None
 
-    def create_categories_table(self):
-        """Create categories table if it doesn't exist"""
-        connection = self.get_db_connection()
-        if not connection:
-            return False
-
-        try:
-            cursor = connection.cursor()
-            
-            # Create categories table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS categories (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT,
-                    name VARCHAR(100) NOT NULL,
-                    description TEXT,
-                    type ENUM('income', 'expense') NOT NULL,
-                    color VARCHAR(7) DEFAULT '#6B7280',
-                    icon VARCHAR(10) DEFAULT '💰',
-                    is_default BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                )
-            """)
-
-            # Insert default categories if they don't exist
-            default_categories = [
-                # Income categories
-                ('Stipendio', 'Stipendio mensile', 'income', '#10B981', '💰'),
-                ('Bonus', 'Bonus e premi', 'income', '#3B82F6', '🎁'),
-                ('Investimenti', 'Rendimenti da investimenti', 'income', '#8B5CF6', '📈'),
-                ('Altri', 'Altre entrate', 'income', '#6B7280', '➕'),
-                
-                # Expense categories
-                ('Alimentari', 'Spesa alimentare', 'expense', '#EF4444', '🛒'),
-                ('Trasporti', 'Trasporti pubblici e privati', 'expense', '#F59E0B', '🚗'),
-                ('Casa', 'Bollette e affitto', 'expense', '#8B5CF6', '🏠'),
-                ('Intrattenimento', 'Cinema, ristoranti, hobby', 'expense', '#EC4899', '🎬'),
-                ('Salute', 'Medicinali e visite mediche', 'expense', '#10B981', '💊'),
-                ('Shopping', 'Abbigliamento e accessori', 'expense', '#F97316', '👕'),
-                ('Viaggi', 'Vacanze e viaggi', 'expense', '#06B6D4', '✈️'),
-                ('Altri', 'Altre spese', 'expense', '#6B7280', '📝')
-            ]
-
-            for name, description, type_, color, icon in default_categories:
-                cursor.execute("""
-                    INSERT IGNORE INTO categories (name, description, type, color, icon, is_default)
-                    VALUES (%s, %s, %s, %s, %s, TRUE)
-                """, (name, description, type_, color, icon))
-
-            connection.commit()
-            cursor.close()
-            connection.close()
-            logger.info("Categories table created successfully")
-            return True
-
-        except Error as e:
-            logger.error(f"Error creating categories table: {e}")
-            if connection:
-                connection.close()
-            return False
-
     def get_categories(self, user_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """Get all categories or user-specific categories"""
         connection = self.get_db_connection()
@@ -1,17 +1,72 @@
 import csv
-import pandas as pd
 from datetime import datetime
 import re
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Union, TYPE_CHECKING
 import logging
 
+from parsed_transaction import ParsedTransaction, ParsedRow, InvalidTransaction, RejectedRow, MISSING_FIELD_ERRORS
+
+# pandas viene importato solo nei percorsi di parsing (costo di avvio elevato)
+if TYPE_CHECKING:
+    import pandas as pd
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Errori e righe scartate riportati per esteso (i conteggi per causa sono sempre completi)
+MAX_REPORTED_ERRORS = 100
+
+# Parole chiave per la categorizzazione automatica, in ordine di priorità (vince la
+# prima corrispondenza). Sono anche il seed delle regole globali di category_rules.
+CATEGORY_KEYWORDS = {
+    'Alimentari': [
+        'supermercato', 'conad', 'esselunga', 'carrefour', 'coop', 'lidl', 'aldi',
+        'pane', 'latte', 'frutta', 'verdura', 'macelleria', 'pescheria',
+        'ristorante', 'pizzeria', 'bar', 'caffè', 'gelato', 'fast food'
+    ],
+    'Trasporti': [
+        'benzina', 'diesel', 'enel', 'eni', 'q8', 'esso', 'shell', 'ip',
+        'metro', 'bus', 'treno', 'taxi', 'uber', 'noleggio', 'parcheggio',
+        'autostrada', 'pedaggio', 'assicurazione', 'bollo'
+    ],
+    'Casa': [
+        'bolletta', 'luce', 'gas', 'acqua', 'riscaldamento', 'condominio',
+        'affitto', 'mutuo', 'spese condominiali', 'elettricità'
+    ],
+    'Shopping': [
+        'vestiti', 'abbigliamento', 'scarpe', 'borsa', 'accessori',
+        'h&m', 'zara', 'uniqlo', 'nike', 'adidas', 'decathlon',
+        'amazon', 'ebay', 'aliexpress', 'shopping online'
+    ],
+    'Salute': [
+        'farmacia', 'medico', 'ospedale', 'visita', 'esame', 'analisi',
+        'palestra', 'fitness', 'piscina', 'massaggio', 'dentista'
+    ],
+    'Intrattenimento': [
+        'cinema', 'teatro', 'concerto', 'museo', 'mostra', 'disco',
+        'netflix', 'spotify', 'youtube', 'gaming', 'videogiochi'
+    ],
+    'Lavoro': [
+        'stipendio', 'bonus', 'premio', 'commissione', 'freelance',
+        'ufficio', 'materiale', 'corso', 'formazione'
+    ],
+    'Risparmio': [
+        'investimento', 'fondi', 'azioni', 'obbligazioni', 'deposito',
+        'risparmio', 'conto deposito', 'piano accumulo'
+    ]
+}
+
 class CSVTransactionParser:
     """Parser per file CSV e Excel di estratti conto bancari"""
     
-    def __init__(self):
+    def __init__(self, keep_original_rows: bool = False, categorize: bool = True):
+        # Le righe originali non vengono salvate nel DB: di default ogni transazione
+        # porta solo l'indice della riga sorgente ('source_row'); con keep_original_rows
+        # anche i valori della riga, come tupla ('original_row')
+        self.keep_original_rows = keep_original_rows
+        # Con categorize=False le righe senza categoria nel file restano con category=None
+        # e vengono categorizzate al salvataggio con le regole di category_rules
+        self.categorize = categorize
         self.supported_formats = {
             'standard': {
                 'date_col': 'date',
@@ -54,43 +109,7 @@ class CSVTransactionParser:
         }
         
         # Categorie predefinite per la categorizzazione automatica
-        self.category_keywords = {
-            'Alimentari': [
-                'supermercato', 'conad', 'esselunga', 'carrefour', 'coop', 'lidl', 'aldi',
-                'pane', 'latte', 'frutta', 'verdura', 'macelleria', 'pescheria',
-                'ristorante', 'pizzeria', 'bar', 'caffè', 'gelato', 'fast food'
-            ],
-            'Trasporti': [
-                'benzina', 'diesel', 'enel', 'eni', 'q8', 'esso', 'shell', 'ip',
-                'metro', 'bus', 'treno', 'taxi', 'uber', 'noleggio', 'parcheggio',
-                'autostrada', 'pedaggio', 'assicurazione', 'bollo'
-            ],
-            'Casa': [
-                'bolletta', 'luce', 'gas', 'acqua', 'riscaldamento', 'condominio',
-                'affitto', 'mutuo', 'spese condominiali', 'elettricità'
-            ],
-            'Shopping': [
-                'vestiti', 'abbigliamento', 'scarpe', 'borsa', 'accessori',
-                'h&m', 'zara', 'uniqlo', 'nike', 'adidas', 'decathlon',
-                'amazon', 'ebay', 'aliexpress', 'shopping online'
-            ],
-            'Salute': [
-                'farmacia', 'medico', 'ospedale', 'visita', 'esame', 'analisi',
-                'palestra', 'fitness', 'piscina', 'massaggio', 'dentista'
-            ],
-            'Intrattenimento': [
-                'cinema', 'teatro', 'concerto', 'museo', 'mostra', 'disco',
-                'netflix', 'spotify', 'youtube', 'gaming', 'videogiochi'
-            ],
-            'Lavoro': [
-                'stipendio', 'bonus', 'premio', 'commissione', 'freelance',
-                'ufficio', 'materiale', 'corso', 'formazione'
-            ],
-            'Risparmio': [
-                'investimento', 'fondi', 'azioni', 'obbligazioni', 'deposito',
-                'risparmio', 'conto deposito', 'piano accumulo'
-            ]
-        }
+        self.category_keywords = CATEGORY_KEYWORDS
     
     def detect_file_type(self, file_path: str) -> str:
         """Rileva se il file è CSV o Excel"""
@@ -110,6 +129,7 @@ class CSVTransactionParser:
     
     def _detect_excel_format(self, file_path: str) -> str:
         """Rileva automaticamente il formato del file Excel"""
+        import pandas as pd
         try:
             df = pd.read_excel(file_path, nrows=5)  # Legge le prime 5 righe per analizzare
             headers = df.columns.tolist()
@@ -213,7 +233,7 @@ class CSVTransactionParser:
         logger.error("Impossibile rilevare il formato del file CSV")
         return 'standard'
     
-    def parse_file(self, file_path: str, format_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    def parse_file(self, file_path: str, format_type: Optional[str] = None) -> List[ParsedRow]:
         """Parsa il file (CSV o Excel) e restituisce le transazioni"""
         try:
             file_type = self.detect_file_type(file_path)
@@ -239,11 +259,11 @@ class CSVTransactionParser:
             logger.error(f"Errore nel parsing file: {e}")
             raise
     
-    def parse_csv(self, file_path: str, format_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    def parse_csv(self, file_path: str, format_type: Optional[str] = None) -> List[ParsedRow]:
         """Parsa il file CSV e restituisce le transazioni (metodo legacy per compatibilità)"""
         return self.parse_file(file_path, format_type)
     
-    def _parse_csv_file(self, file_path: str, format_type: str) -> List[Dict[str, Any]]:
+    def _parse_csv_file(self, file_path: str, format_type: str) -> List[ParsedRow]:
         """Parsa il file CSV e restituisce le transazioni"""
         if format_type == 'standard':
             return self._parse_standard_csv(file_path)
@@ -252,8 +272,9 @@ class CSVTransactionParser:
         else:
             raise ValueError(f"Formato non supportato: {format_type}")
     
-    def _parse_excel_file(self, file_path: str, format_type: str) -> List[Dict[str, Any]]:
+    def _parse_excel_file(self, file_path: str, format_type: str) -> List[ParsedRow]:
         """Parsa il file Excel e restituisce le transazioni"""
+        import pandas as pd
         try:
             # Carica il file Excel senza header per vedere tutte le righe
             df = pd.read_excel(file_path, header=None)
@@ -354,12 +375,14 @@ class CSVTransactionParser:
                             parsed_date = self._parse_date(date_str)
                             if not parsed_date:
                                 logger.warning(f"Data non valida: {date_str}")
+                                transactions.append(RejectedRow(index, 'missing_date', f"Data non valida: {date_str}"))
                                 continue
                             
                             # Parsa l'importo
                             parsed_amount = self._parse_amount(amount_str)
                             if parsed_amount is None:
                                 logger.warning(f"Importo non valido: {amount_str}")
+                                transactions.append(RejectedRow(index, 'invalid_amount', f"Importo non valido: {amount_str}"))
                                 continue
                             
                             # Combina operazione e dettagli per la descrizione
@@ -381,20 +404,21 @@ class CSVTransactionParser:
                             # Categorizza automaticamente
                             category = self._auto_categorize(description)
                             
-                            transaction = {
-                                'transaction_date': parsed_date,
-                                'description': description,
-                                'amount': abs(parsed_amount),
-                                'type': transaction_type,
-                                'category': category,
-                                'bank': 'intesa_sanpaolo'
-                            }
+                            transaction = self._append_row(
+                                transactions, index,
+                                transaction_date=parsed_date,
+                                description=description,
+                                amount=abs(parsed_amount),
+                                type=transaction_type,
+                                category=category,
+                                bank='intesa_sanpaolo'
+                            )
                             
-                            transactions.append(transaction)
                             logger.info(f"✅ Transazione aggiunta: {transaction}")
                 
                 except Exception as e:
                     logger.error(f"❌ Errore nel parsing della riga {index}: {e}")
+                    transactions.append(RejectedRow(index, 'parse_error', str(e)))
                     continue
             
             logger.info(f"🎉 Risultato parsing: {len(transactions)} transazioni")
@@ -404,7 +428,7 @@ class CSVTransactionParser:
             logger.error(f"❌ Errore nel parsing Excel: {e}")
             raise
     
-    def _parse_standard_csv(self, file_path: str) -> List[Dict[str, Any]]:
+    def _parse_standard_csv(self, file_path: str) -> List[ParsedRow]:
         """Parsa CSV in formato standard"""
         transactions = []
         
@@ -435,14 +459,13 @@ class CSVTransactionParser:
         # Debug: mostra le prime righe del file
         logger.info(f"Header CSV: {reader.fieldnames}")
         logger.info(f"Prime 3 righe del file:")
-        file_obj.seek(0)  # Reset alla posizione iniziale
         for i, row in enumerate(csv.DictReader(StringIO(file_content))):
             if i < 3:
                 logger.info(f"Riga {i+1}: {row}")
             else:
                 break
         
-        for row in reader:
+        for index, row in enumerate(reader):
             try:
                 # Pulisci e valida i dati
                 date = self._parse_date(row.get('date', ''))
@@ -451,29 +474,31 @@ class CSVTransactionParser:
                 transaction_type = row.get('type', 'expense').lower()
                 category = row.get('category', '').strip()
                 
-                if not all([date, description, amount]):
+                if self._skip_incomplete(transactions, index, date, description, amount):
                     continue
                 
                 # Categorizzazione automatica se non specificata
                 if not category:
                     category = self._auto_categorize(description)
                 
-                transactions.append({
-                    'transaction_date': date,
-                    'description': description,
-                    'amount': amount,
-                    'type': transaction_type,
-                    'category': category,
-                    'original_row': row
-                })
+                self._append_row(
+                    transactions, index,
+                    transaction_date=date,
+                    description=description,
+                    amount=amount,
+                    type=transaction_type,
+                    category=category,
+                    **self._source_fields(index, row)
+                )
                 
             except Exception as e:
                 logger.warning(f"Errore nel parsing riga: {e}")
+                transactions.append(RejectedRow(index, 'parse_error', str(e)))
                 continue
         
         return transactions
     
-    def _parse_standard_excel(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+    def _parse_standard_excel(self, df: 'pd.DataFrame') -> List[ParsedRow]:
         """Parsa un file Excel con formato standard"""
         logger.info(f"Parsing Excel standard. Colonne disponibili: {list(df.columns)}")
         
@@ -496,8 +521,9 @@ class CSVTransactionParser:
         # Altrimenti usa il formato standard
         return self._parse_standard_excel_with_headers(df)
     
-    def _parse_standard_excel_with_headers(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+    def _parse_standard_excel_with_headers(self, df: 'pd.DataFrame') -> List[ParsedRow]:
         """Parsa un file Excel con header già impostati"""
+        import pandas as pd
         logger.info(f"Parsing Excel con header: {list(df.columns)}")
         
         transactions = []
@@ -543,12 +569,14 @@ class CSVTransactionParser:
                         parsed_date = self._parse_date(date_str)
                         if not parsed_date:
                             logger.warning(f"Data non valida: {date_str}")
+                            transactions.append(RejectedRow(index, 'missing_date', f"Data non valida: {date_str}"))
                             continue
                         
                         # Parsa l'importo
                         parsed_amount = self._parse_amount(amount_str)
                         if parsed_amount is None:
                             logger.warning(f"Importo non valido: {amount_str}")
+                            transactions.append(RejectedRow(index, 'invalid_amount', f"Importo non valido: {amount_str}"))
                             continue
                         
                         # Determina il tipo di transazione
@@ -557,26 +585,27 @@ class CSVTransactionParser:
                         # Categorizza automaticamente
                         category = self._auto_categorize(desc_str)
                         
-                        transaction = {
-                            'transaction_date': parsed_date,
-                            'description': desc_str.strip(),
-                            'amount': parsed_amount,
-                            'type': transaction_type,
-                            'category': category,
-                            'bank': 'standard'
-                        }
+                        transaction = self._append_row(
+                            transactions, index,
+                            transaction_date=parsed_date,
+                            description=desc_str.strip(),
+                            amount=parsed_amount,
+                            type=transaction_type,
+                            category=category,
+                            bank='standard'
+                        )
                         
-                        transactions.append(transaction)
                         logger.info(f"Transazione aggiunta: {transaction}")
                 
             except Exception as e:
                 logger.error(f"Errore nel parsing della riga {index}: {e}")
+                transactions.append(RejectedRow(index, 'parse_error', str(e)))
                 continue
         
         logger.info(f"Risultato parsing: {type(transactions)}, lunghezza: {len(transactions)}")
         return transactions
     
-    def _parse_bank_excel(self, df: pd.DataFrame, bank_type: str) -> List[Dict[str, Any]]:
+    def _parse_bank_excel(self, df: 'pd.DataFrame', bank_type: str) -> List[ParsedRow]:
         """Parsa DataFrame Excel di banche specifiche"""
         if bank_type == 'modern_bank':
             return self._parse_modern_bank_excel(df)
@@ -596,7 +625,7 @@ class CSVTransactionParser:
                 # Pulisci l'importo (rimuovi simboli di valuta, spazi, ecc.)
                 amount = self._parse_bank_amount(amount_str)
                 
-                if not all([date, description, amount]):
+                if self._skip_incomplete(transactions, index, date, description, amount):
                     continue
                 
                 # Determina il tipo dalla banca
@@ -605,22 +634,24 @@ class CSVTransactionParser:
                 # Categorizzazione automatica
                 category = self._auto_categorize(description)
                 
-                transactions.append({
-                    'transaction_date': date,
-                    'description': description,
-                    'amount': abs(amount),  # Salva sempre valore positivo
-                    'type': transaction_type,
-                    'category': category,
-                    'original_row': row.to_dict()
-                })
+                self._append_row(
+                    transactions, index,
+                    transaction_date=date,
+                    description=description,
+                    amount=abs(amount),  # Salva sempre valore positivo
+                    type=transaction_type,
+                    category=category,
+                    **self._source_fields(index, row)
+                )
                 
             except Exception as e:
                 logger.warning(f"Errore nel parsing riga Excel banca {bank_type} {index}: {e}")
+                transactions.append(RejectedRow(index, 'parse_error', str(e)))
                 continue
         
         return transactions
     
-    def _parse_modern_bank_excel(self, df: pd.DataFrame) -> List[Dict[str, Any]]:
+    def _parse_modern_bank_excel(self, df: 'pd.DataFrame') -> List[ParsedRow]:
         """Parsa DataFrame Excel in formato modern_bank (formato del tuo file Excel)"""
         transactions = []
         format_config = self.supported_formats['modern_bank']
@@ -655,8 +686,7 @@ class CSVTransactionParser:
                 # Pulisci l'importo
                 amount = self._parse_modern_amount(amount_str)
                 
-                if not all([date, details, amount]):
-                    logger.warning(f"Riga Excel {index} saltata: dati mancanti (date={date}, details={details}, amount={amount})")
+                if self._skip_incomplete(transactions, index, date, details, amount):
                     continue
                 
                 # Combina operazione e dettagli per la descrizione
@@ -669,30 +699,32 @@ class CSVTransactionParser:
                 if not category or category.lower() in ['uncategorized', '']:
                     category = self._auto_categorize(description)
                 
-                transaction = {
-                    'transaction_date': date,
-                    'description': description,
-                    'amount': abs(amount),  # Salva sempre valore positivo
-                    'type': transaction_type,
-                    'category': category,
-                    'account': account,
-                    'status': status,
-                    'currency': currency,
-                    'original_row': row.to_dict()
-                }
-                
-                transactions.append(transaction)
+                transaction = self._append_row(
+                    transactions, index,
+                    transaction_date=date,
+                    description=description,
+                    amount=abs(amount),  # Salva sempre valore positivo
+                    type=transaction_type,
+                    category=category,
+                    account=account,
+                    status=status,
+                    currency=currency,
+                    **self._source_fields(index, row)
+                )
+                
                 logger.info(f"Transazione aggiunta: {transaction}")
                 
             except Exception as e:
                 logger.warning(f"Errore nel parsing riga Excel modern_bank {index}: {e}")
+                transactions.append(RejectedRow(index, 'parse_error', str(e)))
                 continue
         
         logger.info(f"Risultato parsing modern_bank: {len(transactions)} transazioni")
         return transactions
     
-    def _parse_bank_csv(self, file_path: str, bank_type: str) -> List[Dict[str, Any]]:
+    def _parse_bank_csv(self, file_path: str, bank_type: str) -> List[ParsedRow]:
         """Parsa CSV di banche specifiche"""
+        import pandas as pd
         if bank_type == 'modern_bank':
             return self._parse_modern_bank_csv(file_path)
         
@@ -717,7 +749,7 @@ class CSVTransactionParser:
         if df is None:
             raise ValueError("Impossibile leggere il file CSV con nessuna codifica supportata")
         
-        for _, row in df.iterrows():
+        for index, row in df.iterrows():
             try:
                 # Estrai i dati secondo il formato della banca
                 date = self._parse_date(str(row.get(format_config['date_col'], '')))
@@ -727,7 +759,7 @@ class CSVTransactionParser:
                 # Pulisci l'importo (rimuovi simboli di valuta, spazi, ecc.)
                 amount = self._parse_bank_amount(amount_str)
                 
-                if not all([date, description, amount]):
+                if self._skip_incomplete(transactions, index, date, description, amount):
                     continue
                 
                 # Determina il tipo dalla banca
@@ -736,23 +768,26 @@ class CSVTransactionParser:
                 # Categorizzazione automatica
                 category = self._auto_categorize(description)
                 
-                transactions.append({
-                    'transaction_date': date,
-                    'description': description,
-                    'amount': abs(amount),  # Salva sempre valore positivo
-                    'type': transaction_type,
-                    'category': category,
-                    'original_row': row.to_dict()
-                })
+                self._append_row(
+                    transactions, index,
+                    transaction_date=date,
+                    description=description,
+                    amount=abs(amount),  # Salva sempre valore positivo
+                    type=transaction_type,
+                    category=category,
+                    **self._source_fields(index, row)
+                )
                 
             except Exception as e:
                 logger.warning(f"Errore nel parsing riga banca {bank_type}: {e}")
+                transactions.append(RejectedRow(index, 'parse_error', str(e)))
                 continue
         
         return transactions
     
-    def _parse_modern_bank_csv(self, file_path: str) -> List[Dict[str, Any]]:
+    def _parse_modern_bank_csv(self, file_path: str) -> List[ParsedRow]:
         """Parsa CSV in formato modern_bank (formato del tuo file Excel)"""
+        import pandas as pd
         transactions = []
         format_config = self.supported_formats['modern_bank']
         
@@ -791,8 +826,7 @@ class CSVTransactionParser:
                 # Pulisci l'importo
                 amount = self._parse_modern_amount(amount_str)
                 
-                if not all([date, details, amount]):
-                    logger.warning(f"Riga {index} saltata: dati mancanti (date={date}, details={details}, amount={amount})")
+                if self._skip_incomplete(transactions, index, date, details, amount):
                     continue
                 
                 # Combina operazione e dettagli per la descrizione
@@ -805,24 +839,53 @@ class CSVTransactionParser:
                 if not category or category.lower() in ['uncategorized', '']:
                     category = self._auto_categorize(description)
                 
-                transactions.append({
-                    'transaction_date': date,
-                    'description': description,
-                    'amount': abs(amount),  # Salva sempre valore positivo
-                    'type': transaction_type,
-                    'category': category,
-                    'account': account,
-                    'status': status,
-                    'currency': currency,
-                    'original_row': row.to_dict()
-                })
+                self._append_row(
+                    transactions, index,
+                    transaction_date=date,
+                    description=description,
+                    amount=abs(amount),  # Salva sempre valore positivo
+                    type=transaction_type,
+                    category=category,
+                    account=account,
+                    status=status,
+                    currency=currency,
+                    **self._source_fields(index, row)
+                )
                 
             except Exception as e:
                 logger.warning(f"Errore nel parsing riga modern_bank {index}: {e}")
+                transactions.append(RejectedRow(index, 'parse_error', str(e)))
                 continue
         
         return transactions
     
+    def _append_row(self, transactions: list, index: int, **fields) -> Optional[ParsedTransaction]:
+        """Aggiunge il record validato, oppure uno scarto con la causa se la riga non è valida"""
+        try:
+            record = ParsedTransaction(**fields)
+        except InvalidTransaction as e:
+            transactions.append(RejectedRow(index, e.reason, str(e)))
+            return None
+        transactions.append(record)
+        return record
+    
+    def _skip_incomplete(self, transactions: list, index: int, date, description, amount) -> bool:
+        """True se la riga va saltata: vuota o di riepilogo (ignorata) o incompleta (scartata)"""
+        if not date and not amount:
+            return True
+        for reason, value in (('missing_date', date), ('missing_description', description), ('invalid_amount', amount)):
+            if not value:
+                transactions.append(RejectedRow(index, reason, MISSING_FIELD_ERRORS[reason]))
+                return True
+        return False
+    
+    def _source_fields(self, index: int, row) -> Dict[str, Any]:
+        """Riferimento compatto alla riga sorgente (e i suoi valori se keep_original_rows)"""
+        if not self.keep_original_rows:
+            return {'source_row': index}
+        values = row.tolist() if hasattr(row, 'tolist') else list(row.values())
+        return {'source_row': index, 'original_row': tuple(values)}
+    
     def _parse_date(self, date_str: str) -> Optional[str]:
         """Converte stringa data in formato ISO"""
         if not date_str or date_str.strip() == '':
@@ -929,8 +992,11 @@ class CSVTransactionParser:
         else:
             return 'expense'
     
-    def _auto_categorize(self, description: str) -> str:
+    def _auto_categorize(self, description: str) -> Optional[str]:
         """Categorizza automaticamente la transazione basandosi sulla descrizione"""
+        if not self.categorize:
+            return None
+        
         description_lower = description.lower()
         
         for category, keywords in self.category_keywords.items():
@@ -940,55 +1006,79 @@ class CSVTransactionParser:
         
         return 'Altro'  # Categoria di default
     
-    def validate_transactions(self, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Valida le transazioni parsate e restituisce statistiche"""
+    def validate_transactions(self, transactions: List[Union[ParsedRow, Dict[str, Any]]],
+                              max_errors: int = MAX_REPORTED_ERRORS) -> Dict[str, Any]:
+        """Separa transazioni valide e scarti e calcola le statistiche in un solo passaggio.
+
+        Gli elenchi di errori e di righe scartate sono limitati a `max_errors`; i
+        conteggi per causa e `errors_count` restano completi. `valid` è True solo
+        se non ci sono scarti: in modalità parziale il chiamante salva comunque
+        `transactions` e restituisce il report degli scarti.
+        """
         if not transactions:
             return {
                 'valid': False,
                 'error': 'Nessuna transazione trovata',
+                'transactions': [],
+                'rejected': [],
                 'stats': {}
             }
         
         valid_transactions = []
         errors = []
+        rejected = []
+        errors_by_reason: Dict[str, int] = {}
+        total_income = 0
+        total_expenses = 0
+        categories = set()
         
         for i, trans in enumerate(transactions):
-            # Controlla sia 'date' che 'transaction_date' per compatibilità
-            date = trans.get('date') or trans.get('transaction_date')
-            if not date:
-                errors.append(f"Riga {i+1}: Data mancante")
-                continue
-            if not trans.get('description'):
-                errors.append(f"Riga {i+1}: Descrizione mancante")
-                continue
-            if not trans.get('amount') or trans['amount'] == 0:
-                errors.append(f"Riga {i+1}: Importo mancante o zero")
+            # I record del parser sono validati alla costruzione; i dict vengono convertiti qui
+            if not isinstance(trans, (ParsedTransaction, RejectedRow)):
+                try:
+                    trans = ParsedTransaction.from_dict(trans)
+                except InvalidTransaction as e:
+                    trans = RejectedRow(i, e.reason, str(e))
+            
+            if isinstance(trans, RejectedRow):
+                errors_by_reason[trans.reason] = errors_by_reason.get(trans.reason, 0) + 1
+                if len(rejected) < max_errors:
+                    report = trans.to_dict()
+                    rejected.append(report)
+                    errors.append(f"Riga {report['row'] or i + 1}: {trans.message}")
                 continue
             
             valid_transactions.append(trans)
+            if trans.type == 'income':
+                total_income += trans.amount
+            else:
+                total_expenses += trans.amount
+            if trans.category:
+                categories.add(trans.category)
         
-        # Calcola statistiche
-        total_income = sum(t['amount'] for t in valid_transactions if t['type'] == 'income')
-        total_expenses = sum(t['amount'] for t in valid_transactions if t['type'] == 'expense')
-        
+        errors_count = sum(errors_by_reason.values())
         stats = {
             'total_transactions': len(valid_transactions),
             'total_income': total_income,
             'total_expenses': total_expenses,
             'net_amount': total_income - total_expenses,
-            'errors_count': len(errors),
+            'errors_count': errors_count,
             'errors': errors,
-            'categories': list(set(t['category'] for t in valid_transactions))
+            'errors_by_reason': errors_by_reason,
+            'errors_truncated': errors_count > len(errors),
+            'categories': sorted(categories)
         }
         
         return {
-            'valid': len(errors) == 0,
+            'valid': errors_count == 0,
             'transactions': valid_transactions,
+            'rejected': rejected,
             'stats': stats
         }
     
     def convert_excel_to_csv(self, excel_file_path: str, csv_file_path: str = None) -> str:
         """Converte un file Excel in CSV"""
+        import pandas as pd
         try:
             if not csv_file_path:
                 # Genera automaticamente il nome del file CSV
@@ -1,11 +1,106 @@
-import mysql.connector
 from mysql.connector import Error
+from db import get_connection
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime, date, timedelta
 
 logger = logging.getLogger(__name__)
 
+# SQL as module constants: async_service.py runs the same queries on aiomysql and
+# hot_queries.py can EXPLAIN exactly what both paths execute
+MONTH_TOTALS_SQL = """
+    SELECT
+        COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as total_income,
+        COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as total_expenses,
+        COUNT(*) as total_transactions
+    FROM transactions
+    WHERE user_id = %s AND transaction_date >= %s AND transaction_date < %s
+"""
+
+TOP_EXPENSE_CATEGORIES_SQL = """
+    SELECT
+        c.name as category_name,
+        c.color as category_color,
+        c.icon as category_icon,
+        COALESCE(SUM(t.amount), 0) as total_amount,
+        COUNT(*) as transaction_count
+    FROM transactions t
+    LEFT JOIN categories c ON t.category_id = c.id
+    WHERE t.user_id = %s AND t.type = 'expense'
+    AND t.transaction_date >= %s AND t.transaction_date < %s
+    GROUP BY c.id, c.name, c.color, c.icon
+    ORDER BY total_amount DESC
+    LIMIT 5
+"""
+
+RECENT_TRANSACTIONS_SQL = """
+    SELECT
+        t.*,
+        c.name as category_name,
+        c.color as category_color,
+        c.icon as category_icon
+    FROM transactions t
+    LEFT JOIN categories c ON t.category_id = c.id
+    WHERE t.user_id = %s
+    ORDER BY t.transaction_date DESC, t.created_at DESC
+    LIMIT 10
+"""
+
+# spent_amount is a running counter on budgets
+BUDGET_PROGRESS_SQL = """
+    SELECT
+        b.*,
+        c.name as category_name,
+        c.color as category_color,
+        c.icon as category_icon
+    FROM budgets b
+    LEFT JOIN categories c ON b.category_id = c.id
+    WHERE b.user_id = %s AND b.is_active = TRUE
+    ORDER BY b.created_at DESC
+    LIMIT 5
+"""
+
+CATEGORY_BREAKDOWN_SQL = """
+    SELECT
+        t.category as category_name,
+        t.type,
+        SUM(t.amount) as total_amount,
+        COUNT(*) as transaction_count
+    FROM transactions t
+    WHERE t.user_id = %s AND t.transaction_date >= %s AND t.transaction_date < %s
+    GROUP BY t.category, t.type
+    ORDER BY t.type, total_amount DESC
+"""
+
+DAILY_BREAKDOWN_SQL = """
+    SELECT
+        DATE(transaction_date) as date,
+        COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as daily_income,
+        COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as daily_expenses,
+        COUNT(*) as daily_transactions
+    FROM transactions
+    WHERE user_id = %s AND transaction_date >= %s AND transaction_date < %s
+    GROUP BY DATE(transaction_date)
+    ORDER BY date
+"""
+
+CATEGORY_STATS_SQL = """
+    SELECT
+        t.category as category_name,
+        t.type,
+        SUM(t.amount) as total_amount,
+        COUNT(*) as transaction_count,
+        AVG(t.amount) as average_amount,
+        MIN(t.amount) as min_amount,
+        MAX(t.amount) as max_amount
+    FROM transactions t
+    WHERE t.user_id = %s
+        AND t.transaction_date >= %s
+        AND t.transaction_date < %s
+    GROUP BY t.category, t.type
+    ORDER BY t.type, total_amount DESC
+"""
+
 class DashboardService:
     def __init__(self, db_config: Dict[str, Any]):
         self.db_config = db_config
@@ -13,7 +108,7 @@ class DashboardService:
     def get_db_connection(self):
         """Create database connection"""
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = get_connection(self.db_config)
             return connection
         except Error as e:
             logger.error(f"Error connecting to MySQL: {e}")
@@ -27,136 +122,36 @@ class DashboardService:
 
         try:
             cursor = connection.cursor(dictionary=True)
-            
-            # Get current month stats
-            current_month = date.today().replace(day=1)
-            next_month = (current_month + timedelta(days=32)).replace(day=1)
-            
+
+            current_month, next_month, prev_month = self.dashboard_months()
+
             # Total income and expenses for current month
-            cursor.execute("""
-                SELECT 
-                    COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as total_income,
-                    COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as total_expenses,
-                    COUNT(*) as total_transactions
-                FROM transactions 
-                WHERE user_id = %s AND transaction_date >= %s AND transaction_date < %s
-            """, (user_id, current_month, next_month))
-            
+            cursor.execute(MONTH_TOTALS_SQL, (user_id, current_month, next_month))
             current_month_stats = cursor.fetchone()
-            
+
             # Previous month stats for comparison
-            prev_month = (current_month - timedelta(days=1)).replace(day=1)
-            prev_month_end = current_month - timedelta(days=1)
-            
-            cursor.execute("""
-                SELECT 
-                    COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as total_income,
-                    COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as total_expenses
-                FROM transactions 
-                WHERE user_id = %s AND transaction_date >= %s AND transaction_date <= %s
-            """, (user_id, prev_month, prev_month_end))
-            
+            cursor.execute(MONTH_TOTALS_SQL, (user_id, prev_month, current_month))
             prev_month_stats = cursor.fetchone()
-            
-            # Calculate changes
-            income_change = 0
-            expense_change = 0
-            
-            if prev_month_stats['total_income'] > 0:
-                income_change = ((current_month_stats['total_income'] - prev_month_stats['total_income']) / prev_month_stats['total_income']) * 100
-            
-            if prev_month_stats['total_expenses'] > 0:
-                expense_change = ((current_month_stats['total_expenses'] - prev_month_stats['total_expenses']) / prev_month_stats['total_expenses']) * 100
-            
-            # Net balance
-            net_balance = current_month_stats['total_income'] - current_month_stats['total_expenses']
-            
-            # Daily average spending
-            days_in_month = (next_month - current_month).days
-            daily_average = current_month_stats['total_expenses'] / days_in_month if days_in_month > 0 else 0
-            
+
             # Top expense categories
-            cursor.execute("""
-                SELECT 
-                    c.name as category_name,
-                    c.color as category_color,
-                    c.icon as category_icon,
-                    COALESCE(SUM(t.amount), 0) as total_amount,
-                    COUNT(*) as transaction_count
-                FROM transactions t
-                LEFT JOIN categories c ON t.category_id = c.id
-                WHERE t.user_id = %s AND t.type = 'expense' 
-                AND t.transaction_date >= %s AND t.transaction_date < %s
-                GROUP BY c.id, c.name, c.color, c.icon
-                ORDER BY total_amount DESC
-                LIMIT 5
-            """, (user_id, current_month, next_month))
-            
+            cursor.execute(TOP_EXPENSE_CATEGORIES_SQL, (user_id, current_month, next_month))
             top_expense_categories = cursor.fetchall()
-            
+
             # Recent transactions
-            cursor.execute("""
-                SELECT 
-                    t.*,
-                    c.name as category_name,
-                    c.color as category_color,
-                    c.icon as category_icon
-                FROM transactions t
-                LEFT JOIN categories c ON t.category_id = c.id
-                WHERE t.user_id = %s
-                ORDER BY t.transaction_date DESC, t.created_at DESC
-                LIMIT 10
-            """, (user_id,))
-            
+            cursor.execute(RECENT_TRANSACTIONS_SQL, (user_id,))
             recent_transactions = cursor.fetchall()
-            
+
             # Budget progress
-            cursor.execute("""
-                SELECT 
-                    b.*,
-                    c.name as category_name,
-                    c.color as category_color,
-                    c.icon as category_icon,
-                    COALESCE(SUM(t.amount), 0) as spent_amount
-                FROM budgets b
-                LEFT JOIN categories c ON b.category_id = c.id
-                LEFT JOIN transactions t ON t.category_id = b.category_id 
-                    AND t.user_id = b.user_id 
-                    AND t.type = 'expense'
-                    AND t.transaction_date BETWEEN b.start_date AND b.end_date
-                WHERE b.user_id = %s AND b.is_active = TRUE
-                GROUP BY b.id, b.name, b.amount, b.period, b.start_date, b.end_date, 
-                         c.name, c.color, c.icon
-                ORDER BY b.created_at DESC
-                LIMIT 5
-            """, (user_id,))
-            
+            cursor.execute(BUDGET_PROGRESS_SQL, (user_id,))
             budget_progress = cursor.fetchall()
-            
-            # Calculate budget percentages
-            for budget in budget_progress:
-                budget['percentage_used'] = (budget['spent_amount'] / budget['amount']) * 100 if budget['amount'] > 0 else 0
-                budget['remaining_amount'] = budget['amount'] - budget['spent_amount']
-            
+
             cursor.close()
             connection.close()
-            
-            return {
-                'current_month': {
-                    'total_income': float(current_month_stats['total_income']),
-                    'total_expenses': float(current_month_stats['total_expenses']),
-                    'net_balance': float(net_balance),
-                    'total_transactions': current_month_stats['total_transactions'],
-                    'daily_average': float(daily_average)
-                },
-                'changes': {
-                    'income_change': float(income_change),
-                    'expense_change': float(expense_change)
-                },
-                'top_expense_categories': top_expense_categories,
-                'recent_transactions': recent_transactions,
-                'budget_progress': budget_progress
-            }
+
+            return self.compose_dashboard_stats(
+                current_month, next_month, current_month_stats, prev_month_stats,
+                top_expense_categories, recent_transactions, budget_progress
+            )
 
         except Error as e:
             logger.error(f"Error getting dashboard stats for user {user_id}: {e}")
@@ -164,6 +159,60 @@ class DashboardService:
                 connection.close()
             return {}
 
+    @staticmethod
+    def dashboard_months() -> tuple:
+        """Start of current month, start of next month, start of previous month"""
+        current_month = date.today().replace(day=1)
+        next_month = (current_month + timedelta(days=32)).replace(day=1)
+        prev_month = (current_month - timedelta(days=1)).replace(day=1)
+        return current_month, next_month, prev_month
+
+    @staticmethod
+    def compose_dashboard_stats(current_month: date, next_month: date,
+                                current_month_stats: Dict[str, Any], prev_month_stats: Dict[str, Any],
+                                top_expense_categories: List[Dict[str, Any]],
+                                recent_transactions: List[Dict[str, Any]],
+                                budget_progress: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the dashboard payload from the raw query results"""
+        # Calculate changes
+        income_change = 0
+        expense_change = 0
+
+        if prev_month_stats['total_income'] > 0:
+            income_change = ((current_month_stats['total_income'] - prev_month_stats['total_income']) / prev_month_stats['total_income']) * 100
+
+        if prev_month_stats['total_expenses'] > 0:
+            expense_change = ((current_month_stats['total_expenses'] - prev_month_stats['total_expenses']) / prev_month_stats['total_expenses']) * 100
+
+        # Net balance
+        net_balance = current_month_stats['total_income'] - current_month_stats['total_expenses']
+
+        # Daily average spending
+        days_in_month = (next_month - current_month).days
+        daily_average = current_month_stats['total_expenses'] / days_in_month if days_in_month > 0 else 0
+
+        # Calculate budget percentages
+        for budget in budget_progress:
+            budget['percentage_used'] = (budget['spent_amount'] / budget['amount']) * 100 if budget['amount'] > 0 else 0
+            budget['remaining_amount'] = budget['amount'] - budget['spent_amount']
+
+        return {
+            'current_month': {
+                'total_income': float(current_month_stats['total_income']),
+                'total_expenses': float(current_month_stats['total_expenses']),
+                'net_balance': float(net_balance),
+                'total_transactions': current_month_stats['total_transactions'],
+                'daily_average': float(daily_average)
+            },
+            'changes': {
+                'income_change': float(income_change),
+                'expense_change': float(expense_change)
+            },
+            'top_expense_categories': top_expense_categories,
+            'recent_transactions': recent_transactions,
+            'budget_progress': budget_progress
+        }
+
     def get_monthly_stats(self, user_id: int, year: int, month: int) -> Dict[str, Any]:
         """Get statistics for a specific month"""
         connection = self.get_db_connection()
@@ -172,69 +221,25 @@ class DashboardService:
 
         try:
             cursor = connection.cursor(dictionary=True)
-            
-            # Calculate date range
-            start_date = date(year, month, 1)
-            if month == 12:
-                end_date = date(year + 1, 1, 1)
-            else:
-                end_date = date(year, month + 1, 1)
-            
+
+            start_date, end_date = self.month_range(year, month)
+
             # Monthly totals
-            cursor.execute("""
-                SELECT 
-                    COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as total_income,
-                    COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as total_expenses,
-                    COUNT(*) as total_transactions
-                FROM transactions 
-                WHERE user_id = %s AND transaction_date >= %s AND transaction_date < %s
-            """, (user_id, start_date, end_date))
-            
+            cursor.execute(MONTH_TOTALS_SQL, (user_id, start_date, end_date))
             monthly_stats = cursor.fetchone()
-            
+
             # Category breakdown
-            cursor.execute("""
-                SELECT 
-                    t.category as category_name,
-                    t.type,
-                    SUM(t.amount) as total_amount,
-                    COUNT(*) as transaction_count
-                FROM transactions t
-                WHERE t.user_id = %s AND t.transaction_date >= %s AND t.transaction_date < %s
-                GROUP BY t.category, t.type
-                ORDER BY t.type, total_amount DESC
-            """, (user_id, start_date, end_date))
-            
+            cursor.execute(CATEGORY_BREAKDOWN_SQL, (user_id, start_date, end_date))
             category_stats = cursor.fetchall()
-            
+
             # Daily breakdown
-            cursor.execute("""
-                SELECT 
-                    DATE(transaction_date) as date,
-                    COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as daily_income,
-                    COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as daily_expenses,
-                    COUNT(*) as daily_transactions
-                FROM transactions 
-                WHERE user_id = %s AND transaction_date >= %s AND transaction_date < %s
-                GROUP BY DATE(transaction_date)
-                ORDER BY date
-            """, (user_id, start_date, end_date))
-            
+            cursor.execute(DAILY_BREAKDOWN_SQL, (user_id, start_date, end_date))
             daily_stats = cursor.fetchall()
-            
+
             cursor.close()
             connection.close()
-            
-            return {
-                'month': month,
-                'year': year,
-                'total_income': float(monthly_stats['total_income']),
-                'total_expenses': float(monthly_stats['total_expenses']),
-                'net_balance': float(monthly_stats['total_income'] - monthly_stats['total_expenses']),
-                'total_transactions': monthly_stats['total_transactions'],
-                'category_stats': category_stats,
-                'daily_stats': daily_stats
-            }
+
+            return self.compose_monthly_stats(year, month, monthly_stats, category_stats, daily_stats)
 
         except Error as e:
             logger.error(f"Error getting monthly stats for user {user_id}, {year}-{month}: {e}")
@@ -242,6 +247,32 @@ class DashboardService:
                 connection.close()
             return {}
 
+    @staticmethod
+    def month_range(year: int, month: int) -> tuple:
+        """First day of the month and first day of the following month"""
+        start_date = date(year, month, 1)
+        if month == 12:
+            end_date = date(year + 1, 1, 1)
+        else:
+            end_date = date(year, month + 1, 1)
+        return start_date, end_date
+
+    @staticmethod
+    def compose_monthly_stats(year: int, month: int, monthly_stats: Dict[str, Any],
+                              category_stats: List[Dict[str, Any]],
+                              daily_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the monthly stats payload from the raw query results"""
+        return {
+            'month': month,
+            'year': year,
+            'total_income': float(monthly_stats['total_income']),
+            'total_expenses': float(monthly_stats['total_expenses']),
+            'net_balance': float(monthly_stats['total_income'] - monthly_stats['total_expenses']),
+            'total_transactions': monthly_stats['total_transactions'],
+            'category_stats': category_stats,
+            'daily_stats': daily_stats
+        }
+
     def get_category_stats(self, user_id: int, start_date: date = None, end_date: date = None) -> List[Dict[str, Any]]:
         """Get category statistics for a date range"""
         connection = self.get_db_connection()
@@ -250,50 +281,16 @@ class DashboardService:
 
         try:
             cursor = connection.cursor(dictionary=True)
-            
-            # Default to current month if no dates provided
-            if not start_date:
-                start_date = date.today().replace(day=1)
-            if not end_date:
-                next_month = (start_date + timedelta(days=32)).replace(day=1)
-                end_date = next_month
-            
-            cursor.execute("""
-                SELECT 
-                    t.category as category_name,
-                    t.type,
-                    SUM(t.amount) as total_amount,
-                    COUNT(*) as transaction_count,
-                    AVG(t.amount) as average_amount,
-                    MIN(t.amount) as min_amount,
-                    MAX(t.amount) as max_amount
-                FROM transactions t
-                WHERE t.user_id = %s 
-                    AND t.transaction_date >= %s 
-                    AND t.transaction_date < %s
-                GROUP BY t.category, t.type
-                ORDER BY t.type, total_amount DESC
-            """, (user_id, start_date, end_date))
-            
+
+            start_date, end_date = self.category_stats_range(start_date, end_date)
+
+            cursor.execute(CATEGORY_STATS_SQL, (user_id, start_date, end_date))
             category_stats = cursor.fetchall()
-            
-            # Convert decimal values to float and map fields to frontend expectations
-            for stat in category_stats:
-                stat['total_amount'] = float(stat['total_amount'])
-                stat['avg_amount'] = float(stat['average_amount']) if stat['average_amount'] else 0
-                stat['category_type'] = stat['type']  # Map 'type' to 'category_type'
-                # Remove fields not needed by frontend
-                if 'average_amount' in stat:
-                    del stat['average_amount']
-                if 'min_amount' in stat:
-                    del stat['min_amount']
-                if 'max_amount' in stat:
-                    del stat['max_amount']
-            
+
             cursor.close()
             connection.close()
-            
-            return category_stats
+
+            return self.format_category_stats(category_stats)
 
         except Error as e:
             logger.error(f"Error getting category stats for user {user_id}: {e}")
@@ -301,6 +298,31 @@ class DashboardService:
                 connection.close()
             return []
 
+    @staticmethod
+    def category_stats_range(start_date: Optional[date], end_date: Optional[date]) -> tuple:
+        """Default to current month if no dates provided"""
+        if not start_date:
+            start_date = date.today().replace(day=1)
+        if not end_date:
+            end_date = (start_date + timedelta(days=32)).replace(day=1)
+        return start_date, end_date
+
+    @staticmethod
+    def format_category_stats(category_stats: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Convert decimal values to float and map fields to frontend expectations"""
+        for stat in category_stats:
+            stat['total_amount'] = float(stat['total_amount'])
+            stat['avg_amount'] = float(stat['average_amount']) if stat['average_amount'] else 0
+            stat['category_type'] = stat['type']  # Map 'type' to 'category_type'
+            # Remove fields not needed by frontend
+            if 'average_amount' in stat:
+                del stat['average_amount']
+            if 'min_amount' in stat:
+                del stat['min_amount']
+            if 'max_amount' in stat:
+                del stat['max_amount']
+        return category_stats
+
     def get_spending_trends(self, user_id: int, months: int = 6) -> List[Dict[str, Any]]:
         """Get spending trends over the last N months"""
         connection = self.get_db_connection()
@@ -309,50 +331,17 @@ class DashboardService:
 
         try:
             cursor = connection.cursor(dictionary=True)
-            
+
             trends = []
-            current_date = date.today()
-            
-            for i in range(months):
-                # Calculate month start and end
-                if current_date.month - i <= 0:
-                    year = current_date.year - 1
-                    month = 12 + (current_date.month - i)
-                else:
-                    year = current_date.year
-                    month = current_date.month - i
-                
-                month_start = date(year, month, 1)
-                if month == 12:
-                    month_end = date(year + 1, 1, 1)
-                else:
-                    month_end = date(year, month + 1, 1)
-                
+            for year, month, month_start, month_end in self.trend_months(months):
                 # Get monthly stats
-                cursor.execute("""
-                    SELECT 
-                        COALESCE(SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END), 0) as total_income,
-                        COALESCE(SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END), 0) as total_expenses,
-                        COUNT(*) as total_transactions
-                    FROM transactions 
-                    WHERE user_id = %s AND transaction_date >= %s AND transaction_date < %s
-                """, (user_id, month_start, month_end))
-                
+                cursor.execute(MONTH_TOTALS_SQL, (user_id, month_start, month_end))
                 month_stats = cursor.fetchone()
-                
-                trends.append({
-                    'year': year,
-                    'month': month,
-                    'month_name': month_start.strftime('%B'),
-                    'total_income': float(month_stats['total_income']),
-                    'total_expenses': float(month_stats['total_expenses']),
-                    'net_balance': float(month_stats['total_income'] - month_stats['total_expenses']),
-                    'total_transactions': month_stats['total_transactions']
-                })
-            
+                trends.append(self.compose_trend(year, month, month_start, month_stats))
+
             cursor.close()
             connection.close()
-            
+
             # Reverse to get chronological order
             return list(reversed(trends))
 
@@ -361,3 +350,34 @@ class DashboardService:
             if connection:
                 connection.close()
             return []
+
+    @classmethod
+    def trend_months(cls, months: int) -> List[tuple]:
+        """(year, month, month_start, month_end) for the last N months, newest first"""
+        current_date = date.today()
+        result = []
+        for i in range(months):
+            # Calculate month start and end
+            if current_date.month - i <= 0:
+                year = current_date.year - 1
+                month = 12 + (current_date.month - i)
+            else:
+                year = current_date.year
+                month = current_date.month - i
+
+            month_start, month_end = cls.month_range(year, month)
+            result.append((year, month, month_start, month_end))
+        return result
+
+    @staticmethod
+    def compose_trend(year: int, month: int, month_start: date, month_stats: Dict[str, Any]) -> Dict[str, Any]:
+        """Build one month of the trends payload"""
+        return {
+            'year': year,
+            'month': month,
+            'month_name': month_start.strftime('%B'),
+            'total_income': float(month_stats['total_income']),
+            'total_expenses': float(month_stats['total_expenses']),
+            'net_balance': float(month_stats['total_income'] - month_stats['total_expenses']),
+            'total_transactions': month_stats['total_transactions']
+        }
@@ -0,0 +1,84 @@
+import os
+import hashlib
+import json
+import logging
+import threading
+import mysql.connector
+from mysql.connector import pooling, Error
+from mysql.connector.errors import PoolError
+from typing import Dict, Any
+
+from metrics import instrument
+
+logger = logging.getLogger(__name__)
+
+# Dimensione del pool per processo: con N thread per worker servono almeno N connessioni
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+
+# Pool per processo: la chiave include il pid, così un worker creato con fork
+# non riusa mai i socket aperti dal processo master
+_pools: Dict[tuple, pooling.MySQLConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+def _pool_key(db_config: Dict[str, Any]) -> tuple:
+    config_hash = hashlib.sha1(json.dumps(db_config, sort_keys=True, default=str).encode()).hexdigest()[:12]
+    return os.getpid(), config_hash
+
+def get_pool(db_config: Dict[str, Any]) -> pooling.MySQLConnectionPool:
+    """Restituisce il pool del processo corrente per questa configurazione, creandolo al primo uso"""
+    key = _pool_key(db_config)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = pooling.MySQLConnectionPool(
+                    pool_name=f"tracker_spend_{key[0]}_{key[1]}",
+                    pool_size=DB_POOL_SIZE,
+                    pool_reset_session=True,
+                    **db_config
+                )
+                _pools[key] = pool
+                logger.info(f"Pool MySQL creato (pid {key[0]}, {DB_POOL_SIZE} connessioni)")
+    return pool
+
+def get_connection(db_config: Dict[str, Any]):
+    """Connessione dal pool; close() la restituisce al pool.
+
+    Se il pool è esaurito apre una connessione diretta invece di fallire la richiesta.
+    I cursori sono strumentati da metrics per contare query e tempo DB per richiesta.
+    """
+    try:
+        connection = get_pool(db_config).get_connection()
+    except PoolError:
+        logger.warning("Pool MySQL esaurito, apro una connessione diretta")
+        connection = mysql.connector.connect(**db_config)
+    return instrument(connection)
+
+def get_direct_connection(db_config: Dict[str, Any], **options):
+    """Connessione fuori dal pool, con opzioni che il pool non deve avere.
+
+    Serve ad esempio a LOAD DATA LOCAL INFILE (allow_local_infile_in_path): le
+    connessioni del pool restano senza accesso ai file locali. close() la chiude.
+    """
+    return instrument(mysql.connector.connect(**db_config, **options))
+
+def discard_connection(connection) -> None:
+    """Chiude una connessione con un risultato non bufferizzato ancora da leggere.
+
+    Leggere le righe rimaste costerebbe quanto il resto della query: si chiude
+    il socket e, se la connessione è del pool, il pool la riapre al prossimo uso.
+    """
+    try:
+        connection.disconnect()
+    except Error:
+        pass
+    try:
+        connection.close()
+    except Error:
+        pass
+
+def reset_pools():
+    """Dimentica i pool ereditati dal processo padre (da chiamare dopo il fork)"""
+    with _pools_lock:
+        _pools.clear()
@@ -0,0 +1,295 @@
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+from mysql.connector import Error
+
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Eliminazioni per filtro (non per id) che coinvolgono almeno tante righe vanno in background
+DELETE_BACKGROUND_THRESHOLD = int(os.environ.get('DELETE_BACKGROUND_THRESHOLD', 50000))
+
+# Un job 'running' non aggiornato da così tanti secondi è considerato abbandonato
+# (worker terminato a metà) e può essere ripreso
+STALE_JOB_SECONDS = 300
+
+# Intervallo dell'heartbeat del worker che ha il job, ben sotto STALE_JOB_SECONDS
+HEARTBEAT_SECONDS = 60
+
+JOB_FIELDS = """
+    id, user_id, status, filters, total_rows, deleted_count, error, created_at, updated_at
+"""
+
+class DeleteJobLost(Error):
+    """Il job è stato preso in carico da un altro worker: il blocco in corso va annullato.
+
+    È un Error di mysql.connector perché delete_user_transactions lo gestisca come
+    un errore SQL del blocco (rollback, contatori fermi all'ultimo commit).
+    """
+
+class DeleteJobService:
+    """Eliminazioni di transazioni in background (tabella delete_jobs).
+
+    L'API crea il job 'pending'; lo esegue job_worker.py, un processo separato da
+    gunicorn, eliminando a blocchi con TransactionService.delete_user_transactions
+    e aggiornando deleted_count nella transazione di ogni blocco. Se il worker
+    termina a metà, il job resta 'running' finché non diventa stale e il worker lo
+    riprende da solo: le righe già eliminate non vengono ricontate.
+
+    Come per gli upload job, ogni presa in carico scrive un claim_token nuovo e
+    il worker rinnova il lease con un heartbeat: avanzamento e stato finale
+    valgono solo con il token corrente, così due worker non eliminano mai blocchi
+    dello stesso job sommando entrambi a deleted_count.
+    """
+
+    def __init__(self, db_config: Dict[str, Any]):
+        self.db_config = db_config
+
+    def get_db_connection(self):
+        """Crea connessione al database"""
+        try:
+            connection = get_connection(self.db_config)
+            return connection
+        except Error as e:
+            logger.error(f"Errore connessione MySQL: {e}")
+            return None
+
+    @staticmethod
+    def _format_job(job: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if job and isinstance(job.get('filters'), (str, bytes)):
+            job['filters'] = json.loads(job['filters'])
+        return job
+
+    def create_job(self, user_id: int, filters: Dict[str, Any], total_rows: int) -> Optional[Dict[str, Any]]:
+        """Registra un'eliminazione da eseguire"""
+        connection = self.get_db_connection()
+        if not connection:
+            return None
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+                INSERT INTO delete_jobs (user_id, filters, total_rows) VALUES (%s, %s, %s)
+            """, (user_id, json.dumps(filters, default=str), total_rows))
+            job_id = cursor.lastrowid
+            connection.commit()
+            cursor.execute(f"SELECT {JOB_FIELDS} FROM delete_jobs WHERE id = %s", (job_id,))
+            job = self._format_job(cursor.fetchone())
+            cursor.close()
+            connection.close()
+            return job
+        except Error as e:
+            logger.error(f"Errore creazione delete job: {e}")
+            connection.close()
+            return None
+
+    def get_job(self, user_id: int, job_id: int) -> Optional[Dict[str, Any]]:
+        """Stato di un job dell'utente"""
+        connection = self.get_db_connection()
+        if not connection:
+            return None
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(f"SELECT {JOB_FIELDS} FROM delete_jobs WHERE id = %s AND user_id = %s",
+                           (job_id, user_id))
+            job = self._format_job(cursor.fetchone())
+            cursor.close()
+            connection.close()
+            return job
+        except Error as e:
+            logger.error(f"Errore recupero delete job {job_id}: {e}")
+            connection.close()
+            return None
+
+    def claim_job(self, job_id: int) -> Optional[str]:
+        """Presa in carico atomica; restituisce il claim_token, None se il job è completato o in corso altrove"""
+        connection = self.get_db_connection()
+        if not connection:
+            return None
+        try:
+            claim_token = uuid.uuid4().hex
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE delete_jobs
+                SET status = 'running', error = NULL, claim_token = %s, updated_at = NOW()
+                WHERE id = %s AND (
+                    status = 'pending'
+                    OR (status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND)
+                )
+            """, (claim_token, job_id, STALE_JOB_SECONDS))
+            claimed = cursor.rowcount == 1
+            connection.commit()
+            cursor.close()
+            connection.close()
+            return claim_token if claimed else None
+        except Error as e:
+            logger.error(f"Errore presa in carico delete job {job_id}: {e}")
+            connection.close()
+            return None
+
+    def claim_next_job(self) -> Optional[Dict[str, Any]]:
+        """Prende in carico il prossimo job in attesa o abbandonato; None se non ce ne sono"""
+        connection = self.get_db_connection()
+        if not connection:
+            return None
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT {JOB_FIELDS} FROM delete_jobs
+                WHERE status = 'pending'
+                   OR (status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND)
+                ORDER BY id LIMIT 10
+            """, (STALE_JOB_SECONDS,))
+            candidates = [self._format_job(job) for job in cursor.fetchall()]
+            cursor.close()
+            connection.close()
+        except Error as e:
+            logger.error(f"Errore ricerca delete job in attesa: {e}")
+            connection.close()
+            return None
+        # Con più worker un candidato può essere preso da un altro nel frattempo
+        for job in candidates:
+            claim_token = self.claim_job(job['id'])
+            if claim_token:
+                job['claim_token'] = claim_token
+                return job
+        return None
+
+    def requeue_job(self, user_id: int, job_id: int) -> bool:
+        """Rimette in coda un job fallito o abbandonato; False se è completato o in corso"""
+        connection = self.get_db_connection()
+        if not connection:
+            return False
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE delete_jobs SET status = 'pending', error = NULL, claim_token = NULL
+                WHERE id = %s AND user_id = %s AND (
+                    status = 'failed'
+                    OR (status = 'running' AND updated_at < NOW() - INTERVAL %s SECOND)
+                )
+            """, (job_id, user_id, STALE_JOB_SECONDS))
+            requeued = cursor.rowcount == 1
+            connection.commit()
+            cursor.close()
+            connection.close()
+            return requeued
+        except Error as e:
+            logger.error(f"Errore ripresa delete job {job_id}: {e}")
+            connection.close()
+            return False
+
+    @staticmethod
+    def checkpoint(connection, job_id: int, claim_token: str, deleted_count: int) -> None:
+        """Aggiorna deleted_count sulla connessione del blocco, senza commit.
+
+        Solleva DeleteJobLost se il job non è più di questo worker: deleted_count
+        cresce a ogni blocco, quindi nessuna riga aggiornata vuol dire token diverso.
+        """
+        cursor = connection.cursor()
+        cursor.execute("""
+            UPDATE delete_jobs SET deleted_count = %s, updated_at = NOW()
+            WHERE id = %s AND claim_token = %s
+        """, (deleted_count, job_id, claim_token))
+        owned = cursor.rowcount == 1
+        cursor.close()
+        if not owned:
+            raise DeleteJobLost(f"Delete job {job_id} preso in carico da un altro worker")
+
+    def heartbeat(self, job_id: int, claim_token: str) -> bool:
+        """Rinnova il lease del job; False se non è più di questo worker"""
+        connection = self.get_db_connection()
+        if not connection:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE delete_jobs SET updated_at = NOW()
+                WHERE id = %s AND claim_token = %s AND status = 'running'
+            """, (job_id, claim_token))
+            # rowcount è 0 anche se updated_at non cambia nello stesso secondo: si rilegge il token
+            cursor.execute("SELECT claim_token, status FROM delete_jobs WHERE id = %s", (job_id,))
+            row = cursor.fetchone()
+            connection.commit()
+            cursor.close()
+            connection.close()
+            return row is not None and row[0] == claim_token and row[1] == 'running'
+        except Error as e:
+            logger.error(f"Errore heartbeat delete job {job_id}: {e}")
+            connection.close()
+            return True
+
+    @contextmanager
+    def keep_alive(self, job: Dict[str, Any]):
+        """Rinnova il lease ogni HEARTBEAT_SECONDS finché il blocco è in esecuzione.
+
+        Un blocco lento (lock, budget da aggiornare) può superare STALE_JOB_SECONDS
+        senza checkpoint: senza heartbeat un altro worker riprenderebbe il job.
+        """
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(HEARTBEAT_SECONDS):
+                if not self.heartbeat(job['id'], job['claim_token']):
+                    logger.warning(f"Delete job {job['id']} preso in carico da un altro worker")
+                    return
+
+        thread = threading.Thread(target=beat, name=f"delete-job-{job['id']}-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def run_job(self, job: Dict[str, Any], transaction_service) -> None:
+        """Esegue un job preso in carico con claim_next_job, fino al completamento o all'errore"""
+        # Un job ripreso somma le righe eliminate dai tentativi precedenti
+        already_deleted = job['deleted_count']
+        try:
+            with self.keep_alive(job):
+                deleted = transaction_service.delete_user_transactions(
+                    job['user_id'], filters=job['filters'],
+                    on_batch=lambda connection, count: self.checkpoint(
+                        connection, job['id'], job['claim_token'], already_deleted + count
+                    )
+                )
+            if deleted is None:
+                if not self._update(job, "status = 'failed', error = %s, claim_token = NULL",
+                                    ('Errore eliminazione transazioni',)):
+                    logger.warning(f"Delete job {job['id']} interrotto: preso in carico da un altro worker")
+            elif self._update(job, "status = 'completed', deleted_count = %s, claim_token = NULL",
+                              (already_deleted + deleted,)):
+                logger.info(f"Delete job {job['id']} completato: {already_deleted + deleted} transazioni")
+            else:
+                logger.warning(f"Delete job {job['id']} preso in carico da un altro worker prima del completamento")
+        except Exception as e:
+            logger.error(f"Errore delete job {job['id']}: {e}")
+            self._update(job, "status = 'failed', error = %s, claim_token = NULL", (str(e)[:2000],))
+
+    def _update(self, job: Dict[str, Any], assignments: str, params: tuple) -> bool:
+        """Aggiorna il job solo se è ancora di questo worker (stesso claim_token).
+
+        Restituisce True se la riga è cambiata.
+        """
+        connection = self.get_db_connection()
+        if not connection:
+            return False
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"UPDATE delete_jobs SET {assignments} WHERE id = %s AND claim_token = %s",
+                           params + (job['id'], job['claim_token']))
+            updated = cursor.rowcount == 1
+            connection.commit()
+            cursor.close()
+            connection.close()
+            return updated
+        except Error as e:
+            logger.error(f"Errore aggiornamento delete job {job['id']}: {e}")
+            connection.close()
+            return False
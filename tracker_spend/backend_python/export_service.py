@@ -0,0 +1,163 @@
+import csv
+import io
+import os
+import tempfile
+import zlib
+import logging
+from decimal import Decimal
+from typing import Dict, Any, Optional, Iterator
+
+logger = logging.getLogger(__name__)
+
+# Colonne esportate, nell'ordine del file
+EXPORT_FIELDS = ['id', 'transaction_date', 'description', 'amount', 'type', 'category']
+
+# Dimensione dei blocchi letti dal database e dei blocchi di file inviati al client
+EXPORT_CHUNK_ROWS = 1000
+FILE_BLOCK_SIZE = 64 * 1024
+
+class TransactionExporter:
+    """Esporta le transazioni di un utente in CSV, XLSX o Parquet a flusso"""
+
+    FORMATS = {
+        'csv': 'text/csv',
+        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        'parquet': 'application/vnd.apache.parquet'
+    }
+
+    def __init__(self, transaction_service):
+        self.transaction_service = transaction_service
+
+    def is_format_available(self, export_format: str) -> bool:
+        """Verifica che il formato sia supportato e le sue dipendenze installate"""
+        if export_format not in self.FORMATS:
+            return False
+        if export_format == 'parquet':
+            # pyarrow è una dipendenza opzionale
+            try:
+                import pyarrow  # noqa: F401
+            except ImportError:
+                return False
+        return True
+
+    def content_type(self, export_format: str, compress: bool = False) -> str:
+        """Content-Type della risposta"""
+        return 'application/gzip' if compress else self.FORMATS[export_format]
+
+    def filename(self, export_format: str, compress: bool = False) -> str:
+        """Nome del file scaricato"""
+        name = f"transactions.{export_format}"
+        return f"{name}.gz" if compress else name
+
+    def export(self, user_id: int, filters: Optional[Dict[str, Any]], export_format: str,
+               compress: bool = False) -> Iterator[bytes]:
+        """Genera il file di export a blocchi di byte, leggendo le righe a chunk dal database"""
+        chunks = self.transaction_service.iter_user_transactions(
+            user_id, filters, EXPORT_FIELDS, chunk_size=EXPORT_CHUNK_ROWS
+        )
+
+        if export_format == 'csv':
+            body = self._export_csv(chunks)
+        elif export_format == 'xlsx':
+            body = self._export_xlsx(chunks)
+        elif export_format == 'parquet':
+            body = self._export_parquet(chunks)
+        else:
+            raise ValueError(f"Formato di export non supportato: {export_format}")
+
+        return self._gzip(body) if compress else body
+
+    def _export_csv(self, chunks) -> Iterator[bytes]:
+        """CSV scritto un blocco di righe alla volta"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+
+        for rows in chunks:
+            for row in rows:
+                writer.writerow([self._cell(row.get(field)) for field in EXPORT_FIELDS])
+            yield buffer.getvalue().encode('utf-8')
+            buffer.seek(0)
+            buffer.truncate(0)
+
+        if buffer.tell():
+            yield buffer.getvalue().encode('utf-8')
+
+    def _export_xlsx(self, chunks) -> Iterator[bytes]:
+        """XLSX in modalità write-only di openpyxl (le righe non restano in memoria)"""
+        from openpyxl import Workbook
+
+        workbook = Workbook(write_only=True)
+        sheet = workbook.create_sheet('Transazioni')
+        sheet.append(EXPORT_FIELDS)
+
+        for rows in chunks:
+            for row in rows:
+                sheet.append([self._xlsx_cell(row.get(field)) for field in EXPORT_FIELDS])
+
+        # Il formato zip richiede di completare il file prima di inviarlo
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx')
+        temp_file.close()
+        try:
+            workbook.save(temp_file.name)
+            yield from self._read_file(temp_file.name)
+        finally:
+            os.unlink(temp_file.name)
+
+    def _export_parquet(self, chunks) -> Iterator[bytes]:
+        """Parquet scritto un row group per blocco di righe"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        schema = pa.schema([
+            ('id', pa.int64()),
+            ('transaction_date', pa.date32()),
+            ('description', pa.string()),
+            ('amount', pa.float64()),
+            ('type', pa.string()),
+            ('category', pa.string())
+        ])
+
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.parquet')
+        temp_file.close()
+        try:
+            with pq.ParquetWriter(temp_file.name, schema) as parquet_writer:
+                for rows in chunks:
+                    columns = {field: [row.get(field) for row in rows] for field in EXPORT_FIELDS}
+                    columns['amount'] = [float(value) if value is not None else None for value in columns['amount']]
+                    parquet_writer.write_table(pa.table(columns, schema=schema))
+            yield from self._read_file(temp_file.name)
+        finally:
+            os.unlink(temp_file.name)
+
+    def _gzip(self, body: Iterator[bytes]) -> Iterator[bytes]:
+        """Comprime il flusso in formato gzip senza bufferizzarlo"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for block in body:
+            compressed = compressor.compress(block)
+            if compressed:
+                yield compressed
+        yield compressor.flush()
+
+    def _read_file(self, path: str) -> Iterator[bytes]:
+        """Legge un file temporaneo a blocchi"""
+        with open(path, 'rb') as file:
+            while True:
+                block = file.read(FILE_BLOCK_SIZE)
+                if not block:
+                    break
+                yield block
+
+    def _cell(self, value: Any) -> Any:
+        """Valore di una cella CSV (date in ISO)"""
+        if value is None:
+            return ''
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def _xlsx_cell(self, value: Any) -> Any:
+        """Valore di una cella XLSX (Decimal come numero)"""
+        if isinstance(value, Decimal):
+            return float(value)
+        return value
@@ -1,5 +1,5 @@
-import mysql.connector
 from mysql.connector import Error
+from db import get_connection
 import logging
 from typing import List, Dict, Any, Optional
 from datetime import datetime, date
@@ -13,51 +13,12 @@ class GoalService:
     def get_db_connection(self):
         """Create database connection"""
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = get_connection(self.db_config)
             return connection
         except Error as e:
             logger.error(f"Error connecting to MySQL: {e}")
             return None
 
-    def create_goals_table(self):
-        """Create goals table if it doesn't exist"""
-        connection = self.get_db_connection()
-        if not connection:
-            return False
-
-        try:
-            cursor = connection.cursor()
-            
-            # Create goals table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS goals (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    name VARCHAR(100) NOT NULL,
-                    description TEXT,
-                    target_amount DECIMAL(10,2) NOT NULL,
-                    current_amount DECIMAL(10,2) DEFAULT 0.00,
-                    deadline DATE,
-                    priority ENUM('low', 'medium', 'high') DEFAULT 'medium',
-                    status ENUM('active', 'completed', 'paused', 'cancelled') DEFAULT 'active',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                )
-            """)
-
-            connection.commit()
-            cursor.close()
-            connection.close()
-            logger.info("Goals table created successfully")
-            return True
-
-        except Error as e:
-            logger.error(f"Error creating goals table: {e}")
-            if connection:
-                connection.close()
-            return False
-
     def get_goals(self, user_id: int) -> List[Dict[str, Any]]:
         """Get all goals for a user"""
         connection = self.get_db_connection()
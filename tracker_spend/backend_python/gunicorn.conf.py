@@ -0,0 +1,48 @@
+"""Configurazione gunicorn, tutti i parametri sono sovrascrivibili da variabili d'ambiente"""
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Dietro ad asgi_router.py (serve.sh) ascolta solo in locale su GUNICORN_BIND;
+# con ASYNC_READ_PATH=false serve direttamente la porta pubblica
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 3001)}")
+
+# Processi e thread: i thread coprono l'attesa su MySQL, i processi usano più core
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+# Connessioni keep-alive dietro al proxy di Railway
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+
+# Il preload importa l'app una volta nel master; i pool DB vengono comunque creati dopo il fork
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+# Riavvio periodico dei worker per contenere la crescita di memoria (pandas negli upload)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+# Metriche Prometheus condivise dai worker (vedi metrics.py). Va impostata prima
+# dell'import dell'app; i file di un avvio precedente vengono scartati
+METRICS_DIR = os.environ.setdefault(
+    'PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'tracker_spend_metrics')
+)
+shutil.rmtree(METRICS_DIR, ignore_errors=True)
+os.makedirs(METRICS_DIR, exist_ok=True)
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+
+def post_fork(server, worker):
+    """Ogni worker crea i propri pool MySQL invece di condividere i socket del master"""
+    from db import reset_pools
+    reset_pools()
+
+def child_exit(server, worker):
+    """I gauge dei worker terminati non contano più (gli istogrammi restano sommati)"""
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,147 @@
+"""Catalogo delle query calde e controllo dei piani di esecuzione.
+
+Ogni voce riusa l'SQL dei servizi, quindi il controllo segue il codice reale.
+`python hot_queries.py check` esegue EXPLAIN su ogni query e termina con
+codice 1 se una query legge per intero (type = ALL) una tabella grande.
+
+Uso: python hot_queries.py check [--user-id N] [--min-rows 1000]
+     python hot_queries.py list
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+from typing import List, Dict, Any, Callable, NamedTuple, Tuple
+
+from budget_service import RECONCILE_SPENT_SQL
+from dashboard_service import (
+    MONTH_TOTALS_SQL, TOP_EXPENSE_CATEGORIES_SQL, RECENT_TRANSACTIONS_SQL, BUDGET_PROGRESS_SQL,
+    CATEGORY_BREAKDOWN_SQL, DAILY_BREAKDOWN_SQL, CATEGORY_STATS_SQL
+)
+from transaction_service import TransactionService, GENERAL_STATS_SQL
+
+# Sotto questa dimensione (righe stimate) l'ottimizzatore sceglie legittimamente la scansione completa
+MIN_ROWS_FOR_CHECK = 1000
+
+class HotQuery(NamedTuple):
+    name: str
+    # (user_id, inizio mese, inizio mese successivo, categoria) -> (sql, parametri)
+    build: Callable[[int, date, date, str], Tuple[str, tuple]]
+
+def _fixed(sql: str, params: Callable[[int, date, date, str], tuple]):
+    """Query con SQL costante dei servizi"""
+    return lambda user_id, start, end, category: (sql, params(user_id, start, end, category))
+
+_transactions = TransactionService({})
+
+HOT_QUERIES: List[HotQuery] = [
+    HotQuery('dashboard.month_totals', _fixed(MONTH_TOTALS_SQL, lambda u, s, e, c: (u, s, e))),
+    HotQuery('dashboard.top_expense_categories', _fixed(TOP_EXPENSE_CATEGORIES_SQL, lambda u, s, e, c: (u, s, e))),
+    HotQuery('dashboard.recent_transactions', _fixed(RECENT_TRANSACTIONS_SQL, lambda u, s, e, c: (u,))),
+    HotQuery('dashboard.budget_progress', _fixed(BUDGET_PROGRESS_SQL, lambda u, s, e, c: (u,))),
+    HotQuery('dashboard.category_breakdown', _fixed(CATEGORY_BREAKDOWN_SQL, lambda u, s, e, c: (u, s, e))),
+    HotQuery('dashboard.daily_breakdown', _fixed(DAILY_BREAKDOWN_SQL, lambda u, s, e, c: (u, s, e))),
+    HotQuery('dashboard.category_stats', _fixed(CATEGORY_STATS_SQL, lambda u, s, e, c: (u, s, e))),
+    HotQuery('transactions.general_stats', _fixed(GENERAL_STATS_SQL, lambda u, s, e, c: (u,))),
+    HotQuery('transactions.list_by_category',
+             lambda u, s, e, c: _transactions.build_list_query(u, {'category': c, 'limit': 100})),
+    HotQuery('transactions.list_expenses_in_range',
+             lambda u, s, e, c: _transactions.build_list_query(u, {'type': 'expense', 'start_date': s, 'end_date': e})),
+    HotQuery('transactions.keyset_page',
+             lambda u, s, e, c: _transactions.build_page_query(u, None, 100, (e, 2 ** 31 - 1))),
+    HotQuery('budgets.reconcile_spent', _fixed(RECONCILE_SPENT_SQL + " WHERE b.user_id = %s", lambda u, s, e, c: (u,))),
+]
+
+def sample_params(cursor, user_id: int = None) -> tuple:
+    """Utente con più transazioni (se non indicato), mese corrente e sua categoria più usata"""
+    if user_id is None:
+        cursor.execute("""
+            SELECT user_id FROM transactions GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1
+        """)
+        row = cursor.fetchone()
+        user_id = row['user_id'] if row else 1
+
+    cursor.execute("""
+        SELECT category FROM transactions WHERE user_id = %s
+        GROUP BY category ORDER BY COUNT(*) DESC LIMIT 1
+    """, (user_id,))
+    row = cursor.fetchone()
+    category = row['category'] if row else 'Altro'
+
+    month_start = date.today().replace(day=1)
+    next_month = (month_start + timedelta(days=32)).replace(day=1)
+    return user_id, month_start, next_month, category
+
+def table_sizes(cursor) -> Dict[str, int]:
+    """Righe stimate per tabella dello schema corrente"""
+    cursor.execute("""
+        SELECT TABLE_NAME AS name, TABLE_ROWS AS table_rows FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE()
+    """)
+    return {row['name']: row['table_rows'] or 0 for row in cursor.fetchall()}
+
+def explain(cursor, query: HotQuery, params: tuple) -> List[Dict[str, Any]]:
+    """Righe di EXPLAIN (formato tradizionale) per una query del catalogo"""
+    sql, query_params = query.build(*params)
+    cursor.execute("EXPLAIN " + sql, tuple(query_params))
+    return cursor.fetchall()
+
+def full_scans(plan: List[Dict[str, Any]], aliases: Dict[str, str], sizes: Dict[str, int],
+               min_rows: int) -> List[str]:
+    """Tabelle lette per intero che superano min_rows righe"""
+    problems = []
+    for row in plan:
+        table = aliases.get(row.get('table'), row.get('table'))
+        if row.get('type') == 'ALL' and sizes.get(table, 0) >= min_rows:
+            problems.append(f"{table} (righe stimate {row.get('rows')})")
+    return problems
+
+def check(db_config: Dict[str, Any], user_id: int = None, min_rows: int = MIN_ROWS_FOR_CHECK) -> int:
+    """Esegue EXPLAIN su tutto il catalogo; restituisce il numero di query in regressione"""
+    import mysql.connector
+
+    connection = mysql.connector.connect(**db_config)
+    cursor = connection.cursor(dictionary=True)
+    aliases = {'t': 'transactions', 'b': 'budgets', 'c': 'categories'}
+
+    try:
+        params = sample_params(cursor, user_id)
+        sizes = table_sizes(cursor)
+        failures = 0
+
+        print(f"Parametri di esempio: user_id={params[0]}, mese={params[1]}, categoria={params[3]!r}\n")
+        for query in HOT_QUERIES:
+            plan = explain(cursor, query, params)
+            problems = full_scans(plan, aliases, sizes, min_rows)
+            keys = ', '.join(f"{aliases.get(row['table'], row['table'])}:{row.get('key') or '-'}"
+                             for row in plan if row.get('table'))
+            status = 'FULL SCAN' if problems else 'ok'
+            print(f"{query.name:40s} {status:10s} {keys}")
+            for problem in problems:
+                print(f"    scansione completa di {problem}")
+            failures += bool(problems)
+
+        return failures
+    finally:
+        cursor.close()
+        connection.close()
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Controllo EXPLAIN delle query calde')
+    parser.add_argument('command', choices=['check', 'list'], nargs='?', default='check')
+    parser.add_argument('--user-id', type=int, help="Utente di esempio (default: il più attivo)")
+    parser.add_argument('--min-rows', type=int, default=MIN_ROWS_FOR_CHECK,
+                        help='Ignora le scansioni complete su tabelle più piccole')
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for query in HOT_QUERIES:
+            print(query.name)
+        return 0
+
+    from railway_config import get_database_config
+    failures = check(get_database_config(), args.user_id, args.min_rows)
+    print(f"\n{failures} query in scansione completa" if failures else "\nNessuna scansione completa")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
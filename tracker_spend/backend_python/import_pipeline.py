@@ -0,0 +1,332 @@
+"""Pipeline di import su tabella di staging, con post-elaborazione set-based.
+
+Sopra BULK_LOAD_THRESHOLD righe TransactionService.save_transactions non
+inserisce più a blocchi di executemany ma:
+
+1. scrive le righe validate in un TSV temporaneo e lo carica con LOAD DATA
+   LOCAL INFILE in import_staging (chiave: load_id = id dell'upload job)
+2. categorizza con un solo UPDATE le righe senza categoria, con le regole di
+   category_rules (parola chiave contenuta nella descrizione; regole
+   dell'utente prima di quelle globali, poi per priority)
+3. segna in SQL le righe già presenti (stessa data, descrizione, importo e
+   tipo) confrontando i multinsiemi: se il file ha due caffè uguali e il
+   database uno, se ne inserisce uno
+4. copia in transactions con INSERT ... SELECT a blocchi di BULK_INSERT_CHUNK
+   righe; ogni blocco aggiorna contatori dei budget e checkpoint del job nella
+   stessa transazione, come il percorso riga per riga
+5. svuota lo staging del load_id
+
+Sotto la soglia le stesse regole sono applicate in Python da
+apply_category_rules e find_duplicates, così categoria e duplicati non
+dipendono dalla dimensione del file. In Python i testi sono confrontati dopo
+fold_text, che come utf8mb4_unicode_ci ignora maiuscole, accenti e spazi finali.
+
+Richiede local_infile=ON sul server. Se LOAD DATA LOCAL non è permesso viene
+sollevata BulkLoadUnavailable e il chiamante usa il percorso normale.
+"""
+import logging
+import os
+import tempfile
+import unicodedata
+import uuid
+from collections import Counter
+from typing import List, Dict, Any, Optional, Set
+
+from mysql.connector import Error, errorcode
+
+from budget_service import BudgetService
+from db import get_direct_connection
+from parsed_transaction import ParsedTransaction, DEFAULT_CATEGORY
+from upload_job_service import UploadJobService
+
+logger = logging.getLogger(__name__)
+
+# Righe (ancora da salvare) oltre le quali si usa la pipeline di staging; 0 la disattiva
+BULK_LOAD_THRESHOLD = int(os.environ.get('BULK_LOAD_THRESHOLD', 20000))
+
+# Righe copiate da staging a transactions per transazione
+BULK_INSERT_CHUNK = int(os.environ.get('BULK_INSERT_CHUNK', 50000))
+
+# Unica directory da cui il client MySQL può leggere file locali: dedicata e
+# accessibile solo al processo, perché la connessione di LOAD DATA può leggerla tutta
+BULK_LOAD_DIR = os.environ.get('BULK_LOAD_DIR', os.path.join(tempfile.gettempdir(), 'tracker_spend_bulk_load'))
+
+# Righe di staging rimaste da import interrotti oltre questa età vengono rimosse
+STAGING_RETENTION_HOURS = 24
+
+# Errori che indicano LOAD DATA LOCAL disattivato (server o client)
+_LOCAL_INFILE_DISABLED = (
+    errorcode.ER_NOT_ALLOWED_COMMAND,
+    errorcode.ER_CLIENT_LOCAL_FILES_DISABLED,
+    errorcode.CR_LOAD_DATA_LOCAL_INFILE_REJECTED,
+)
+
+_TSV_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': '\\0'})
+
+RULES_QUERY = """
+    SELECT keyword, category FROM category_rules
+    WHERE user_id = %s OR user_id IS NULL
+    ORDER BY user_id IS NULL, priority
+"""
+
+class BulkLoadUnavailable(Exception):
+    """LOAD DATA LOCAL INFILE non utilizzabile: usare il salvataggio riga per riga"""
+
+def prepare_bulk_load_dir(path: str = BULK_LOAD_DIR) -> str:
+    """Crea la directory dei TSV con permessi 0700 (da chiamare all'avvio).
+
+    Solleva BulkLoadUnavailable se esiste già ma è di un altro utente o leggibile
+    da altri: non si concede a LOAD DATA LOCAL una directory condivisa.
+    """
+    try:
+        os.makedirs(path, mode=0o700, exist_ok=True)
+        info = os.stat(path)
+    except OSError as e:
+        raise BulkLoadUnavailable(f"BULK_LOAD_DIR {path} non utilizzabile: {e}")
+    if (hasattr(os, 'getuid') and info.st_uid != os.getuid()) or info.st_mode & 0o077:
+        raise BulkLoadUnavailable(f"BULK_LOAD_DIR {path} deve appartenere al processo con permessi 0700")
+    return path
+
+def write_tsv(file, transactions: List[ParsedTransaction], load_id: int, start_row: int = 0) -> int:
+    """Scrive le transazioni da start_row nel formato di default di LOAD DATA; restituisce le righe"""
+    written = 0
+    for seq in range(start_row, len(transactions)):
+        transaction = transactions[seq]
+        category = transaction.category.translate(_TSV_ESCAPES) if transaction.category else '\\N'
+        file.write(
+            f"{load_id}\t{seq}\t{str(transaction.transaction_date)[:10]}\t"
+            f"{transaction.description.translate(_TSV_ESCAPES)}\t"
+            f"{float(transaction.amount):.2f}\t{transaction.type}\t{category}\n"
+        )
+        written += 1
+    return written
+
+def fold_text(text: str) -> str:
+    """Forma di confronto di un testo, come la collation utf8mb4_unicode_ci delle tabelle.
+
+    Senza maiuscole né accenti (è = e, ß = ss) e senza spazi finali (PAD SPACE).
+    """
+    decomposed = unicodedata.normalize('NFKD', text.casefold())
+    return ''.join(char for char in decomposed if not unicodedata.combining(char)).rstrip(' ')
+
+def apply_category_rules(connection, user_id: int, transactions: List[ParsedTransaction]) -> None:
+    """Categorizza in Python le transazioni senza categoria, con le stesse regole dello staging"""
+    pending = [transaction for transaction in transactions if transaction.category is None]
+    if not pending:
+        return
+    cursor = connection.cursor()
+    cursor.execute(RULES_QUERY, (user_id,))
+    rules = [(fold_text(keyword), category) for keyword, category in cursor.fetchall()]
+    cursor.close()
+
+    for transaction in pending:
+        description = fold_text(transaction.description)
+        transaction.category = next(
+            (category for keyword, category in rules if keyword in description), DEFAULT_CATEGORY
+        )
+
+def _duplicate_key(transaction_date, description: str, amount, transaction_type: str) -> tuple:
+    return str(transaction_date)[:10], fold_text(description), f"{float(amount):.2f}", transaction_type
+
+def find_duplicates(connection, user_id: int, transactions: List[ParsedTransaction],
+                    start_row: int = 0, upload_id: Optional[int] = None) -> Set[int]:
+    """Indici (da start_row) delle transazioni già presenti nel database.
+
+    Stessa regola dello staging: l'n-esima riga uguale del file (data,
+    descrizione, importo, tipo) è un duplicato se nel database ce ne sono almeno
+    n, escluse le righe già committate dallo stesso upload. n conta dall'inizio
+    del file anche in una ripresa, così le righe uguali prima e dopo start_row
+    danno lo stesso risultato di un import in un solo tentativo.
+    """
+    pending = transactions[start_row:]
+    if not pending:
+        return set()
+    dates = [str(transaction.transaction_date)[:10] for transaction in pending]
+    same_upload = "AND NOT (upload_id <=> %s)" if upload_id is not None else ""
+
+    cursor = connection.cursor()
+    cursor.execute(f"""
+        SELECT transaction_date, description, amount, type, COUNT(*) FROM transactions
+        WHERE user_id = %s AND transaction_date BETWEEN %s AND %s {same_upload}
+        GROUP BY transaction_date, description, amount, type
+    """, (user_id, min(dates), max(dates)) + ((upload_id,) if upload_id is not None else ()))
+    existing = Counter()
+    for transaction_date, description, amount, transaction_type, count in cursor.fetchall():
+        existing[_duplicate_key(transaction_date, description, amount, transaction_type)] += count
+    cursor.close()
+
+    seen = Counter()
+    duplicates = set()
+    for index, transaction in enumerate(transactions):
+        key = _duplicate_key(transaction.transaction_date, transaction.description,
+                             transaction.amount, transaction.type)
+        seen[key] += 1
+        if index >= start_row and seen[key] <= existing[key]:
+            duplicates.add(index)
+    return duplicates
+
+def _clear_staging(cursor, connection, where: str, params: tuple, batch: int = BULK_INSERT_CHUNK) -> None:
+    """Svuota righe di staging a blocchi, per non tenere lock lunghi"""
+    while True:
+        cursor.execute(f"DELETE FROM import_staging WHERE {where} LIMIT {int(batch)}", params)
+        connection.commit()
+        if cursor.rowcount < batch:
+            return
+
+def run_staged_import(db_config: Dict[str, Any], user_id: int, transactions: List[ParsedTransaction],
+                      upload_id: Optional[int] = None, start_row: int = 0,
+                      chunk_size: int = BULK_INSERT_CHUNK,
+                      claim_token: Optional[str] = None,
+                      skip_duplicates: bool = True) -> Dict[str, Any]:
+    """Come TransactionService.save_transactions, passando da import_staging.
+
+    Il risultato ha in più `duplicates_skipped` e `categories` (categorie delle
+    righe importate). Solleva BulkLoadUnavailable prima di aver scritto
+    qualsiasi riga in transactions.
+
+    In una ripresa lo staging contiene comunque tutto il file: la numerazione
+    delle righe uguali per il dedup parte dalla prima riga del file, e si
+    inseriscono solo quelle da start_row.
+    """
+    prepare_bulk_load_dir()
+    try:
+        connection = get_direct_connection(db_config, allow_local_infile_in_path=BULK_LOAD_DIR)
+    except Error as e:
+        raise BulkLoadUnavailable(f"Connessione per LOAD DATA non disponibile: {e}")
+
+    # Senza job si usa un id casuale: deve solo non collidere con import concorrenti
+    load_id = upload_id if upload_id is not None else -(uuid.uuid4().int >> 65)
+    committed_rows = start_row
+    saved_count = 0
+    tsv_path = None
+
+    try:
+        cursor = connection.cursor()
+        # Le letture di transactions dentro INSERT ... SELECT non prendono lock in READ COMMITTED:
+        # l'import non blocca gli INSERT degli altri utenti
+        cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL READ COMMITTED")
+
+        # Residui di un tentativo precedente di questo upload e di import abbandonati
+        _clear_staging(cursor, connection, "load_id = %s", (load_id,))
+        _clear_staging(cursor, connection, "created_at < NOW() - INTERVAL %s HOUR", (STAGING_RETENTION_HOURS,))
+
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.tsv',
+                                         dir=BULK_LOAD_DIR, delete=False) as tsv:
+            tsv_path = tsv.name
+            expected_rows = write_tsv(tsv, transactions, load_id)
+
+        try:
+            cursor.execute("""
+                LOAD DATA LOCAL INFILE %s INTO TABLE import_staging
+                CHARACTER SET utf8mb4
+                FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'
+                LINES TERMINATED BY '\\n'
+                (load_id, seq, transaction_date, description, amount, type, category)
+            """, (tsv_path,))
+        except Error as e:
+            if e.errno in _LOCAL_INFILE_DISABLED:
+                raise BulkLoadUnavailable(str(e))
+            raise
+        if cursor.rowcount != expected_rows:
+            raise Error(f"LOAD DATA ha caricato {cursor.rowcount} righe su {expected_rows}")
+        connection.commit()
+
+        # Categorizzazione: la prima regola la cui parola chiave compare nella descrizione
+        # (confronto con la collation della colonna, quindi senza distinzione di maiuscole)
+        cursor.execute("""
+            UPDATE import_staging s
+            SET s.category = COALESCE((
+                SELECT r.category FROM category_rules r
+                WHERE (r.user_id = %s OR r.user_id IS NULL)
+                  AND LOCATE(r.keyword, s.description) > 0
+                ORDER BY r.user_id IS NULL, r.priority
+                LIMIT 1
+            ), %s)
+            WHERE s.load_id = %s AND s.seq >= %s AND s.category IS NULL
+        """, (user_id, DEFAULT_CATEGORY, load_id, start_row))
+
+        # dup_seq numera le righe identiche del file, dalla prima riga anche in una ripresa; la
+        # riga è un duplicato se nel database (escluse le righe già committate da questo stesso
+        # upload) ce ne sono almeno altrettante
+        if skip_duplicates:
+            same_upload = "AND NOT (t.upload_id <=> %s)" if upload_id is not None else ""
+            cursor.execute(f"""
+                UPDATE import_staging s
+                JOIN (
+                    SELECT seq, ROW_NUMBER() OVER (
+                        PARTITION BY transaction_date, description, amount, type ORDER BY seq
+                    ) AS dup_seq
+                    FROM import_staging
+                    WHERE load_id = %s
+                ) d ON d.seq = s.seq
+                SET s.duplicate = d.dup_seq <= (
+                    SELECT COUNT(*) FROM transactions t
+                    WHERE t.user_id = %s AND t.transaction_date = s.transaction_date
+                      AND t.amount = s.amount AND t.type = s.type
+                      AND t.description = s.description
+                      {same_upload}
+                )
+                WHERE s.load_id = %s AND s.seq >= %s
+            """, (load_id, user_id) + ((upload_id,) if upload_id is not None else ()) + (load_id, start_row))
+        connection.commit()
+
+        for chunk_start in range(start_row, len(transactions), chunk_size):
+            chunk_end = min(chunk_start + chunk_size, len(transactions))
+            cursor.execute("""
+                INSERT INTO transactions (user_id, transaction_date, description, amount, type, category, upload_id)
+                SELECT %s, transaction_date, description, amount, type, category, %s
+                FROM import_staging
+                WHERE load_id = %s AND seq >= %s AND seq < %s AND NOT duplicate
+                ORDER BY seq
+            """, (user_id, upload_id, load_id, chunk_start, chunk_end))
+            chunk_saved = cursor.rowcount
+
+            # Contatori dei budget e checkpoint nella stessa transazione dell'INSERT
+            cursor.execute("""
+                SELECT NULL, transaction_date, SUM(amount) FROM import_staging
+                WHERE load_id = %s AND seq >= %s AND seq < %s AND NOT duplicate AND type = 'expense'
+                GROUP BY transaction_date
+            """, (load_id, chunk_start, chunk_end))
+            BudgetService.apply_spent_deltas(connection, user_id, cursor.fetchall())
+            if upload_id is not None:
+                UploadJobService.checkpoint(connection, upload_id, claim_token, chunk_end, chunk_saved)
+
+            connection.commit()
+            saved_count += chunk_saved
+            committed_rows = chunk_end
+
+        cursor.execute("""
+            SELECT category, SUM(NOT duplicate), SUM(duplicate) FROM import_staging
+            WHERE load_id = %s AND seq >= %s GROUP BY category
+        """, (load_id, start_row))
+        category_counts = cursor.fetchall()
+        duplicates = int(sum(skipped for _, _, skipped in category_counts))
+        _clear_staging(cursor, connection, "load_id = %s", (load_id,))
+        cursor.close()
+
+        logger.info(f"Import via staging: {saved_count} transazioni salvate, {duplicates} duplicati saltati "
+                    f"(utente {user_id}, upload {upload_id})")
+        return {
+            'success': True,
+            'saved_count': saved_count,
+            'total_count': len(transactions),
+            'committed_rows': committed_rows,
+            'errors': [],
+            'duplicates_skipped': duplicates,
+            'categories': sorted(category for category, imported, _ in category_counts if imported)
+        }
+
+    except Error as e:
+        logger.error(f"Errore import via staging (righe committate: {committed_rows}): {e}")
+        connection.rollback()
+        return {
+            'success': False,
+            'error': str(e),
+            'saved_count': saved_count,
+            'committed_rows': committed_rows
+        }
+
+    finally:
+        connection.close()
+        if tsv_path and os.path.exists(tsv_path):
+            os.unlink(tsv_path)
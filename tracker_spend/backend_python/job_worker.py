@@ -0,0 +1,71 @@
+"""Worker dei job in background: python job_worker.py [--once]
+
+Gira in un processo separato da gunicorn (start.sh lo avvia accanto al server
+web), così un job lungo non viene interrotto quando gunicorn ricicla i worker
+(max_requests) o li riavvia a un deploy. A ogni giro prende in carico, uno alla
+volta, i job in coda e quelli rimasti in corso da un processo terminato:
+
+- import degli upload a blocchi messi in coda dal finalize (upload_import.py)
+- eliminazioni di transazioni in background (delete_job_service.py)
+
+Senza questo processo upload a blocchi ed eliminazioni in background restano in attesa.
+
+Più istanze possono girare insieme: la presa in carico dei job è atomica.
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+from typing import List, Optional
+
+from services import get_delete_job_service, get_transaction_service, get_upload_job_service
+from upload_import import run_queued_upload
+
+logger = logging.getLogger(__name__)
+
+# Attesa tra due controlli della coda quando non ci sono job
+JOB_WORKER_POLL_SECONDS = float(os.environ.get('JOB_WORKER_POLL_SECONDS', 5))
+
+def run_pending_jobs() -> int:
+    """Esegue i job in coda finché ce ne sono; restituisce quanti ne ha eseguiti"""
+    ran = 0
+    while True:
+        upload = get_upload_job_service().claim_next_queued_job()
+        if upload:
+            logger.info(f"Upload {upload['id']} preso in carico (utente {upload['user_id']})")
+            _, status = run_queued_upload(upload)
+            logger.info(f"Upload {upload['id']} elaborato: status {status}")
+            ran += 1
+            continue
+
+        job = get_delete_job_service().claim_next_job()
+        if not job:
+            return ran
+        logger.info(f"Delete job {job['id']} preso in carico (utente {job['user_id']})")
+        get_delete_job_service().run_job(job, get_transaction_service())
+        ran += 1
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point CLI"""
+    parser = argparse.ArgumentParser(description='Worker dei job in background di TrackerSpend')
+    parser.add_argument('--once', action='store_true', help='Esegue i job in coda ed esce')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    logger.info("Job worker avviato")
+
+    while True:
+        try:
+            ran = run_pending_jobs()
+        except Exception as e:
+            # Database non raggiungibile o errore inatteso: si riprova al prossimo giro
+            logger.error(f"Errore job worker: {e}")
+            ran = 0
+        if args.once:
+            return 0
+        if not ran:
+            time.sleep(JOB_WORKER_POLL_SECONDS)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""Picchi di memoria per fase dell'import (read, detect, parse, validate, save).
+
+Con IMPORT_MEMORY_DEBUG=true ogni upload viene misurato con tracemalloc: per
+ogni fase si registrano memoria allocata all'inizio e alla fine e il picco
+durante la fase. Il report finisce nella risposta dell'upload (campo
+`memory`) e negli istogrammi di metrics. Il picco di RSS del processo
+(getrusage) viene invece aggiornato sempre, perché non costa nulla.
+
+tracemalloc è globale al processo e rallenta le allocazioni: le misure sono
+affidabili solo con un upload alla volta, quindi un upload concorrente a uno
+già misurato non viene misurato.
+"""
+import os
+import sys
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+import metrics
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+IMPORT_MEMORY_DEBUG = os.environ.get('IMPORT_MEMORY_DEBUG', 'false').lower() == 'true'
+
+STAGES = ('read', 'detect', 'parse', 'validate', 'save')
+
+_tracking_lock = threading.Lock()
+
+def peak_rss_bytes() -> Optional[int]:
+    """Picco di RSS del processo (ru_maxrss è in KB su Linux, in byte su macOS)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+class ImportMemoryTracker:
+    """Misura i picchi di memoria delle fasi di un import"""
+
+    def __init__(self, enabled: Optional[bool] = None):
+        self.enabled = IMPORT_MEMORY_DEBUG if enabled is None else enabled
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.rows = 0
+        self._owns_lock = False
+        self._started_tracing = False
+
+    def start(self) -> 'ImportMemoryTracker':
+        if self.enabled:
+            self._owns_lock = _tracking_lock.acquire(blocking=False)
+            if not self._owns_lock:
+                self.enabled = False
+            elif not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._started_tracing = True
+        return self
+
+    def stop(self):
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        if self._owns_lock:
+            _tracking_lock.release()
+            self._owns_lock = False
+
+        rss = peak_rss_bytes()
+        if rss is not None:
+            metrics.PROCESS_PEAK_RSS.set(rss)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @contextmanager
+    def stage(self, name: str):
+        """Misura una fase: il picco è relativo alla fase, non all'intero import"""
+        if not self.enabled or not tracemalloc.is_tracing():
+            yield
+            return
+
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        try:
+            yield
+        finally:
+            end, peak = tracemalloc.get_traced_memory()
+            self.stages[name] = {
+                'start_kb': round(start / 1024, 1),
+                'end_kb': round(end / 1024, 1),
+                'peak_kb': round(peak / 1024, 1),
+                'stage_peak_kb': round((peak - start) / 1024, 1)
+            }
+            metrics.IMPORT_STAGE_PEAK.observe(peak, name)
+            metrics.IMPORT_STAGE_PEAK_MAX.set_max(peak, name)
+
+    def report(self) -> Dict[str, Any]:
+        """Report per fase, picco complessivo e byte per riga"""
+        peak = max((stage['peak_kb'] for stage in self.stages.values()), default=0.0)
+        rss = peak_rss_bytes()
+        return {
+            'stages': {name: self.stages[name] for name in STAGES if name in self.stages},
+            'peak_kb': peak,
+            'rows': self.rows,
+            'peak_bytes_per_row': round(peak * 1024 / self.rows, 1) if self.rows else None,
+            'process_peak_rss_kb': round(rss / 1024, 1) if rss is not None else None
+        }
@@ -0,0 +1,279 @@
+"""Metriche per richiesta e per query, esposte in formato Prometheus.
+
+- latenza delle richieste per route (istogramma)
+- numero e durata delle query SQL per richiesta, misurate avvolgendo le
+  connessioni restituite da db.get_connection (quindi tutti i servizi)
+- intervalli nominati (es. la verifica del token) con `span('auth')`
+- header Server-Timing su ogni risposta non in streaming
+
+Le risposte in streaming (liste con ?stream=, export) eseguono le query mentre
+il body viene generato: le loro metriche si registrano alla chiusura della
+risposta, non quando la view la restituisce.
+
+Le metriche usano prometheus_client. Con gunicorn è attiva la modalità
+multiprocesso (PROMETHEUS_MULTIPROC_DIR, impostata in gunicorn.conf.py): ogni
+worker scrive i propri valori su file e /metrics li somma, quindi lo scrape
+vede tutti i worker e i contatori non ripartono da zero quando un worker viene
+riciclato. /metrics risponde solo con `Authorization: Bearer <METRICS_TOKEN>`.
+"""
+import hmac
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+
+from flask import Blueprint, Response, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest,
+    Gauge as PrometheusGauge, Histogram as PrometheusHistogram
+)
+from prometheus_client import multiprocess
+
+# Senza token l'endpoint /metrics non è esposto
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Limiti superiori dei bucket in secondi (come i default di prometheus_client)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250)
+
+class Histogram:
+    """Istogramma con etichette posizionali: observe(valore, *etichette)"""
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...], label_names: Tuple[str, ...]):
+        self._metric = PrometheusHistogram(name, help_text, label_names, buckets=buckets)
+
+    def observe(self, value: float, *labels):
+        (self._metric.labels(*labels) if labels else self._metric).observe(value)
+
+class Gauge:
+    """Valore istantaneo per combinazione di etichette.
+
+    `multiprocess_mode` dice come combinare i valori dei worker (vedi prometheus_client).
+    """
+
+    def __init__(self, name: str, help_text: str, label_names: Tuple[str, ...] = (),
+                 multiprocess_mode: str = 'livemax'):
+        self._metric = PrometheusGauge(name, help_text, label_names, multiprocess_mode=multiprocess_mode)
+        # Massimi del processo per set_max (i file multiprocesso non si rileggono)
+        self._max: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *labels):
+        (self._metric.labels(*labels) if labels else self._metric).set(value)
+
+    def set_max(self, value: float, *labels):
+        with self._lock:
+            value = max(self._max.get(labels, value), value)
+            self._max[labels] = value
+            self.set(value, *labels)
+
+REQUEST_LATENCY = Histogram(
+    'trackerspend_request_duration_seconds', 'Durata delle richieste HTTP per route',
+    LATENCY_BUCKETS, ('method', 'route', 'status')
+)
+REQUEST_DB_QUERIES = Histogram(
+    'trackerspend_request_db_queries', 'Query SQL eseguite per richiesta',
+    QUERY_COUNT_BUCKETS, ('route',)
+)
+REQUEST_DB_TIME = Histogram(
+    'trackerspend_request_db_duration_seconds', 'Tempo speso in MySQL per richiesta',
+    LATENCY_BUCKETS, ('route',)
+)
+SPAN_LATENCY = Histogram(
+    'trackerspend_span_duration_seconds', 'Durata degli intervalli nominati (auth, parse, ...)',
+    LATENCY_BUCKETS, ('span',)
+)
+
+# Picchi di memoria dell'import (vedi memory_profile.py)
+MEMORY_BUCKETS = tuple(float(2 ** power) for power in range(20, 32))  # da 1 MiB a 2 GiB
+IMPORT_STAGE_PEAK = Histogram(
+    'trackerspend_import_stage_peak_bytes', 'Picco di memoria Python (tracemalloc) per fase di import',
+    MEMORY_BUCKETS, ('stage',)
+)
+IMPORT_STAGE_PEAK_MAX = Gauge(
+    'trackerspend_import_stage_peak_bytes_max', 'Massimo picco di memoria Python osservato per fase di import',
+    ('stage',), multiprocess_mode='max'
+)
+PROCESS_PEAK_RSS = Gauge('trackerspend_process_peak_rss_bytes', 'Picco di RSS dei worker attivi (getrusage)')
+
+class RequestStats:
+    """Contatori della richiesta in corso"""
+
+    __slots__ = ('started', 'db_queries', 'db_time', 'spans', 'on_query')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db_queries = 0
+        self.db_time = 0.0
+        self.spans: Dict[str, float] = {}
+        # Callback opzionale (statement, secondi) per strumentazioni più dettagliate (sql_debug)
+        self.on_query: Optional[Callable[[str, float], None]] = None
+
+    def record_query(self, statement: str, elapsed: float):
+        self.db_queries += 1
+        self.db_time += elapsed
+        if self.on_query is not None:
+            self.on_query(statement, elapsed)
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar('trackerspend_request_stats', default=None)
+
+def current_stats() -> Optional[RequestStats]:
+    """Statistiche della richiesta corrente (None fuori da una richiesta)"""
+    return _current.get()
+
+@contextmanager
+def span(name: str):
+    """Misura un intervallo nominato: finisce nell'istogramma e nel Server-Timing"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        SPAN_LATENCY.observe(elapsed, name)
+        stats = _current.get()
+        if stats is not None:
+            stats.spans[name] = stats.spans.get(name, 0.0) + elapsed
+
+# ============================================================================
+# DB INSTRUMENTATION
+# ============================================================================
+
+class InstrumentedCursor:
+    """Cursore che misura execute/executemany e le fetch (rilevanti per i cursori non bufferizzati)"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def _timed(self, statement: str, method, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return method(*args, **kwargs)
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.record_query(statement, time.perf_counter() - started)
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        return self._timed(operation, self._cursor.execute, operation, params, *args, **kwargs)
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        return self._timed(operation, self._cursor.executemany, operation, seq_params, *args, **kwargs)
+
+    def _fetch_time(self, method, *args):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            stats = _current.get()
+            if stats is not None:
+                stats.db_time += time.perf_counter() - started
+
+    def fetchone(self):
+        return self._fetch_time(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self._fetch_time(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self._fetch_time(self._cursor.fetchall)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class InstrumentedConnection:
+    """Connessione i cui cursori sono strumentati; il resto è delegato"""
+
+    def __init__(self, connection):
+        self._connection = connection
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._connection.cursor(*args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+def instrument(connection):
+    """Avvolge una connessione mysql.connector (o pooled) per contare le query"""
+    return InstrumentedConnection(connection) if connection is not None else None
+
+# ============================================================================
+# FLASK INTEGRATION
+# ============================================================================
+
+metrics_api = Blueprint('metrics', __name__)
+
+def _route_label() -> str:
+    """Regola della route (non il path, per non esplodere la cardinalità)"""
+    return request.url_rule.rule if request.url_rule else 'unmatched'
+
+def _before_request():
+    _current.set(RequestStats())
+
+def when_complete(response, callback: Callable[[], None]):
+    """Esegue callback quando la risposta è completa: subito, o alla chiusura se in streaming.
+
+    Il callback di una risposta in streaming gira fuori dal contesto della
+    richiesta: i dati di `request` vanno letti prima.
+    """
+    if response.is_streamed:
+        response.call_on_close(callback)
+    else:
+        callback()
+
+def _after_request(response):
+    stats = _current.get()
+    if stats is None:
+        return response
+
+    method, route, status = request.method, _route_label(), str(response.status_code)
+
+    def record():
+        elapsed = time.perf_counter() - stats.started
+        REQUEST_LATENCY.observe(elapsed, method, route, status)
+        REQUEST_DB_QUERIES.observe(stats.db_queries, route)
+        REQUEST_DB_TIME.observe(stats.db_time, route)
+
+    when_complete(response, record)
+    if response.is_streamed:
+        # Gli header partono prima del body: i tempi non sarebbero quelli finali
+        return response
+
+    elapsed = time.perf_counter() - stats.started
+    timings = [f'app;dur={elapsed * 1000:.1f}',
+               f'db;dur={stats.db_time * 1000:.1f};desc="{stats.db_queries} queries"']
+    timings.extend(f'{name};dur={value * 1000:.1f}' for name, value in stats.spans.items())
+    response.headers['Server-Timing'] = ', '.join(timings)
+    return response
+
+def _teardown_request(exception=None):
+    _current.set(None)
+
+def _registry():
+    """Registro da esporre: in modalità multiprocesso aggrega i file di tutti i worker"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+@metrics_api.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Metriche in formato testo Prometheus (richiede METRICS_TOKEN)"""
+    auth_header = request.headers.get('Authorization', '')
+    if not METRICS_TOKEN:
+        return Response('Not Found\n', status=404, mimetype='text/plain')
+    if not hmac.compare_digest(auth_header.encode(), f'Bearer {METRICS_TOKEN}'.encode()):
+        return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    return Response(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
+
+def init_app(app):
+    """Registra hook e endpoint /metrics sull'app"""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    app.register_blueprint(metrics_api)
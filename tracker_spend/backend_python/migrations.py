@@ -0,0 +1,533 @@
+import argparse
+import logging
+import sys
+import mysql.connector
+from mysql.connector import Error
+from typing import List, Dict, Any, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Lock applicativo per evitare che due deploy applichino le migrazioni insieme
+MIGRATION_LOCK_NAME = 'tracker_spend_schema_migrations'
+MIGRATION_LOCK_TIMEOUT = 60
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def _column_exists(cursor, table: str, column: str) -> bool:
+    """Verifica se una colonna esiste nello schema corrente"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s
+    """, (table, column))
+    return cursor.fetchone()[0] > 0
+
+def _index_exists(cursor, table: str, index: str) -> bool:
+    """Verifica se un indice esiste nello schema corrente"""
+    cursor.execute("""
+        SELECT COUNT(*) FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND INDEX_NAME = %s
+    """, (table, index))
+    return cursor.fetchone()[0] > 0
+
+# ============================================================================
+# MIGRATIONS
+# ============================================================================
+
+def _baseline_schema(cursor):
+    """Tabelle create in precedenza a ogni avvio dai servizi e da app.py"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(50) UNIQUE NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            first_name VARCHAR(50),
+            last_name VARCHAR(50),
+            phone VARCHAR(20),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            is_active BOOLEAN DEFAULT TRUE,
+            role ENUM('user', 'admin') DEFAULT 'user'
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_sessions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            token VARCHAR(255) NOT NULL UNIQUE,
+            expires_at TIMESTAMP NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_preferences (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL UNIQUE,
+            timezone VARCHAR(50) DEFAULT 'UTC',
+            notifications_enabled BOOLEAN DEFAULT TRUE,
+            currency VARCHAR(3) DEFAULT 'EUR',
+            language VARCHAR(5) DEFAULT 'it',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            type ENUM('income', 'expense') NOT NULL,
+            color VARCHAR(7) DEFAULT '#6B7280',
+            icon VARCHAR(10) DEFAULT '💰',
+            is_default BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            category_id INT,
+            transaction_date DATE NOT NULL,
+            description VARCHAR(255) NOT NULL,
+            amount DECIMAL(10,2) NOT NULL,
+            type ENUM('income', 'expense') NOT NULL,
+            category VARCHAR(100) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_user_date (user_id, transaction_date),
+            INDEX idx_category (category),
+            INDEX idx_type (type),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_categories (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            color VARCHAR(7) DEFAULT '#3B82F6',
+            icon VARCHAR(50) DEFAULT 'tag',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY unique_user_category (user_id, name),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS budgets (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            category_id INT,
+            amount DECIMAL(10,2) NOT NULL,
+            period ENUM('daily', 'weekly', 'monthly', 'yearly') NOT NULL,
+            start_date DATE NOT NULL,
+            end_date DATE,
+            description TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            spent_amount DECIMAL(10,2) NOT NULL DEFAULT 0.00,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+            FOREIGN KEY (category_id) REFERENCES categories(id) ON DELETE SET NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS goals (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            name VARCHAR(100) NOT NULL,
+            description TEXT,
+            target_amount DECIMAL(10,2) NOT NULL,
+            current_amount DECIMAL(10,2) DEFAULT 0.00,
+            deadline DATE,
+            priority ENUM('low', 'medium', 'high') DEFAULT 'medium',
+            status ENUM('active', 'completed', 'paused', 'cancelled') DEFAULT 'active',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+
+def _default_categories(cursor):
+    """Categorie predefinite, inserite solo se non ancora presenti"""
+    cursor.execute("SELECT COUNT(*) FROM categories WHERE is_default = TRUE")
+    if cursor.fetchone()[0] > 0:
+        return
+
+    default_categories = [
+        # Income categories
+        ('Stipendio', 'Stipendio mensile', 'income', '#10B981', '💰'),
+        ('Bonus', 'Bonus e premi', 'income', '#3B82F6', '🎁'),
+        ('Investimenti', 'Rendimenti da investimenti', 'income', '#8B5CF6', '📈'),
+        ('Altri', 'Altre entrate', 'income', '#6B7280', '➕'),
+
+        # Expense categories
+        ('Alimentari', 'Spesa alimentare', 'expense', '#EF4444', '🛒'),
+        ('Trasporti', 'Trasporti pubblici e privati', 'expense', '#F59E0B', '🚗'),
+        ('Casa', 'Bollette e affitto', 'expense', '#8B5CF6', '🏠'),
+        ('Intrattenimento', 'Cinema, ristoranti, hobby', 'expense', '#EC4899', '🎬'),
+        ('Salute', 'Medicinali e visite mediche', 'expense', '#10B981', '💊'),
+        ('Shopping', 'Abbigliamento e accessori', 'expense', '#F97316', '👕'),
+        ('Viaggi', 'Vacanze e viaggi', 'expense', '#06B6D4', '✈️'),
+        ('Altri', 'Altre spese', 'expense', '#6B7280', '📝')
+    ]
+
+    cursor.executemany("""
+        INSERT INTO categories (name, description, type, color, icon, is_default)
+        VALUES (%s, %s, %s, %s, %s, TRUE)
+    """, default_categories)
+
+def _transactions_category_column(cursor):
+    """Colonna category per database creati con init.sql"""
+    if not _column_exists(cursor, 'transactions', 'category'):
+        cursor.execute("ALTER TABLE transactions ADD COLUMN category VARCHAR(100) NOT NULL DEFAULT 'Altro'")
+
+def _transactions_category_id_column(cursor):
+    """Colonna category_id usata dalle query di budget e dashboard"""
+    if not _column_exists(cursor, 'transactions', 'category_id'):
+        cursor.execute("ALTER TABLE transactions ADD COLUMN category_id INT NULL AFTER user_id")
+
+def _budgets_spent_amount(cursor):
+    """Contatore di spesa dei budget, ricalcolato dalle transazioni esistenti"""
+    from budget_service import BudgetService
+
+    if not _column_exists(cursor, 'budgets', 'spent_amount'):
+        cursor.execute("ALTER TABLE budgets ADD COLUMN spent_amount DECIMAL(10,2) NOT NULL DEFAULT 0.00")
+    BudgetService._reconcile_spent(cursor)
+
+def _transactions_query_indexes(cursor):
+    """Indici composti modellati sulle query di dashboard, budget e lista transazioni.
+
+    - idx_user_type_date copre gli aggregati sulle sole spese (budget, top categorie)
+    - idx_user_category_date serve il filtro per categoria e le statistiche per categoria
+    - idx_type e idx_category (bassa cardinalità, mai usati da soli) vengono rimossi
+    """
+    if not _index_exists(cursor, 'transactions', 'idx_user_type_date'):
+        cursor.execute("""
+            CREATE INDEX idx_user_type_date
+            ON transactions (user_id, type, transaction_date, category_id, amount)
+        """)
+    if not _index_exists(cursor, 'transactions', 'idx_user_category_date'):
+        cursor.execute("""
+            CREATE INDEX idx_user_category_date
+            ON transactions (user_id, category, transaction_date)
+        """)
+    for index in ('idx_type', 'idx_category'):
+        if _index_exists(cursor, 'transactions', index):
+            cursor.execute(f"DROP INDEX {index} ON transactions")
+
+def _upload_jobs(cursor):
+    """Job di upload idempotenti con checkpoint, e collegamento transazione -> upload.
+
+    committed_rows è il numero di transazioni valide (nell'ordine del parser) già
+    committate: un nuovo tentativo con la stessa idempotency key riparte da lì.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS upload_jobs (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            idempotency_key VARCHAR(64) NULL,
+            status ENUM('pending', 'processing', 'completed', 'failed') NOT NULL DEFAULT 'pending',
+            filename VARCHAR(255) NULL,
+            file_sha256 CHAR(64) NULL,
+            total_rows INT NOT NULL DEFAULT 0,
+            committed_rows INT NOT NULL DEFAULT 0,
+            saved_count INT NOT NULL DEFAULT 0,
+            rejected_count INT NOT NULL DEFAULT 0,
+            result JSON NULL,
+            error TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            UNIQUE KEY uniq_user_idempotency (user_id, idempotency_key),
+            INDEX idx_user_created (user_id, created_at),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+    if not _column_exists(cursor, 'transactions', 'upload_id'):
+        cursor.execute("ALTER TABLE transactions ADD COLUMN upload_id BIGINT NULL")
+    if not _index_exists(cursor, 'transactions', 'idx_upload'):
+        cursor.execute("CREATE INDEX idx_upload ON transactions (upload_id)")
+
+# Regole globali seminate dalla migrazione 8: copia fissa delle parole chiave del parser
+# al momento del rilascio. Le modifiche successive vanno in una nuova migrazione.
+_CATEGORY_RULES_V8 = [
+    ('Alimentari', [
+        'supermercato', 'conad', 'esselunga', 'carrefour', 'coop', 'lidl', 'aldi', 'pane', 'latte',
+        'frutta', 'verdura', 'macelleria', 'pescheria', 'ristorante', 'pizzeria', 'bar', 'caffè',
+        'gelato', 'fast food'
+    ]),
+    ('Trasporti', [
+        'benzina', 'diesel', 'enel', 'eni', 'q8', 'esso', 'shell', 'ip', 'metro', 'bus', 'treno',
+        'taxi', 'uber', 'noleggio', 'parcheggio', 'autostrada', 'pedaggio', 'assicurazione', 'bollo'
+    ]),
+    ('Casa', [
+        'bolletta', 'luce', 'gas', 'acqua', 'riscaldamento', 'condominio', 'affitto', 'mutuo',
+        'spese condominiali', 'elettricità'
+    ]),
+    ('Shopping', [
+        'vestiti', 'abbigliamento', 'scarpe', 'borsa', 'accessori', 'h&m', 'zara', 'uniqlo', 'nike',
+        'adidas', 'decathlon', 'amazon', 'ebay', 'aliexpress', 'shopping online'
+    ]),
+    ('Salute', [
+        'farmacia', 'medico', 'ospedale', 'visita', 'esame', 'analisi', 'palestra', 'fitness',
+        'piscina', 'massaggio', 'dentista'
+    ]),
+    ('Intrattenimento', [
+        'cinema', 'teatro', 'concerto', 'museo', 'mostra', 'disco', 'netflix', 'spotify', 'youtube',
+        'gaming', 'videogiochi'
+    ]),
+    ('Lavoro', [
+        'stipendio', 'bonus', 'premio', 'commissione', 'freelance', 'ufficio', 'materiale', 'corso',
+        'formazione'
+    ]),
+    ('Risparmio', [
+        'investimento', 'fondi', 'azioni', 'obbligazioni', 'deposito', 'risparmio',
+        'conto deposito', 'piano accumulo'
+    ]),
+]
+
+def _import_staging(cursor):
+    """Staging degli import massivi e regole di categorizzazione applicate in SQL.
+
+    import_staging contiene le righe normalizzate di un import (load_id = id
+    dell'upload job) finché non sono copiate in transactions. category_rules
+    sostituisce le parole chiave del parser: user_id NULL = regola globale, le
+    regole dell'utente vincono su quelle globali, poi conta priority (crescente).
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS import_staging (
+            load_id BIGINT NOT NULL,
+            seq INT NOT NULL,
+            transaction_date DATE NOT NULL,
+            description VARCHAR(255) NOT NULL,
+            amount DECIMAL(10,2) NOT NULL,
+            type ENUM('income', 'expense') NOT NULL,
+            category VARCHAR(100) NULL,
+            duplicate BOOLEAN NOT NULL DEFAULT FALSE,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (load_id, seq),
+            INDEX idx_created (created_at)
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS category_rules (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NULL,
+            keyword VARCHAR(100) NOT NULL,
+            category VARCHAR(100) NOT NULL,
+            priority INT NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            INDEX idx_user_priority (user_id, priority),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+    cursor.execute("SELECT COUNT(*) FROM category_rules WHERE user_id IS NULL")
+    if cursor.fetchone()[0] > 0:
+        return
+    # Stesso ordine di CSVTransactionParser._auto_categorize: vince la prima corrispondenza
+    rules = [
+        (keyword, category)
+        for category, keywords in _CATEGORY_RULES_V8
+        for keyword in keywords
+    ]
+    cursor.executemany("""
+        INSERT INTO category_rules (user_id, keyword, category, priority)
+        VALUES (NULL, %s, %s, %s)
+    """, [(keyword, category, priority) for priority, (keyword, category) in enumerate(rules)])
+
+def _delete_jobs(cursor):
+    """Eliminazioni di transazioni eseguite in background, con avanzamento.
+
+    filters contiene i filtri dell'eliminazione (start_date, end_date, upload_id):
+    rieseguire un job fallito elimina solo le righe rimaste.
+    """
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS delete_jobs (
+            id BIGINT AUTO_INCREMENT PRIMARY KEY,
+            user_id INT NOT NULL,
+            status ENUM('pending', 'running', 'completed', 'failed') NOT NULL DEFAULT 'pending',
+            filters JSON NULL,
+            total_rows INT NOT NULL DEFAULT 0,
+            deleted_count INT NOT NULL DEFAULT 0,
+            error TEXT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_user_created (user_id, created_at),
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+        )
+    """)
+
+def _upload_job_claims(cursor):
+    """Token della presa in carico di un upload job.
+
+    Ogni presa in carico scrive un token nuovo; checkpoint, completamento e
+    heartbeat valgono solo con il token corrente, così un worker che ha perso il
+    job (lease scaduto e ripreso da un retry) non può più scriverci.
+    """
+    if not _column_exists(cursor, 'upload_jobs', 'claim_token'):
+        cursor.execute("ALTER TABLE upload_jobs ADD COLUMN claim_token CHAR(32) NULL")
+
+def _upload_job_queue(cursor):
+    """Upload a blocchi importati in background da job_worker.py.
+
+    session_id è la sessione (upload_sessions.py) con il file da importare; il
+    worker cerca i job in coda per status e updated_at.
+    """
+    if not _column_exists(cursor, 'upload_jobs', 'session_id'):
+        cursor.execute("ALTER TABLE upload_jobs ADD COLUMN session_id CHAR(32) NULL")
+    if not _index_exists(cursor, 'upload_jobs', 'idx_status_updated'):
+        cursor.execute("CREATE INDEX idx_status_updated ON upload_jobs (status, updated_at)")
+
+def _delete_job_claims(cursor):
+    """Token della presa in carico di un delete job, come per gli upload job (migrazione 10)"""
+    if not _column_exists(cursor, 'delete_jobs', 'claim_token'):
+        cursor.execute("ALTER TABLE delete_jobs ADD COLUMN claim_token CHAR(32) NULL")
+
+# Migrazioni ordinate: (versione, descrizione, funzione). Mai rinumerare o modificare
+# una migrazione già rilasciata, aggiungerne una nuova in coda.
+MIGRATIONS = [
+    (1, 'baseline schema', _baseline_schema),
+    (2, 'default categories', _default_categories),
+    (3, 'transactions.category column', _transactions_category_column),
+    (4, 'transactions.category_id column', _transactions_category_id_column),
+    (5, 'budgets.spent_amount counter', _budgets_spent_amount),
+    (6, 'transactions composite query indexes', _transactions_query_indexes),
+    (7, 'upload jobs and transactions.upload_id', _upload_jobs),
+    (8, 'import staging and category rules', _import_staging),
+    (9, 'background delete jobs', _delete_jobs),
+    (10, 'upload job claim token', _upload_job_claims),
+    (11, 'queued upload jobs', _upload_job_queue),
+    (12, 'delete job claim token', _delete_job_claims),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def _ensure_version_table(cursor):
+    """Crea la tabella schema_version se non esiste"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+def get_current_version(connection) -> int:
+    """Versione dello schema applicata (0 se nessuna migrazione è stata eseguita)"""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        return cursor.fetchone()[0]
+    except Error as e:
+        # 1146: tabella schema_version inesistente
+        if e.errno == 1146:
+            return 0
+        raise
+    finally:
+        cursor.close()
+
+def migrate(db_config: Dict[str, Any], target: Optional[int] = None) -> List[int]:
+    """Applica in ordine le migrazioni mancanti e restituisce le versioni applicate"""
+    target = target or LATEST_VERSION
+    connection = mysql.connector.connect(**db_config)
+    cursor = connection.cursor()
+    applied = []
+
+    try:
+        cursor.execute("SELECT GET_LOCK(%s, %s)", (MIGRATION_LOCK_NAME, MIGRATION_LOCK_TIMEOUT))
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Impossibile ottenere il lock delle migrazioni")
+
+        _ensure_version_table(cursor)
+        current = get_current_version(connection)
+
+        for version, description, migration in MIGRATIONS:
+            if version <= current or version > target:
+                continue
+
+            logger.info(f"Applico migrazione {version}: {description}")
+            migration(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description) VALUES (%s, %s)",
+                (version, description)
+            )
+            connection.commit()
+            applied.append(version)
+
+        return applied
+
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK_NAME,))
+        cursor.fetchone()
+        cursor.close()
+        connection.close()
+
+def check_schema_version(db_config: Dict[str, Any]) -> Tuple[int, int]:
+    """Controllo all'avvio: una sola SELECT, nessuna DDL. Restituisce (corrente, ultima)"""
+    try:
+        connection = mysql.connector.connect(**db_config)
+    except Error as e:
+        logger.error(f"Errore connessione MySQL durante il controllo schema: {e}")
+        return 0, LATEST_VERSION
+
+    try:
+        current = get_current_version(connection)
+    finally:
+        connection.close()
+
+    if current < LATEST_VERSION:
+        logger.warning(
+            f"Schema database alla versione {current}, attesa {LATEST_VERSION}: "
+            f"eseguire 'python migrations.py upgrade'"
+        )
+    return current, LATEST_VERSION
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """Entry point CLI: python migrations.py [upgrade|status]"""
+    from railway_config import get_database_config
+
+    parser = argparse.ArgumentParser(description='Migrazioni dello schema TrackerSpend')
+    parser.add_argument('command', choices=['upgrade', 'status'], nargs='?', default='status')
+    parser.add_argument('--target', type=int, help='Versione massima da applicare')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    db_config = get_database_config()
+
+    if args.command == 'upgrade':
+        applied = migrate(db_config, args.target)
+        print(f"Migrazioni applicate: {applied or 'nessuna'}")
+        return 0
+
+    current, latest = check_schema_version(db_config)
+    print(f"Versione schema: {current} (ultima disponibile: {latest})")
+    for version, description, _ in MIGRATIONS:
+        status = 'applicata' if version <= current else 'in attesa'
+        print(f"  {version:3d}  {description:40s} {status}")
+    return 0 if current >= latest else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
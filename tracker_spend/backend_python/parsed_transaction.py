@@ -0,0 +1,109 @@
+"""Record compatto di una transazione letta da un estratto conto.
+
+ParsedTransaction attraversa tutta la pipeline di import (parse -> validate ->
+save) al posto di un dict per riga: con __slots__ occupa circa un terzo della
+memoria e la validazione avviene una sola volta, nel costruttore. Un record
+esistente è quindi sempre valido e già troncato alle dimensioni delle colonne
+della tabella transactions.
+"""
+from typing import Dict, Any, Optional, Union
+
+TRANSACTION_TYPES = ('income', 'expense')
+
+# Dimensioni delle colonne di transactions (vedi migrations.py)
+DESCRIPTION_MAX_LENGTH = 255
+CATEGORY_MAX_LENGTH = 100
+
+# Categoria delle transazioni che nessuna regola riconosce
+DEFAULT_CATEGORY = 'Altro'
+
+# Causa -> messaggio per i campi obbligatori mancanti
+MISSING_FIELD_ERRORS = {
+    'missing_date': 'Data mancante o non valida',
+    'missing_description': 'Descrizione mancante',
+    'invalid_amount': 'Importo mancante o zero',
+}
+
+class InvalidTransaction(ValueError):
+    """Riga non importabile; `reason` è un codice stabile per i conteggi per causa"""
+
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+class ParsedTransaction:
+    """Transazione validata, pronta per il salvataggio"""
+
+    __slots__ = ('transaction_date', 'description', 'amount', 'type', 'category',
+                 'source_row', 'original_row', 'bank', 'account', 'status', 'currency')
+
+    FIELDS = __slots__
+
+    def __init__(self, transaction_date: str, description: str, amount: float, type: str,
+                 category: str, source_row: Optional[int] = None, original_row: Optional[tuple] = None,
+                 bank: Optional[str] = None, account: Optional[str] = None,
+                 status: Optional[str] = None, currency: Optional[str] = None):
+        if not transaction_date:
+            raise InvalidTransaction('missing_date', MISSING_FIELD_ERRORS['missing_date'])
+        description = description.strip() if description else ''
+        if not description:
+            raise InvalidTransaction('missing_description', MISSING_FIELD_ERRORS['missing_description'])
+        if not amount:
+            raise InvalidTransaction('invalid_amount', MISSING_FIELD_ERRORS['invalid_amount'])
+        type = type.lower() if type else ''
+        if type not in TRANSACTION_TYPES:
+            raise InvalidTransaction('invalid_type', f"Tipo non valido: {type or 'mancante'}")
+
+        self.transaction_date = transaction_date
+        self.description = description[:DESCRIPTION_MAX_LENGTH]
+        self.amount = amount
+        self.type = type
+        # None = da categorizzare al salvataggio (regole di category_rules)
+        self.category = category[:CATEGORY_MAX_LENGTH] if category else None
+        self.source_row = source_row
+        self.original_row = original_row
+        self.bank = bank
+        self.account = account
+        self.status = status
+        self.currency = currency
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ParsedTransaction':
+        """Costruisce (e valida) un record da un dict; accetta anche 'date' per 'transaction_date'"""
+        values = {field: data.get(field) for field in cls.FIELDS if field in data}
+        if not values.get('transaction_date'):
+            values['transaction_date'] = data.get('date')
+        return cls(**{'transaction_date': None, 'description': None, 'amount': None,
+                      'type': None, **values, 'category': values.get('category') or DEFAULT_CATEGORY})
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Campi valorizzati, per log e risposte JSON"""
+        return {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+
+    def insert_values(self, user_id: int) -> tuple:
+        """Parametri per INSERT INTO transactions (user_id, transaction_date, description, amount, type, category)"""
+        return (user_id, self.transaction_date, self.description, self.amount, self.type,
+                self.category or DEFAULT_CATEGORY)
+
+    def __repr__(self):
+        return f"ParsedTransaction({self.to_dict()})"
+
+class RejectedRow:
+    """Riga del file scartata dal parser, con la causa (per il report degli scarti)"""
+
+    __slots__ = ('source_row', 'reason', 'message')
+
+    def __init__(self, source_row: Optional[int], reason: str, message: str):
+        self.source_row = source_row
+        self.reason = reason
+        self.message = message
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'row': self.source_row + 1 if self.source_row is not None else None,
+                'reason': self.reason, 'message': self.message}
+
+    def __repr__(self):
+        return f"RejectedRow({self.to_dict()})"
+
+# Elemento restituito dal parser: transazione valida o riga scartata
+ParsedRow = Union[ParsedTransaction, RejectedRow]
@@ -0,0 +1,203 @@
+"""Micro-benchmark di CSVTransactionParser.
+
+Misura righe/secondo e picco di memoria (tracemalloc) per le funzioni calde
+del parser e per il parsing completo di ogni formato, su corpora fissi
+generati in modo deterministico. I risultati si salvano come baseline JSON
+e si confrontano con una baseline precedente.
+
+I tempi dipendono dalla macchina: una baseline vale solo sull'host su cui è
+stata registrata (campo `host`). Confrontata da un host diverso, --compare
+controlla solo i picchi di memoria e segnala che i tempi non sono comparabili.
+La baseline in perf/baselines va registrata di nuovo a ogni modifica del parser.
+
+Il repository non ha una suite pytest, quindi il benchmark è uno script
+autonomo basato su timeit/tracemalloc, senza dipendenze aggiuntive.
+
+Uso:
+    python perf/bench_parser.py --save perf/baselines/parser.json
+    python perf/bench_parser.py --compare perf/baselines/parser.json
+    python perf/bench_parser.py --only parse_file --sizes 10000
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import List, Dict, Any, Callable, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_parser import CSVTransactionParser  # noqa: E402
+from parsed_transaction import ParsedTransaction  # noqa: E402
+from perf.generate_data import LAYOUTS, write_csv, write_excel  # noqa: E402
+from perf.seed import generate_transactions  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000]
+DEFAULT_REPEAT = 5
+CORPUS_SEED = 1234
+
+# Un benchmark più lento di questa soglia rispetto alla baseline è una regressione
+SLOWDOWN_TOLERANCE = 1.25
+MEMORY_TOLERANCE = 1.25
+
+def _measure(func: Callable[[], Any], rows: int, repeat: int) -> Dict[str, Any]:
+    """Miglior tempo su `repeat` esecuzioni, poi un'esecuzione sotto tracemalloc per il picco"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'rows': rows,
+        'best_s': round(best, 6),
+        'rows_per_s': round(rows / best, 1) if best else None,
+        'peak_kb': round(peak / 1024, 1)
+    }
+
+def _corpus(size: int) -> List[Dict[str, Any]]:
+    return list(generate_transactions(size, CORPUS_SEED))
+
+def function_benchmarks(parser: CSVTransactionParser, size: int) -> Dict[str, Callable[[], Any]]:
+    """Benchmark delle singole funzioni calde sugli input che ricevono dai loop per riga"""
+    rows = _corpus(size)
+    iso_dates = [row['transaction_date'].isoformat() for row in rows]
+    italian_dates = [row['transaction_date'].strftime('%d/%m/%Y') for row in rows]
+    us_dates = [row['transaction_date'].strftime('%m/%d/%Y') for row in rows]
+    plain_amounts = [f"{row['amount']:.2f}" for row in rows]
+    bank_amounts = [f"-{row['amount']:.2f}".replace('.', ',') for row in rows]
+    descriptions = [row['description'] for row in rows]
+    parsed = [
+        ParsedTransaction(iso, row['description'], float(row['amount']), row['type'], row['category'])
+        for iso, row in zip(iso_dates, rows)
+    ]
+
+    return {
+        '_parse_date[iso]': lambda: [parser._parse_date(value) for value in iso_dates],
+        '_parse_date[dd/mm/yyyy]': lambda: [parser._parse_date(value) for value in italian_dates],
+        '_parse_modern_date': lambda: [parser._parse_modern_date(value) for value in us_dates],
+        '_parse_amount': lambda: [parser._parse_amount(value) for value in plain_amounts],
+        '_parse_bank_amount': lambda: [parser._parse_bank_amount(value) for value in bank_amounts],
+        '_parse_modern_amount': lambda: [parser._parse_modern_amount(value) for value in bank_amounts],
+        '_auto_categorize': lambda: [parser._auto_categorize(value) for value in descriptions],
+        'validate_transactions': lambda: parser.validate_transactions(parsed),
+    }
+
+def file_benchmarks(parser: CSVTransactionParser, size: int, corpus_dir: str,
+                    excel: bool) -> Dict[str, Callable[[], Any]]:
+    """Parsing completo (detect + loop per riga) di un file per formato"""
+    benchmarks = {}
+    for export_format, (_, _, excel_row) in LAYOUTS.items():
+        path = os.path.join(corpus_dir, f"{export_format}_{size}.csv")
+        if not os.path.exists(path):
+            write_csv(path, export_format, generate_transactions(size, CORPUS_SEED))
+        benchmarks[f"parse_file[{export_format}.csv]"] = (lambda p=path: parser.parse_file(p))
+
+        if excel and excel_row is not None:
+            path = os.path.join(corpus_dir, f"{export_format}_{size}.xlsx")
+            if not os.path.exists(path):
+                write_excel(path, export_format, generate_transactions(size, CORPUS_SEED))
+            benchmarks[f"parse_file[{export_format}.xlsx]"] = (lambda p=path: parser.parse_file(p))
+    return benchmarks
+
+def run(sizes: List[int], repeat: int, excel: bool, only: Optional[str], corpus_dir: str) -> Dict[str, Any]:
+    """Esegue tutti i benchmark e restituisce il documento di baseline"""
+    # Il parser logga ogni riga a INFO: il costo del logging non fa parte della misura
+    logging.disable(logging.CRITICAL)
+    parser = CSVTransactionParser()
+    results = {}
+
+    for size in sizes:
+        benchmarks = {}
+        benchmarks.update(function_benchmarks(parser, size))
+        benchmarks.update(file_benchmarks(parser, size, corpus_dir, excel))
+
+        for name, func in benchmarks.items():
+            if only and only not in name:
+                continue
+            key = f"{name}@{size}"
+            results[key] = _measure(func, size, repeat)
+            result = results[key]
+            print(f"{key:45s} {result['rows_per_s']:>12,.0f} righe/s {result['peak_kb']:>10,.0f} KB", flush=True)
+
+    logging.disable(logging.NOTSET)
+    return {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'host': host_info(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'repeat': repeat,
+        'results': results
+    }
+
+def host_info() -> Dict[str, Any]:
+    """Identifica la macchina: i tempi sono confrontabili solo sullo stesso host"""
+    return {
+        'node': platform.node(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+        'python': platform.python_version()
+    }
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], timings: bool = True) -> List[str]:
+    """Benchmark più lenti o più pesanti della baseline oltre la tolleranza"""
+    regressions = []
+    for key, result in current['results'].items():
+        previous = baseline.get('results', {}).get(key)
+        if not previous:
+            continue
+        if timings and result['best_s'] > previous['best_s'] * SLOWDOWN_TOLERANCE:
+            regressions.append(f"{key}: {previous['rows_per_s']:,.0f} -> {result['rows_per_s']:,.0f} righe/s")
+        if result['peak_kb'] > previous['peak_kb'] * MEMORY_TOLERANCE:
+            regressions.append(f"{key}: picco {previous['peak_kb']:,.0f} -> {result['peak_kb']:,.0f} KB")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Micro-benchmark del parser di estratti conto')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--excel', action='store_true', help='Include il parsing dei file xlsx (lento)')
+    parser.add_argument('--only', help='Esegue solo i benchmark il cui nome contiene questa stringa')
+    parser.add_argument('--corpus-dir', default=os.path.join(tempfile.gettempdir(), 'tracker_spend_bench'))
+    parser.add_argument('--save', help='Salva i risultati come baseline JSON')
+    parser.add_argument('--compare', help='Baseline con cui confrontare; exit 1 se ci sono regressioni')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.corpus_dir, exist_ok=True)
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    result = run(sizes, args.repeat, args.excel, args.only, args.corpus_dir)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as file:
+            json.dump(result, file, indent=2, sort_keys=True)
+        print(f"Baseline salvata in {args.save}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        same_host = baseline.get('host') == result['host']
+        if not same_host:
+            print(f"ATTENZIONE: baseline registrata su un altro host ({baseline.get('host')}): "
+                  f"i tempi non sono comparabili, confronto solo i picchi di memoria")
+        regressions = compare(baseline, result, timings=same_host)
+        for regression in regressions:
+            print(f"REGRESSIONE {regression}")
+        if regressions:
+            return 1
+        print("Nessuna regressione rispetto alla baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Controllo di regressione della memoria dell'import.
+
+Esegue le fasi detect, parse e validate della pipeline di upload su file
+sintetici di ogni formato, con ImportMemoryTracker, e fallisce (exit 1) se il
+costo marginale di una fase supera il budget in byte per riga. La fase save
+richiede MySQL ed è esclusa; read è la sola copia del file su disco.
+
+Ogni formato viene misurato su due file, di --rows e di 2 x --rows righe: il
+costo per riga è la pendenza tra le due misure, così la parte fissa di una
+fase (moduli importati, buffer, cache) non entra nel confronto e il risultato
+non dipende dal numero di righe scelto. La parte fissa viene solo riportata.
+
+I budget servono a dimensionare i limiti di memoria dei worker: se una
+modifica li supera va giustificata e i budget aggiornati qui.
+
+Uso:
+    python perf/check_import_memory.py
+    python perf/check_import_memory.py --rows 50000 --formats standard,modern_bank
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_parser import CSVTransactionParser  # noqa: E402
+from memory_profile import ImportMemoryTracker  # noqa: E402
+from perf.generate_data import LAYOUTS, write_csv  # noqa: E402
+from perf.seed import generate_transactions  # noqa: E402
+
+DEFAULT_ROWS = 10000
+WARMUP_ROWS = 100
+
+# Costo marginale massimo per fase, in byte per riga importata (CSV, tutti i formati)
+BYTES_PER_ROW_BUDGET = {
+    'detect': 64,
+    'parse': 1500,
+    'validate': 256,
+}
+
+def measure(parser: CSVTransactionParser, path: str) -> dict:
+    """Report di memoria delle fasi detect/parse/validate per un file"""
+    with ImportMemoryTracker(enabled=True) as memory:
+        with memory.stage('detect'):
+            format_type = parser.detect_format(path)
+        with memory.stage('parse'):
+            transactions = parser.parse_file(path, format_type)
+        memory.rows = len(transactions)
+        with memory.stage('validate'):
+            parser.validate_transactions(transactions)
+        return memory.report()
+
+def stage_costs(small: dict, large: dict) -> dict:
+    """Byte per riga (pendenza) e parte fissa di ogni fase tra due report"""
+    costs = {}
+    rows = large['rows'] - small['rows']
+    if rows <= 0:
+        return costs
+    for stage, measured in large['stages'].items():
+        if stage not in small['stages']:
+            continue
+        small_peak = small['stages'][stage]['stage_peak_kb'] * 1024
+        large_peak = measured['stage_peak_kb'] * 1024
+        per_row = (large_peak - small_peak) / rows
+        costs[stage] = {
+            'bytes_per_row': per_row,
+            'fixed_kb': (small_peak - per_row * small['rows']) / 1024
+        }
+    return costs
+
+def check(costs: dict) -> list:
+    """Fasi oltre il budget"""
+    failures = []
+    for stage, budget in BYTES_PER_ROW_BUDGET.items():
+        measured = costs.get(stage)
+        if not measured:
+            continue
+        per_row = measured['bytes_per_row']
+        if per_row > budget:
+            failures.append(f"{stage}: {per_row:,.0f} B/riga (budget {budget:,} B/riga)")
+    return failures
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Budget di memoria per riga della pipeline di import")
+    parser.add_argument('--rows', type=int, default=DEFAULT_ROWS)
+    parser.add_argument('--formats', default=','.join(LAYOUTS))
+    args = parser.parse_args(argv)
+
+    # Il parser logga ogni riga: i record di logging non fanno parte della misura
+    logging.disable(logging.CRITICAL)
+    csv_parser = CSVTransactionParser()
+    over_budget = []
+
+    with tempfile.TemporaryDirectory() as directory:
+        for export_format in [name.strip() for name in args.formats.split(',') if name.strip()]:
+            # Il primo parse di un formato importa moduli pigri (pandas): una
+            # passata non misurata li carica prima delle due misure
+            warmup = os.path.join(directory, f"{export_format}_warmup.csv")
+            write_csv(warmup, export_format, generate_transactions(WARMUP_ROWS, seed=99))
+            csv_parser.parse_file(warmup, csv_parser.detect_format(warmup))
+
+            reports = []
+            for rows in (args.rows, 2 * args.rows):
+                path = os.path.join(directory, f"{export_format}_{rows}.csv")
+                write_csv(path, export_format, generate_transactions(rows, seed=99))
+                reports.append(measure(csv_parser, path))
+            small, large = reports
+            costs = stage_costs(small, large)
+
+            stages = ', '.join(
+                f"{stage} {round(values['bytes_per_row']):,} B/riga + {round(values['fixed_kb']):,} KB"
+                for stage, values in costs.items()
+            )
+            failures = check(costs)
+            print(f"{export_format:16s} {small['rows']:7d}/{large['rows']:d} righe  {stages}"
+                  f"{'  FUORI BUDGET' if failures else ''}")
+            for failure in failures:
+                print(f"  {failure}")
+            over_budget.extend(f"{export_format} {failure}" for failure in failures)
+
+    if over_budget:
+        print(f"ERRORE: budget di memoria superato in {len(over_budget)} casi "
+              f"(soglie in BYTES_PER_ROW_BUDGET, perf/check_import_memory.py)", file=sys.stderr)
+        for failure in over_budget:
+            # Annotazione visibile nel riepilogo del job di GitHub Actions
+            prefix = '::error title=Budget di memoria dell\'import::' if os.environ.get('GITHUB_ACTIONS') else '  '
+            print(f"{prefix}{failure}", file=sys.stderr)
+        return 1
+    print("Tutte le fasi entro il budget di memoria per riga")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
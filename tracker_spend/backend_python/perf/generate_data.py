@@ -0,0 +1,176 @@
+"""Generatore di estratti conto sintetici e di utenti di prova.
+
+Scrive file nei formati letti da CSVTransactionParser, con le stesse
+transazioni realistiche di perf/seed.py, e può popolare il database con
+utenti perf_user_N per i test di carico.
+
+Formati:
+    CSV   standard, intesa_sanpaolo, unicredit, poste_italiane, modern_bank
+    Excel intesa_sanpaolo, unicredit, poste_italiane, modern_bank
+          (il parser Excel cerca una riga di header con "Data", quindi il
+          formato standard con header inglesi è solo CSV)
+
+poste_italiane ha lo stesso layout di intesa_sanpaolo e viene rilevato come tale
+dall'auto-detection dell'upload.
+
+Uso:
+    python perf/generate_data.py files --sizes 1000,100000 --out perf/data
+    python perf/generate_data.py files --formats modern_bank --excel --sizes 1000000
+    python perf/generate_data.py seed --users 20 --transactions 5000
+"""
+import argparse
+import csv
+import os
+import sys
+from typing import List, Dict, Any, Iterator, Callable, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perf.seed import generate_transactions  # noqa: E402
+
+# Limite di righe di un foglio xlsx (meno header e righe introduttive)
+EXCEL_MAX_ROWS = 1048576 - 20
+
+def _signed(row: Dict[str, Any]) -> float:
+    """Importo con segno: negativo per le spese"""
+    return float(row['amount']) if row['type'] == 'income' else -float(row['amount'])
+
+def _italian_amount(value: float) -> str:
+    """Importo con virgola decimale, come negli export delle banche italiane"""
+    return f"{value:.2f}".replace('.', ',')
+
+# Formato -> (header, funzione riga CSV, funzione riga Excel)
+Layout = Tuple[List[str], Callable[[Dict[str, Any]], list], Callable[[Dict[str, Any]], list]]
+
+LAYOUTS: Dict[str, Layout] = {
+    'standard': (
+        ['date', 'description', 'amount', 'type', 'category'],
+        lambda row: [row['transaction_date'].isoformat(), row['description'], f"{row['amount']:.2f}",
+                     row['type'], row['category']],
+        None
+    ),
+    'intesa_sanpaolo': (
+        ['Data', 'Descrizione', 'Importo'],
+        lambda row: [row['transaction_date'].strftime('%d/%m/%Y'), row['description'], _italian_amount(_signed(row))],
+        lambda row: [row['transaction_date'], row['description'], _signed(row)]
+    ),
+    'unicredit': (
+        ['Data', 'Causale', 'Importo'],
+        lambda row: [row['transaction_date'].strftime('%d/%m/%Y'), row['description'], _italian_amount(_signed(row))],
+        lambda row: [row['transaction_date'], row['description'], _signed(row)]
+    ),
+    'poste_italiane': (
+        ['Data', 'Descrizione', 'Importo'],
+        lambda row: [row['transaction_date'].strftime('%d-%m-%Y'), row['description'], _italian_amount(_signed(row))],
+        lambda row: [row['transaction_date'], row['description'], _signed(row)]
+    ),
+    'modern_bank': (
+        ['Data', 'Operazione', 'Dettagli', 'Conto o carta', 'Contabilizzazione', 'Categoria', 'Valuta', 'Importo'],
+        lambda row: [row['transaction_date'].strftime('%m/%d/%Y'),
+                     'Accredito' if row['type'] == 'income' else 'Pagamento',
+                     row['description'], 'Conto corrente', 'Contabilizzato', row['category'], 'EUR',
+                     f"{_signed(row):.2f}"],
+        lambda row: [row['transaction_date'],
+                     'Accredito' if row['type'] == 'income' else 'Pagamento',
+                     row['description'], 'Conto corrente', 'Contabilizzato', row['category'], 'EUR',
+                     _signed(row)]
+    ),
+}
+
+def write_csv(path: str, export_format: str, rows: Iterator[Dict[str, Any]]) -> int:
+    """Scrive un CSV nel formato indicato; restituisce il numero di righe"""
+    header, to_row, _ = LAYOUTS[export_format]
+    count = 0
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(to_row(row))
+            count += 1
+    return count
+
+def write_excel(path: str, export_format: str, rows: Iterator[Dict[str, Any]]) -> int:
+    """Scrive un xlsx (openpyxl write-only) nel formato indicato; restituisce il numero di righe"""
+    from openpyxl import Workbook
+
+    header, _, to_row = LAYOUTS[export_format]
+    if to_row is None:
+        raise ValueError(f"Il formato {export_format} non è supportato in Excel")
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Movimenti')
+    if export_format == 'modern_bank':
+        # Gli export reali hanno alcune righe introduttive prima dell'header
+        sheet.append(['Elenco movimenti'])
+        sheet.append(['Conto corrente', 'IT00X0000000000000000000000'])
+        sheet.append([])
+    sheet.append(header)
+
+    count = 0
+    for row in rows:
+        if count >= EXCEL_MAX_ROWS:
+            break
+        sheet.append(to_row(row))
+        count += 1
+
+    workbook.save(path)
+    return count
+
+def generate_files(out_dir: str, formats: List[str], sizes: List[int], excel: bool, seed: int) -> List[str]:
+    """Genera un file per formato e dimensione; restituisce i percorsi creati"""
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for export_format in formats:
+        for size in sizes:
+            path = os.path.join(out_dir, f"{export_format}_{size}.csv")
+            count = write_csv(path, export_format, generate_transactions(size, seed))
+            paths.append(path)
+            print(f"{path}: {count} righe")
+
+            if excel and LAYOUTS[export_format][2] is not None:
+                path = os.path.join(out_dir, f"{export_format}_{size}.xlsx")
+                count = write_excel(path, export_format, generate_transactions(size, seed))
+                paths.append(path)
+                print(f"{path}: {count} righe")
+    return paths
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Dati sintetici per i test di performance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    files = subparsers.add_parser('files', help='Genera estratti conto nei formati del parser')
+    files.add_argument('--formats', default=','.join(LAYOUTS), help='Formati separati da virgola')
+    files.add_argument('--sizes', default='1000,10000,100000', help='Righe per file, separate da virgola')
+    files.add_argument('--excel', action='store_true', help='Genera anche la versione xlsx')
+    files.add_argument('--out', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+    files.add_argument('--seed', type=int, default=42)
+
+    seed = subparsers.add_parser('seed', help='Crea utenti perf_user_N con transazioni nel database')
+    seed.add_argument('--users', type=int, default=10)
+    seed.add_argument('--transactions', type=int, default=5000, help='Transazioni per utente')
+    seed.add_argument('--reset', action='store_true', help='Cancella prima gli utenti di prova esistenti')
+    seed.add_argument('--seed', type=int, default=42)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'files':
+        formats = [name.strip() for name in args.formats.split(',') if name.strip()]
+        unknown = [name for name in formats if name not in LAYOUTS]
+        if unknown:
+            parser.error(f"Formati sconosciuti: {', '.join(unknown)}")
+        sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+        generate_files(args.out, formats, sizes, args.excel, args.seed)
+        return 0
+
+    from railway_config import get_database_config
+    from perf.seed import seed_database, reset_perf_data, PERF_USER_PREFIX, PERF_PASSWORD
+
+    db_config = get_database_config()
+    if args.reset:
+        reset_perf_data(db_config)
+    user_ids = seed_database(db_config, [args.transactions] * args.users, args.seed)
+    print(f"Creati {len(user_ids)} utenti ({PERF_USER_PREFIX}0..{args.users - 1}, password '{PERF_PASSWORD}')")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
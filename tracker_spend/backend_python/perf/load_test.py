@@ -0,0 +1,155 @@
+"""Test di carico dell'API.
+
+Ogni utente virtuale esegue in ciclo lo scenario
+login -> dashboard -> trends -> lista transazioni -> (ogni N cicli) upload
+con un utente perf_user_N creato da `generate_data.py seed`. Alla fine
+riporta throughput e percentili di latenza per passo.
+
+Uso (backend avviato con docker-compose o gunicorn):
+    python perf/generate_data.py seed --users 20 --transactions 5000 --reset
+    python perf/load_test.py --base-url http://localhost:3001 --users 20 --duration 60
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from perf.seed import generate_transactions, PERF_USER_PREFIX, PERF_PASSWORD  # noqa: E402
+from perf.generate_data import write_csv  # noqa: E402
+
+STEPS = ['login', 'dashboard', 'trends', 'list', 'upload']
+
+class Recorder:
+    """Raccoglie latenze ed errori per passo da più thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+
+    def record(self, step: str, elapsed_ms: float, ok: bool):
+        with self._lock:
+            self.latencies[step].append(elapsed_ms)
+            if not ok:
+                self.errors[step] += 1
+
+def _percentile(values: List[float], percentile: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(percentile / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+def _timed(recorder: Recorder, step: str, call) -> Optional[requests.Response]:
+    started = time.perf_counter()
+    try:
+        response = call()
+        ok = response.status_code < 400
+    except requests.RequestException:
+        response, ok = None, False
+    recorder.record(step, (time.perf_counter() - started) * 1000, ok)
+    return response if ok else None
+
+def virtual_user(index: int, base_url: str, deadline: float, upload_every: int,
+                 upload_file: Optional[str], recorder: Recorder):
+    """Esegue lo scenario in ciclo fino alla scadenza"""
+    session = requests.Session()
+    identifier = f"{PERF_USER_PREFIX}{index}"
+    iteration = 0
+
+    while time.time() < deadline:
+        iteration += 1
+        response = _timed(recorder, 'login', lambda: session.post(
+            f"{base_url}/api/auth/login", json={'identifier': identifier, 'password': PERF_PASSWORD}, timeout=30
+        ))
+        if response is None:
+            continue
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+
+        _timed(recorder, 'dashboard', lambda: session.get(
+            f"{base_url}/api/analytics/dashboard-stats", headers=headers, timeout=30))
+        _timed(recorder, 'trends', lambda: session.get(
+            f"{base_url}/api/dashboard/trends", params={'months': 12}, headers=headers, timeout=30))
+        _timed(recorder, 'list', lambda: session.get(
+            f"{base_url}/api/transactions", params={'page_size': 100}, headers=headers, timeout=30))
+
+        if upload_file and upload_every and iteration % upload_every == 0:
+            def upload():
+                with open(upload_file, 'rb') as file:
+                    return session.post(f"{base_url}/api/transactions/upload", headers=headers,
+                                        files={'file': (os.path.basename(upload_file), file)}, timeout=120)
+            _timed(recorder, 'upload', upload)
+
+def report(recorder: Recorder, elapsed: float) -> Dict[str, Any]:
+    """Throughput complessivo e percentili per passo"""
+    steps = {}
+    total = 0
+    for step in STEPS:
+        values = recorder.latencies.get(step, [])
+        if not values:
+            continue
+        total += len(values)
+        steps[step] = {
+            'requests': len(values),
+            'errors': recorder.errors.get(step, 0),
+            'throughput_rps': round(len(values) / elapsed, 2),
+            'mean_ms': round(statistics.mean(values), 2),
+            'p50_ms': round(_percentile(values, 50), 2),
+            'p95_ms': round(_percentile(values, 95), 2),
+            'p99_ms': round(_percentile(values, 99), 2),
+            'max_ms': round(max(values), 2)
+        }
+    return {'duration_s': round(elapsed, 1), 'requests': total,
+            'throughput_rps': round(total / elapsed, 2), 'steps': steps}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Test di carico dell'API TrackerSpend")
+    parser.add_argument('--base-url', default='http://localhost:3001')
+    parser.add_argument('--users', type=int, default=10, help='Utenti virtuali concorrenti')
+    parser.add_argument('--duration', type=int, default=60, help='Durata in secondi')
+    parser.add_argument('--upload-every', type=int, default=5, help='Upload ogni N cicli (0 = mai)')
+    parser.add_argument('--upload-rows', type=int, default=500, help='Righe del file di upload generato')
+    parser.add_argument('--upload-file', help='File da caricare invece di quello generato')
+    parser.add_argument('--json', help='Salva il report JSON in questo file')
+    args = parser.parse_args(argv)
+
+    upload_file = args.upload_file
+    if not upload_file and args.upload_every:
+        upload_file = os.path.join(tempfile.mkdtemp(), 'load_test_upload.csv')
+        write_csv(upload_file, 'standard', generate_transactions(args.upload_rows, seed=7))
+
+    recorder = Recorder()
+    started = time.time()
+    deadline = started + args.duration
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        for index in range(args.users):
+            executor.submit(virtual_user, index, args.base_url.rstrip('/'), deadline,
+                            args.upload_every, upload_file, recorder)
+    result = report(recorder, time.time() - started)
+
+    print(f"\n{result['requests']} richieste in {result['duration_s']} s "
+          f"({result['throughput_rps']} req/s, {args.users} utenti)\n")
+    print(f"{'passo':10s} {'richieste':>9s} {'errori':>7s} {'req/s':>8s} {'p50':>9s} {'p95':>9s} {'p99':>9s}")
+    for step, stats in result['steps'].items():
+        print(f"{step:10s} {stats['requests']:9d} {stats['errors']:7d} {stats['throughput_rps']:8.2f} "
+              f"{stats['p50_ms']:7.1f}ms {stats['p95_ms']:7.1f}ms {stats['p99_ms']:7.1f}ms")
+
+    if args.json:
+        with open(args.json, 'w') as file:
+            json.dump(result, file, indent=2)
+
+    return 1 if any(stats['errors'] for stats in result['steps'].values()) else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
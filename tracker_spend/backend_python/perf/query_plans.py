@@ -0,0 +1,206 @@
+"""Harness di regressione dei piani di esecuzione.
+
+Per ogni dimensione di dati carica un utente con N transazioni (più utenti
+di contorno, perché la selettività di user_id conti), poi per ogni query di
+hot_queries.HOT_QUERIES registra indice usato, righe esaminate, latenza e
+l'output di EXPLAIN ANALYZE. Il risultato si salva come baseline JSON e si
+confronta con la baseline precedente.
+
+Richiede un MySQL 8 di sviluppo (es. quello di docker-compose, porta 3307):
+i dati di prova vengono cancellati e ricreati a ogni dimensione.
+
+Uso:
+    python perf/query_plans.py --sizes 1000,10000,100000 --output perf/baselines/query_plans.json
+    python perf/query_plans.py --compare perf/baselines/query_plans.json
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hot_queries import HOT_QUERIES, HotQuery, sample_params  # noqa: E402
+from perf.seed import seed_database, reset_perf_data  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+DEFAULT_RUNS = 5
+
+# Soglie di regressione per --compare
+ROWS_EXAMINED_TOLERANCE = 1.5
+LATENCY_TOLERANCE = 2.0
+# Sotto questa latenza le differenze sono rumore
+LATENCY_FLOOR_MS = 2.0
+
+ACTUAL_RE = re.compile(r'actual time=[\d.]+\.\.([\d.]+) rows=([\d.]+) loops=(\d+)')
+
+def _handler_reads(cursor) -> int:
+    """Righe lette dallo storage engine nella sessione (somma degli Handler_read_*)"""
+    cursor.execute("SHOW SESSION STATUS LIKE 'Handler_read%'")
+    return sum(int(row['Value']) for row in cursor.fetchall())
+
+def _is_select(sql: str) -> bool:
+    return sql.lstrip().upper().startswith('SELECT')
+
+def measure_query(connection, query: HotQuery, params: tuple, runs: int) -> Dict[str, Any]:
+    """Misura una query: piano, righe esaminate e latenza mediana su `runs` esecuzioni"""
+    cursor = connection.cursor(dictionary=True)
+    sql, query_params = query.build(*params)
+    query_params = tuple(query_params)
+    aliases = {'t': 'transactions', 'b': 'budgets', 'c': 'categories'}
+
+    try:
+        cursor.execute("EXPLAIN " + sql, query_params)
+        plan = cursor.fetchall()
+        indexes = {aliases.get(row['table'], row['table']): row.get('key') for row in plan if row.get('table')}
+        full_scans = sorted(aliases.get(row['table'], row['table']) for row in plan if row.get('type') == 'ALL')
+
+        # EXPLAIN ANALYZE vale solo per le SELECT; la prima riga è il nodo radice del piano
+        analyze = None
+        analyze_ms = None
+        if _is_select(sql):
+            cursor.execute("EXPLAIN ANALYZE " + sql, query_params)
+            analyze = cursor.fetchone()['EXPLAIN']
+            root = ACTUAL_RE.search(analyze)
+            if root:
+                analyze_ms = float(root.group(1))
+
+        # SHOW STATUS stesso incrementa i contatori: si misura e si sottrae
+        first = _handler_reads(cursor)
+        overhead = _handler_reads(cursor) - first
+
+        timings = []
+        rows_examined = 0
+        for _ in range(runs):
+            before = _handler_reads(cursor)
+            started = time.perf_counter()
+            cursor.execute(sql, query_params)
+            if cursor.with_rows:
+                cursor.fetchall()
+            timings.append((time.perf_counter() - started) * 1000)
+            rows_examined = _handler_reads(cursor) - before - overhead
+            # Le query di scrittura (riconciliazione budget) non devono modificare i dati
+            connection.rollback()
+
+        return {
+            'indexes': indexes,
+            'full_scans': full_scans,
+            'rows_examined': max(rows_examined, 0),
+            'latency_ms': round(statistics.median(timings), 3),
+            'analyze_ms': analyze_ms,
+            'explain_analyze': analyze
+        }
+    finally:
+        cursor.close()
+
+def run(db_config: Dict[str, Any], sizes: List[int], background_users: int, runs: int,
+        only: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Esegue l'harness a tutte le dimensioni e restituisce il documento di baseline"""
+    import mysql.connector
+
+    queries = [query for query in HOT_QUERIES if not only or query.name in only]
+    result = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'background_users': background_users,
+        'runs': runs,
+        'sizes': {}
+    }
+
+    for size in sizes:
+        print(f"Dimensione {size}: preparo i dati...", flush=True)
+        reset_perf_data(db_config)
+        # Il primo utente è quello misurato, gli altri hanno un decimo delle transazioni
+        user_ids = seed_database(db_config, [size] + [max(size // 10, 100)] * background_users)
+
+        connection = mysql.connector.connect(**db_config)
+        connection.autocommit = False
+        try:
+            cursor = connection.cursor(dictionary=True)
+            if 'mysql_version' not in result:
+                cursor.execute("SELECT VERSION() AS version")
+                result['mysql_version'] = cursor.fetchone()['version']
+            params = sample_params(cursor, user_ids[0])
+            cursor.close()
+
+            measurements = {}
+            for query in queries:
+                measurements[query.name] = measure_query(connection, query, params, runs)
+                measurement = measurements[query.name]
+                flag = ' FULL SCAN' if measurement['full_scans'] else ''
+                print(f"  {query.name:40s} {measurement['latency_ms']:9.2f} ms "
+                      f"{measurement['rows_examined']:9d} righe{flag}")
+            result['sizes'][str(size)] = measurements
+        finally:
+            connection.close()
+
+    reset_perf_data(db_config)
+    return result
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any]) -> List[str]:
+    """Differenze rilevanti tra due documenti di baseline"""
+    regressions = []
+    for size, queries in current['sizes'].items():
+        previous_queries = baseline.get('sizes', {}).get(size, {})
+        for name, measurement in queries.items():
+            previous = previous_queries.get(name)
+            if not previous:
+                continue
+            label = f"[{size}] {name}"
+
+            new_scans = set(measurement['full_scans']) - set(previous['full_scans'])
+            if new_scans:
+                regressions.append(f"{label}: nuova scansione completa di {', '.join(sorted(new_scans))}")
+
+            for table, index in measurement['indexes'].items():
+                if previous['indexes'].get(table) != index:
+                    regressions.append(f"{label}: indice su {table} cambiato "
+                                       f"{previous['indexes'].get(table)} -> {index}")
+
+            if measurement['rows_examined'] > max(previous['rows_examined'], 1) * ROWS_EXAMINED_TOLERANCE:
+                regressions.append(f"{label}: righe esaminate {previous['rows_examined']} -> "
+                                   f"{measurement['rows_examined']}")
+
+            if (measurement['latency_ms'] > LATENCY_FLOOR_MS
+                    and measurement['latency_ms'] > previous['latency_ms'] * LATENCY_TOLERANCE):
+                regressions.append(f"{label}: latenza {previous['latency_ms']} ms -> "
+                                   f"{measurement['latency_ms']} ms")
+    return regressions
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Regressione dei piani delle query calde')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='Transazioni dell\'utente misurato, separate da virgola')
+    parser.add_argument('--background-users', type=int, default=5)
+    parser.add_argument('--runs', type=int, default=DEFAULT_RUNS)
+    parser.add_argument('--query', action='append', help='Limita a queste query (ripetibile)')
+    parser.add_argument('--output', help='Salva il risultato come nuova baseline')
+    parser.add_argument('--compare', help='Baseline con cui confrontare; exit 1 se ci sono regressioni')
+    args = parser.parse_args(argv)
+
+    from railway_config import get_database_config
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    result = run(get_database_config(), sizes, args.background_users, args.runs, args.query)
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as file:
+            json.dump(result, file, indent=2, sort_keys=True)
+        print(f"Baseline salvata in {args.output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            regressions = compare(json.load(file), result)
+        for regression in regressions:
+            print(f"REGRESSIONE {regression}")
+        if regressions:
+            return 1
+        print("Nessuna regressione rispetto alla baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Dati sintetici per i test di performance.
+
+Genera transazioni realistiche (stipendio mensile, spese ricorrenti e
+quotidiane distribuite per categoria) in modo deterministico dato un seed,
+e le carica nel database con utenti e budget di prova.
+"""
+import os
+import random
+import sys
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import List, Dict, Any, Iterator, Optional
+
+# I moduli del backend sono nella cartella superiore
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Prefisso degli utenti creati dal seed: reset_perf_data cancella solo questi
+PERF_USER_PREFIX = 'perf_user_'
+PERF_PASSWORD = 'perf_password'
+
+INSERT_BATCH_SIZE = 5000
+
+# (categoria, descrizioni tipiche, importo minimo, importo massimo, peso)
+EXPENSE_PROFILE = [
+    ('Alimentari', ['ESSELUNGA', 'CONAD', 'COOP', 'LIDL', 'CARREFOUR MARKET'], 8, 140, 30),
+    ('Trasporti', ['ENI STATION', 'Q8 CARBURANTE', 'TRENITALIA', 'ATM MILANO', 'TELEPASS'], 2, 90, 15),
+    ('Ristoranti', ['RISTORANTE DA MARIO', 'PIZZERIA NAPOLI', 'BAR CENTRALE', 'MCDONALDS'], 3, 80, 14),
+    ('Shopping', ['AMAZON EU', 'ZARA', 'DECATHLON', 'MEDIAWORLD'], 10, 250, 10),
+    ('Bollette', ['ENEL ENERGIA', 'A2A GAS', 'TIM FIBRA', 'VODAFONE'], 25, 180, 6),
+    ('Salute', ['FARMACIA COMUNALE', 'STUDIO DENTISTICO', 'ANALISI CLINICHE'], 5, 200, 5),
+    ('Intrattenimento', ['NETFLIX', 'SPOTIFY', 'CINEMA UCI', 'STEAM GAMES'], 5, 60, 8),
+    ('Casa', ['IKEA', 'LEROY MERLIN', 'AFFITTO'], 15, 900, 4),
+    ('Altro', ['PRELIEVO BANCOMAT', 'BONIFICO', 'COMMISSIONI'], 1, 300, 8),
+]
+
+INCOME_PROFILE = [
+    ('Stipendio', ['STIPENDIO', 'ACCREDITO EMOLUMENTI'], 1400, 3200),
+    ('Altro', ['RIMBORSO', 'BONIFICO RICEVUTO', 'CASHBACK'], 5, 400),
+]
+
+def generate_transactions(count: int, seed: int = 42, end_date: Optional[date] = None,
+                          income_ratio: float = 0.06) -> Iterator[Dict[str, Any]]:
+    """Genera `count` transazioni distribuite sugli ultimi mesi fino a end_date.
+
+    Il volume per giorno è costante, quindi il periodo coperto cresce con count
+    (circa 8 movimenti al giorno), come per un conto reale con molti anni di storico.
+    """
+    rng = random.Random(seed)
+    end_date = end_date or date.today()
+    days = max(30, count // 8)
+    start_date = end_date - timedelta(days=days)
+    weights = [profile[4] for profile in EXPENSE_PROFILE]
+
+    for _ in range(count):
+        transaction_date = start_date + timedelta(days=rng.randrange(days + 1))
+        if rng.random() < income_ratio:
+            category, descriptions, low, high = rng.choice(INCOME_PROFILE)
+            transaction_type = 'income'
+        else:
+            category, descriptions, low, high, _ = rng.choices(EXPENSE_PROFILE, weights=weights)[0]
+            transaction_type = 'expense'
+
+        # Importi log-uniformi: molte spese piccole, poche grandi
+        amount = Decimal(str(round(low * (high / low) ** rng.random(), 2)))
+        yield {
+            'transaction_date': transaction_date,
+            'description': f"{rng.choice(descriptions)} {rng.randrange(1000, 9999)}",
+            'amount': amount,
+            'type': transaction_type,
+            'category': category
+        }
+
+def _batches(rows: Iterator[tuple], size: int) -> Iterator[List[tuple]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def create_perf_user(cursor, index: int) -> int:
+    """Crea (o riusa) l'utente di prova numero `index`"""
+    username = f"{PERF_USER_PREFIX}{index}"
+    cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
+    row = cursor.fetchone()
+    if row:
+        return row[0]
+
+    cursor.execute("""
+        INSERT INTO users (username, email, password_hash, first_name, last_name, is_active)
+        VALUES (%s, %s, %s, 'Perf', %s, 1)
+    """, (username, f"{username}@perf.local", PERF_PASSWORD, str(index)))
+    return cursor.lastrowid
+
+def seed_user_transactions(cursor, user_id: int, count: int, seed: int) -> int:
+    """Inserisce `count` transazioni sintetiche per un utente, a batch"""
+    rows = (
+        (user_id, row['transaction_date'], row['description'], row['amount'], row['type'], row['category'])
+        for row in generate_transactions(count, seed)
+    )
+    inserted = 0
+    for batch in _batches(rows, INSERT_BATCH_SIZE):
+        cursor.executemany("""
+            INSERT INTO transactions (user_id, transaction_date, description, amount, type, category)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, batch)
+        inserted += len(batch)
+    return inserted
+
+def seed_user_budgets(cursor, user_id: int):
+    """Un budget mensile complessivo e uno annuale per l'utente"""
+    today = date.today()
+    month_start = today.replace(day=1)
+    month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    cursor.executemany("""
+        INSERT INTO budgets (user_id, name, amount, period, start_date, end_date, is_active)
+        VALUES (%s, %s, %s, %s, %s, %s, TRUE)
+    """, [
+        (user_id, 'Spese mensili', Decimal('2000.00'), 'monthly', month_start, month_end),
+        (user_id, 'Spese annuali', Decimal('24000.00'), 'yearly', date(today.year, 1, 1), date(today.year, 12, 31)),
+    ])
+
+def seed_database(db_config: Dict[str, Any], transactions_per_user: List[int], seed: int = 42) -> List[int]:
+    """Crea un utente di prova per ogni elemento della lista con quel numero di transazioni.
+
+    Restituisce gli id utente nello stesso ordine.
+    """
+    import mysql.connector
+    from budget_service import BudgetService
+
+    connection = mysql.connector.connect(**db_config)
+    cursor = connection.cursor()
+    user_ids = []
+    try:
+        for index, count in enumerate(transactions_per_user):
+            user_id = create_perf_user(cursor, index)
+            seed_user_transactions(cursor, user_id, count, seed + index)
+            seed_user_budgets(cursor, user_id)
+            BudgetService._reconcile_spent(cursor, user_id=user_id)
+            connection.commit()
+            user_ids.append(user_id)
+
+        # Statistiche aggiornate, altrimenti i piani riflettono le tabelle vuote
+        for table in ('transactions', 'budgets'):
+            cursor.execute(f"ANALYZE TABLE {table}")
+            cursor.fetchall()
+        return user_ids
+    finally:
+        cursor.close()
+        connection.close()
+
+def reset_perf_data(db_config: Dict[str, Any]):
+    """Cancella gli utenti di prova (transazioni e budget in cascata)"""
+    import mysql.connector
+
+    connection = mysql.connector.connect(**db_config)
+    cursor = connection.cursor()
+    try:
+        cursor.execute("DELETE FROM users WHERE username LIKE %s", (f"{PERF_USER_PREFIX}%",))
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
@@ -0,0 +1,270 @@
+"""Profiler statistico per gli endpoint di upload e analytics.
+
+Un thread per processo campiona ogni PROFILE_INTERVAL_MS lo stack dei soli
+thread che stanno servendo una richiesta profilata (sys._current_frames) e
+accumula gli stack in formato "folded", pronto per flamegraph.pl o speedscope:
+
+    app.py:upload_transactions;csv_parser.py:parse_file;...;csv_parser.py:_auto_categorize 42
+
+Quando nessuna richiesta è profilata il thread è fermo su un Event, quindi il
+costo a regime è un contatore per richiesta: si può lasciare attivo in
+produzione con un tasso basso.
+
+Una richiesta viene profilata se:
+- è una ogni PROFILE_SAMPLE_RATE richieste agli endpoint decorati (0 = mai)
+- ha l'header `X-Profile: <PROFILE_TOKEN>`
+- il toggle admin (POST /api/admin/profiling) ha chiesto di profilare le prossime N
+
+L'output è salvato in PROFILE_DIR come <request_id>.folded + <request_id>.json
+e l'id è restituito nell'header X-Profile-Id. Gli endpoint admin richiedono
+l'header `X-Admin-Token: <PROFILE_TOKEN>` e non esistono se PROFILE_TOKEN non è
+configurato.
+"""
+import functools
+import hmac
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Dict, Any, List, Optional
+
+from flask import Blueprint, after_this_request, jsonify, request, send_from_directory
+
+logger = logging.getLogger(__name__)
+
+PROFILE_SAMPLE_RATE = int(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'tracker_spend_profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 200))
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+
+# Frame più profondi di così vengono troncati (ricorsione, stack di pandas)
+MAX_STACK_DEPTH = 128
+
+class Profile:
+    """Campioni raccolti per una richiesta"""
+
+    def __init__(self, request_id: str, method: str, path: str):
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started = time.time()
+        self.samples: Counter = Counter()
+
+    def folded(self) -> str:
+        return ''.join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+def _frame_name(frame) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_name}"
+
+def _fold(frame) -> str:
+    """Stack dalla radice alla foglia, separato da ';'"""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+class Sampler:
+    """Thread di campionamento condiviso dal processo"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._targets: Dict[int, Profile] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def _ensure_thread(self):
+        # Dopo un fork (worker gunicorn) il thread del master non esiste più
+        if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='profiler-sampler', daemon=True)
+            self._thread.start()
+
+    def start(self, profile: Profile):
+        with self._lock:
+            self._ensure_thread()
+            self._targets[threading.get_ident()] = profile
+            self._wakeup.set()
+
+    def stop(self) -> Optional[Profile]:
+        with self._lock:
+            profile = self._targets.pop(threading.get_ident(), None)
+            if not self._targets:
+                self._wakeup.clear()
+        return profile
+
+    def is_profiling(self) -> bool:
+        return threading.get_ident() in self._targets
+
+    def _run(self):
+        own_ident = threading.get_ident()
+        while True:
+            self._wakeup.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                targets = list(self._targets.items())
+            if not targets:
+                continue
+            frames = sys._current_frames()
+            for ident, profile in targets:
+                frame = frames.get(ident)
+                if frame is not None and ident != own_ident:
+                    profile.samples[_fold(frame)] += 1
+
+_sampler = Sampler(PROFILE_INTERVAL_MS / 1000)
+
+# Stato condiviso del campionamento (modificabile dal toggle admin)
+_state_lock = threading.Lock()
+_state = {'sample_rate': PROFILE_SAMPLE_RATE, 'forced': 0, 'counter': 0}
+
+def _token_matches(value: Optional[str]) -> bool:
+    return bool(PROFILE_TOKEN) and value is not None and hmac.compare_digest(value, PROFILE_TOKEN)
+
+def _should_profile() -> bool:
+    """Decide se profilare la richiesta corrente (header, toggle admin o campionamento)"""
+    if _token_matches(request.headers.get('X-Profile')):
+        return True
+    with _state_lock:
+        if _state['forced'] > 0:
+            _state['forced'] -= 1
+            return True
+        if _state['sample_rate'] <= 0:
+            return False
+        _state['counter'] += 1
+        return _state['counter'] % _state['sample_rate'] == 0
+
+def _prune(directory: str):
+    """Tiene solo gli ultimi PROFILE_MAX_FILES profili"""
+    entries = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.json')),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in entries[:max(len(entries) - PROFILE_MAX_FILES, 0)]:
+        request_id = entry.name[:-len('.json')]
+        for suffix in ('.json', '.folded'):
+            try:
+                os.remove(os.path.join(directory, request_id + suffix))
+            except OSError:
+                pass
+
+def _save(profile: Profile, duration: float, status: Optional[int]):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, f"{profile.request_id}.folded"), 'w') as file:
+        file.write(profile.folded())
+    metadata = {
+        'request_id': profile.request_id,
+        'method': profile.method,
+        'path': profile.path,
+        'status': status,
+        'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(profile.started)),
+        'duration_ms': round(duration * 1000, 1),
+        'interval_ms': PROFILE_INTERVAL_MS,
+        'samples': sum(profile.samples.values()),
+        'pid': os.getpid()
+    }
+    with open(os.path.join(PROFILE_DIR, f"{profile.request_id}.json"), 'w') as file:
+        json.dump(metadata, file)
+    _prune(PROFILE_DIR)
+
+def _status_of(result) -> Optional[int]:
+    if isinstance(result, tuple) and len(result) > 1 and isinstance(result[1], int):
+        return result[1]
+    return getattr(result, 'status_code', None)
+
+def profiled(handler):
+    """Decoratore: profila l'handler quando la richiesta è selezionata"""
+    @functools.wraps(handler)
+    def wrapper(*args, **kwargs):
+        # Gli alias (es. /api/analytics/summary) richiamano un handler già profilato
+        if request.method == 'OPTIONS' or _sampler.is_profiling() or not _should_profile():
+            return handler(*args, **kwargs)
+
+        request_id = request.headers.get('X-Request-Id') or uuid.uuid4().hex
+        request_id = ''.join(char for char in request_id if char.isalnum() or char in '-_')[:64] or uuid.uuid4().hex
+        profile = Profile(request_id, request.method, request.path)
+
+        @after_this_request
+        def add_profile_header(response):
+            response.headers['X-Profile-Id'] = request_id
+            return response
+
+        started = time.perf_counter()
+        _sampler.start(profile)
+        result = None
+        try:
+            result = handler(*args, **kwargs)
+            return result
+        finally:
+            _sampler.stop()
+            try:
+                _save(profile, time.perf_counter() - started, _status_of(result))
+            except OSError as e:
+                logger.error(f"Errore salvataggio profilo {request_id}: {e}")
+    return wrapper
+
+# ============================================================================
+# ADMIN ENDPOINTS
+# ============================================================================
+
+profiler_api = Blueprint('profiler', __name__)
+
+@profiler_api.before_request
+def require_admin_token():
+    if not _token_matches(request.headers.get('X-Admin-Token')):
+        return jsonify({'error': 'Admin token required'}), 403
+
+@profiler_api.route('/api/admin/profiling', methods=['GET'])
+def get_profiling_state():
+    """Stato del campionamento in questo processo"""
+    with _state_lock:
+        return jsonify({'sample_rate': _state['sample_rate'], 'forced': _state['forced'],
+                        'interval_ms': PROFILE_INTERVAL_MS, 'pid': os.getpid()})
+
+@profiler_api.route('/api/admin/profiling', methods=['POST'])
+def set_profiling_state():
+    """Imposta sample_rate e/o profila le prossime `next_requests` richieste.
+
+    Lo stato è per processo: con più worker gunicorn vale solo per quello che
+    riceve la richiesta (l'header X-Profile invece funziona ovunque).
+    """
+    data = request.get_json(silent=True) or {}
+    with _state_lock:
+        if 'sample_rate' in data:
+            _state['sample_rate'] = max(int(data['sample_rate']), 0)
+        if 'next_requests' in data:
+            _state['forced'] = max(int(data['next_requests']), 0)
+        return jsonify({'sample_rate': _state['sample_rate'], 'forced': _state['forced'], 'pid': os.getpid()})
+
+@profiler_api.route('/api/admin/profiles', methods=['GET'])
+def list_profiles():
+    """Profili salvati, dal più recente"""
+    profiles: List[Dict[str, Any]] = []
+    if os.path.isdir(PROFILE_DIR):
+        for entry in os.scandir(PROFILE_DIR):
+            if entry.name.endswith('.json'):
+                try:
+                    with open(entry.path) as file:
+                        profiles.append(json.load(file))
+                except (OSError, ValueError):
+                    continue
+    profiles.sort(key=lambda profile: profile['started_at'], reverse=True)
+    return jsonify({'profiles': profiles})
+
+@profiler_api.route('/api/admin/profiles/<request_id>', methods=['GET'])
+def get_profile(request_id):
+    """Stack folded di una richiesta (input di flamegraph.pl / speedscope)"""
+    return send_from_directory(PROFILE_DIR, f"{request_id}.folded", mimetype='text/plain')
+
+def init_app(app):
+    """Registra gli endpoint admin se PROFILE_TOKEN è configurato"""
+    if PROFILE_TOKEN:
+        app.register_blueprint(profiler_api)
@@ -47,5 +47,5 @@ def get_cors_config():
     return {
         'origins': [frontend_url, 'https://your-app.railway.app'],
         'methods': ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
-        'allow_headers': ['Content-Type', 'Authorization']
+        'allow_headers': ['Content-Type', 'Authorization', 'Content-Range', 'Idempotency-Key']
     }
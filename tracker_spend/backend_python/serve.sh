@@ -0,0 +1,49 @@
+#!/bin/bash
+# Processi del backend, avviati da start.sh e dal Dockerfile dopo le migrazioni:
+# - job_worker.py (upload a blocchi, eliminazioni in background), riavviato se termina
+# - gunicorn con l'app Flask, in ascolto solo in locale su GUNICORN_BIND
+# - hypercorn con asgi_router.py sulla porta pubblica: analytics, trend e lista
+#   transazioni sull'app Quart (aiomysql), il resto inoltrato a gunicorn
+# Con ASYNC_READ_PATH=false gunicorn serve direttamente la porta pubblica.
+
+cd "$(dirname "$0")"
+
+PORT="${PORT:-3001}"
+
+echo "⚙️ Starting background job worker..."
+# Allo stop il TERM arriva anche al job in corso, che viene ripreso al riavvio
+(
+    trap 'kill -TERM $worker 2>/dev/null; exit 0' TERM
+    while true; do
+        python3 job_worker.py &
+        worker=$!
+        wait $worker
+        sleep 5
+    done
+) &
+
+if [ "${ASYNC_READ_PATH:-true}" = "false" ]; then
+    exec gunicorn -c gunicorn.conf.py wsgi:app
+fi
+
+export GUNICORN_BIND="${GUNICORN_BIND:-127.0.0.1:3002}"
+
+echo "🐍 Starting gunicorn on ${GUNICORN_BIND}..."
+gunicorn -c gunicorn.conf.py wsgi:app &
+
+echo "⚡ Starting hypercorn on port ${PORT}..."
+hypercorn asgi_router:app \
+    --bind "0.0.0.0:${PORT}" \
+    --workers "${ASYNC_WORKERS:-1}" \
+    --graceful-timeout "${GUNICORN_GRACEFUL_TIMEOUT:-30}" \
+    --access-logfile - &
+
+trap 'kill -TERM $(jobs -p) 2>/dev/null; wait; exit 0' TERM INT
+
+# Se gunicorn o hypercorn terminano il servizio esce con errore e la
+# piattaforma lo riavvia
+wait -n
+echo "❌ Web server exited, stopping the service"
+kill -TERM $(jobs -p) 2>/dev/null
+wait
+exit 1
@@ -0,0 +1,66 @@
+import os
+from functools import lru_cache
+from railway_config import get_database_config
+
+# I servizi vengono creati al primo utilizzo: l'avvio del worker non importa
+# pandas né apre connessioni al database finché una richiesta non ne ha bisogno.
+
+@lru_cache(maxsize=None)
+def get_db_config():
+    """Configurazione database (letta una sola volta dall'ambiente)"""
+    return get_database_config()
+
+@lru_cache(maxsize=None)
+def get_csv_parser():
+    from csv_parser import CSVTransactionParser
+    # Copia dei valori originali di ogni riga solo se richiesta (audit/debug). La
+    # categorizzazione avviene al salvataggio con le regole di category_rules
+    return CSVTransactionParser(
+        keep_original_rows=os.environ.get('KEEP_ORIGINAL_ROWS', 'false').lower() == 'true',
+        categorize=False
+    )
+
+@lru_cache(maxsize=None)
+def get_transaction_service():
+    from transaction_service import TransactionService
+    return TransactionService(get_db_config())
+
+@lru_cache(maxsize=None)
+def get_category_service():
+    from category_service import CategoryService
+    return CategoryService(get_db_config())
+
+@lru_cache(maxsize=None)
+def get_budget_service():
+    from budget_service import BudgetService
+    return BudgetService(get_db_config())
+
+@lru_cache(maxsize=None)
+def get_goal_service():
+    from goal_service import GoalService
+    return GoalService(get_db_config())
+
+@lru_cache(maxsize=None)
+def get_dashboard_service():
+    from dashboard_service import DashboardService
+    return DashboardService(get_db_config())
+
+@lru_cache(maxsize=None)
+def get_transaction_exporter():
+    from export_service import TransactionExporter
+    return TransactionExporter(get_transaction_service())
+
+@lru_cache(maxsize=None)
+def get_upload_job_service():
+    from upload_job_service import UploadJobService
+    return UploadJobService(get_db_config())
+
+@lru_cache(maxsize=None)
+def get_upload_session_store():
+    from upload_sessions import UploadSessionStore
+    return UploadSessionStore()
+
+@lru_cache(maxsize=None)
+def get_delete_job_service():
+    from delete_job_service import DeleteJobService
+    return DeleteJobService(get_db_config())
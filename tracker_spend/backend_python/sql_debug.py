@@ -0,0 +1,166 @@
+"""Rilevatore di query lente e di pattern N+1 (solo sviluppo).
+
+Con SQL_DEBUG=true ogni statement eseguito durante una richiesta viene
+registrato tramite l'hook dei cursori di metrics, normalizzato (letterali e
+spazi rimossi) e raggruppato. A fine richiesta:
+
+- uno statement eseguito più di SQL_DEBUG_REPEAT_THRESHOLD volte genera un
+  warning N+1, con il punto del codice che lo esegue
+- uno statement più lento di SQL_DEBUG_SLOW_MS genera un warning di query lenta
+
+Le ultime SQL_DEBUG_HISTORY richieste sono consultabili su /api/debug/sql
+(l'endpoint esiste solo con la modalità attiva). Non va abilitato in
+produzione: per ogni query viene ispezionato lo stack.
+"""
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, Optional
+
+from flask import Blueprint, jsonify, request
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SQL_DEBUG = os.environ.get('SQL_DEBUG', 'false').lower() == 'true'
+REPEAT_THRESHOLD = int(os.environ.get('SQL_DEBUG_REPEAT_THRESHOLD', 5))
+SLOW_MS = float(os.environ.get('SQL_DEBUG_SLOW_MS', 100))
+HISTORY = int(os.environ.get('SQL_DEBUG_HISTORY', 50))
+
+_STRING_RE = re.compile(r"'(?:[^'\\]|\\.)*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST_RE = re.compile(r"\bIN\s*\(\s*(?:\?|%s)(?:\s*,\s*(?:\?|%s))*\s*\)", re.IGNORECASE)
+_SPACE_RE = re.compile(r"\s+")
+
+# Moduli da saltare per trovare il chiamante applicativo di una query
+_SKIPPED_FILES = ('metrics.py', 'sql_debug.py', 'db.py')
+
+_reports: deque = deque(maxlen=HISTORY)
+_reports_lock = threading.Lock()
+
+def normalize(statement) -> str:
+    """Forma canonica di uno statement: letterali -> ?, liste IN compattate, spazi singoli"""
+    if isinstance(statement, (bytes, bytearray)):
+        statement = statement.decode('utf-8', 'replace')
+    normalized = _STRING_RE.sub('?', statement)
+    normalized = _NUMBER_RE.sub('?', normalized)
+    normalized = _IN_LIST_RE.sub('IN (...)', normalized)
+    return _SPACE_RE.sub(' ', normalized).strip()
+
+def _caller() -> str:
+    """Primo frame del codice applicativo che ha eseguito la query"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if 'mysql' not in filename and not filename.endswith(_SKIPPED_FILES):
+            return f"{os.path.basename(filename)}:{frame.f_lineno} {frame.f_code.co_name}"
+        frame = frame.f_back
+    return 'sconosciuto'
+
+class StatementLog:
+    """Statement di una richiesta raggruppati per forma normalizzata"""
+
+    def __init__(self):
+        self.groups: Dict[str, Dict[str, Any]] = {}
+
+    def __call__(self, statement, elapsed: float):
+        key = normalize(statement)
+        group = self.groups.get(key)
+        if group is None:
+            group = self.groups[key] = {'statement': key, 'count': 0, 'total_ms': 0.0,
+                                        'max_ms': 0.0, 'callers': []}
+        elapsed_ms = elapsed * 1000
+        group['count'] += 1
+        group['total_ms'] += elapsed_ms
+        group['max_ms'] = max(group['max_ms'], elapsed_ms)
+        caller = _caller()
+        if caller not in group['callers']:
+            group['callers'].append(caller)
+
+    def report(self) -> Dict[str, Any]:
+        """Gruppi ordinati per tempo totale, con i warning della richiesta"""
+        statements = sorted(self.groups.values(), key=lambda group: group['total_ms'], reverse=True)
+        warnings = []
+        for group in statements:
+            group['total_ms'] = round(group['total_ms'], 3)
+            group['max_ms'] = round(group['max_ms'], 3)
+            if group['count'] > REPEAT_THRESHOLD:
+                warnings.append(f"N+1: eseguito {group['count']} volte da {', '.join(group['callers'])}: "
+                                f"{group['statement'][:200]}")
+            if group['max_ms'] > SLOW_MS:
+                warnings.append(f"Query lenta ({group['max_ms']:.1f} ms) da {', '.join(group['callers'])}: "
+                                f"{group['statement'][:200]}")
+        return {
+            'queries': sum(group['count'] for group in statements),
+            'distinct_statements': len(statements),
+            'db_ms': round(sum(group['total_ms'] for group in statements), 3),
+            'warnings': warnings,
+            'statements': statements
+        }
+
+def _before_request():
+    stats = metrics.current_stats()
+    if stats is not None:
+        stats.on_query = StatementLog()
+
+def _after_request(response):
+    stats = metrics.current_stats()
+    if stats is None or not isinstance(stats.on_query, StatementLog) or request.path.startswith('/api/debug/sql'):
+        return response
+
+    details = {
+        'method': request.method,
+        'path': request.path,
+        'route': request.url_rule.rule if request.url_rule else None,
+        'status': response.status_code,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')
+    }
+
+    def record():
+        # Le risposte in streaming eseguono le query dopo la view: report alla chiusura
+        report = stats.on_query.report()
+        report.update(details)
+        for warning in report['warnings']:
+            logger.warning(f"[SQL_DEBUG] {details['method']} {details['path']} - {warning}")
+        with _reports_lock:
+            _reports.append(report)
+
+    metrics.when_complete(response, record)
+    return response
+
+sql_debug_api = Blueprint('sql_debug', __name__)
+
+@sql_debug_api.route('/api/debug/sql', methods=['GET'])
+def sql_report():
+    """Report delle ultime richieste; ?warnings=1 mostra solo quelle con warning"""
+    only_warnings = request.args.get('warnings') in ('1', 'true')
+    with _reports_lock:
+        reports = list(reversed(_reports))
+    if only_warnings:
+        reports = [report for report in reports if report['warnings']]
+    return jsonify({
+        'repeat_threshold': REPEAT_THRESHOLD,
+        'slow_ms': SLOW_MS,
+        'requests': reports
+    })
+
+@sql_debug_api.route('/api/debug/sql', methods=['DELETE'])
+def clear_sql_report():
+    """Svuota lo storico"""
+    with _reports_lock:
+        _reports.clear()
+    return jsonify({'success': True})
+
+def init_app(app, enabled: Optional[bool] = None):
+    """Attiva la modalità debug SQL se richiesta (da chiamare dopo metrics.init_app)"""
+    if not (SQL_DEBUG if enabled is None else enabled):
+        return
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.register_blueprint(sql_debug_api)
+    logger.warning("SQL_DEBUG attivo: ogni query viene registrata, da non usare in produzione")
@@ -0,0 +1,75 @@
+"""Report dei tempi di avvio del backend.
+
+Esegue `python -X importtime` in un processo separato e riporta il tempo di
+import cumulativo per modulo, più il tempo di create_app().
+
+Uso: python startup_report.py [--module app] [--top 20]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# Dipendenze che non devono essere importate all'avvio del worker
+HEAVY_MODULES = ('pandas', 'numpy', 'openpyxl', 'pyarrow')
+
+def measure_imports(module: str) -> List[Tuple[str, int, int]]:
+    """Restituisce (modulo, self_us, cumulative_us) per ogni import eseguito"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=HERE, capture_output=True, text=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        # Il nome conserva l'indentazione che indica la profondità dell'import
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    if result.returncode != 0:
+        print(result.stderr[-2000:], file=sys.stderr)
+    return rows
+
+def measure_create_app() -> float:
+    """Tempo di create_app() in un processo pulito (senza controllo schema), in ms"""
+    code = (
+        "import time; t = time.perf_counter(); "
+        "from app import create_app; create_app(check_schema=False); "
+        "print((time.perf_counter() - t) * 1000)"
+    )
+    result = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True)
+    try:
+        return float(result.stdout.strip().splitlines()[-1])
+    except (ValueError, IndexError):
+        return float('nan')
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Tempi di import per modulo')
+    parser.add_argument('--module', default='app', help='Modulo da importare (default: app)')
+    parser.add_argument('--top', type=int, default=20, help='Numero di moduli da mostrare')
+    args = parser.parse_args(argv)
+
+    rows = measure_imports(args.module)
+    if not rows:
+        print("Nessun dato di import raccolto")
+        return 1
+
+    total = next((cumulative for name, _, cumulative in rows if name == args.module), rows[-1][2])
+    print(f"Import di '{args.module}': {total / 1000:.1f} ms totali\n")
+    print(f"{'modulo':50s} {'self ms':>10s} {'cumul. ms':>10s}")
+
+    # Moduli importati direttamente dal modulo di partenza (primo livello di annidamento)
+    direct = [row for row in rows if row[0].startswith('  ') and not row[0].startswith('    ')]
+    for name, self_us, cumulative in sorted(direct, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f"{name.strip():50s} {self_us / 1000:10.1f} {cumulative / 1000:10.1f}")
+
+    heavy = sorted({name.strip() for name, _, _ in rows if name.strip() in HEAVY_MODULES})
+    print(f"\nDipendenze pesanti importate all'avvio: {', '.join(heavy) if heavy else 'nessuna'}")
+    print(f"create_app(): {measure_create_app():.1f} ms")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,68 @@
-import mysql.connector
+import os
 from mysql.connector import Error
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from db import get_connection, discard_connection
+from typing import List, Dict, Any, Optional, Callable
+from datetime import datetime, date
+import base64
+import json
 import logging
+from budget_service import BudgetService
+from import_pipeline import (
+    BULK_LOAD_THRESHOLD, BulkLoadUnavailable, apply_category_rules, find_duplicates, run_staged_import
+)
+from parsed_transaction import ParsedTransaction
+from upload_job_service import UploadJobService
 
 logger = logging.getLogger(__name__)
 
+# Colonne selezionabili con la proiezione fields= della lista transazioni
+TRANSACTION_LIST_FIELDS = ['id', 'transaction_date', 'description', 'amount', 'type', 'category', 'created_at', 'updated_at']
+
+# Dimensione massima di una pagina per la paginazione keyset
+MAX_PAGE_SIZE = 1000
+
+# Righe inserite e committate per blocco durante il salvataggio di un upload
+UPLOAD_COMMIT_CHUNK = int(os.environ.get('UPLOAD_COMMIT_CHUNK', 1000))
+
+# Righe eliminate per transazione: limita la durata dei lock sulle eliminazioni grandi
+DELETE_BATCH_SIZE = int(os.environ.get('DELETE_BATCH_SIZE', 1000))
+
+# Totali di sempre di un utente (la stessa query la esegue async_service.py)
+GENERAL_STATS_SQL = """
+    SELECT 
+        COUNT(*) as total_transactions,
+        SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END) as total_income,
+        SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END) as total_expenses,
+        AVG(CASE WHEN type = 'expense' THEN amount END) as avg_expense,
+        MIN(transaction_date) as first_transaction,
+        MAX(transaction_date) as last_transaction
+    FROM transactions 
+    WHERE user_id = %s
+"""
+
+def encode_cursor(transaction_date: Any, transaction_id: int) -> str:
+    """Codifica la posizione (transaction_date, id) in un cursore opaco"""
+    if isinstance(transaction_date, (date, datetime)):
+        transaction_date = transaction_date.isoformat()[:10]
+    payload = json.dumps({'d': transaction_date, 'i': transaction_id}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decodifica un cursore opaco; solleva ValueError se non valido"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        return date.fromisoformat(payload['d']), int(payload['i'])
+    except Exception:
+        raise ValueError('Cursore non valido')
+
+def _select_columns(fields: Optional[List[str]], required: List[str] = None) -> str:
+    """Costruisce la lista di colonne per la proiezione fields= (solo colonne ammesse)"""
+    if not fields:
+        return '*'
+    columns = [field for field in TRANSACTION_LIST_FIELDS if field in fields or field in (required or [])]
+    return ', '.join(columns) if columns else '*'
+
 class TransactionService:
     """Servizio per la gestione delle transazioni nel database"""
     
@@ -15,120 +72,101 @@ class TransactionService:
     def get_db_connection(self):
         """Crea connessione al database"""
         try:
-            connection = mysql.connector.connect(**self.db_config)
+            connection = get_connection(self.db_config)
             return connection
         except Error as e:
             logger.error(f"Errore connessione MySQL: {e}")
             return None
     
-    def create_transactions_table(self):
-        """Crea la tabella transazioni se non esiste"""
-        connection = self.get_db_connection()
-        if not connection:
-            return False
-        
-        try:
-            cursor = connection.cursor()
-            
-            # Crea tabella transazioni
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS transactions (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    transaction_date DATE NOT NULL,
-                    description VARCHAR(255) NOT NULL,
-                    amount DECIMAL(10,2) NOT NULL,
-                    type ENUM('income', 'expense') NOT NULL,
-                    category VARCHAR(100) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                    INDEX idx_user_date (user_id, transaction_date),
-                    INDEX idx_category (category),
-                    INDEX idx_type (type),
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            """)
-            
-            # Aggiungi colonna category se non esiste (migrazione)
+    def save_transactions(self, user_id: int, transactions: List[ParsedTransaction],
+                          upload_id: Optional[int] = None, start_row: int = 0,
+                          chunk_size: int = UPLOAD_COMMIT_CHUNK,
+                          claim_token: Optional[str] = None,
+                          skip_duplicates: bool = True) -> Dict[str, Any]:
+        """Salva nel database le transazioni validate da CSVTransactionParser.validate_transactions.
+
+        Le righe vengono inserite e committate a blocchi di `chunk_size`. Con
+        `upload_id` ogni blocco avanza nella stessa transazione il checkpoint del
+        job (upload_jobs.committed_rows), e `start_row` salta le righe già
+        committate da un tentativo precedente. Se un blocco fallisce, i blocchi
+        precedenti restano salvati e `committed_rows` indica da dove riprendere.
+        `claim_token` è quello della presa in carico del job: se un altro worker
+        lo ha ripreso, il blocco in corso viene annullato.
+
+        Le transazioni senza categoria vengono categorizzate con le regole di
+        category_rules e quelle già presenti nel database vengono saltate
+        (`duplicates_skipped`), a meno di `skip_duplicates=False` per chi importa
+        davvero movimenti identici in file diversi. Da BULK_LOAD_THRESHOLD righe in su lo stesso
+        lavoro è fatto in SQL sulla tabella di staging (vedi import_pipeline.py).
+        """
+        if BULK_LOAD_THRESHOLD and len(transactions) - start_row >= BULK_LOAD_THRESHOLD:
             try:
-                cursor.execute("ALTER TABLE transactions ADD COLUMN category VARCHAR(100) NOT NULL DEFAULT 'Altro'")
-                logger.info("Colonna 'category' aggiunta alla tabella transactions")
-            except Error as e:
-                if "Duplicate column name" in str(e):
-                    logger.info("Colonna 'category' già esistente")
-                else:
-                    logger.warning(f"Errore aggiunta colonna category: {e}")
-            
-            # Crea tabella categorie personalizzate
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS user_categories (
-                    id INT AUTO_INCREMENT PRIMARY KEY,
-                    user_id INT NOT NULL,
-                    name VARCHAR(100) NOT NULL,
-                    color VARCHAR(7) DEFAULT '#3B82F6',
-                    icon VARCHAR(50) DEFAULT 'tag',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE KEY unique_user_category (user_id, name),
-                    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
-                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
-            """)
-            
-            connection.commit()
-            cursor.close()
-            connection.close()
-            return True
-            
-        except Error as e:
-            logger.error(f"Errore creazione tabelle: {e}")
-            if connection:
-                connection.close()
-            return False
-    
-    def save_transactions(self, user_id: int, transactions: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Salva le transazioni nel database"""
+                return run_staged_import(self.db_config, user_id, transactions, upload_id, start_row,
+                                         claim_token=claim_token, skip_duplicates=skip_duplicates)
+            except BulkLoadUnavailable as e:
+                logger.warning(f"LOAD DATA LOCAL non disponibile, salvataggio a blocchi: {e}")
+        
         connection = self.get_db_connection()
         if not connection:
             return {
                 'success': False,
                 'error': 'Errore connessione database',
-                'saved_count': 0
+                'saved_count': 0,
+                'committed_rows': start_row
             }
         
+        insert_query = """
+            INSERT INTO transactions (user_id, transaction_date, description, amount, type, category, upload_id)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
+        """
+        saved_count = 0
+        errors = []
+        committed_rows = start_row
+        
         try:
+            apply_category_rules(connection, user_id, transactions[start_row:])
+            duplicates = (find_duplicates(connection, user_id, transactions, start_row, upload_id)
+                          if skip_duplicates else set())
             cursor = connection.cursor()
             
-            # Prepara la query di inserimento
-            insert_query = """
-                INSERT INTO transactions (user_id, transaction_date, description, amount, type, category)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            
-            saved_count = 0
-            errors = []
-            
-            for i, transaction in enumerate(transactions):
+            for chunk_start in range(start_row, len(transactions), chunk_size):
+                chunk = transactions[chunk_start:chunk_start + chunk_size]
+                pending = [(index, transaction) for index, transaction in enumerate(chunk, chunk_start)
+                           if index not in duplicates]
+                rows = [transaction.insert_values(user_id) + (upload_id,) for _, transaction in pending]
+                
                 try:
-                    # Valida i dati
-                    if not all(key in transaction for key in ['transaction_date', 'description', 'amount', 'type', 'category']):
-                        errors.append(f"Transazione {i+1}: Dati mancanti")
-                        continue
-                    
-                    # Esegui l'inserimento
-                    cursor.execute(insert_query, (
-                        user_id,
-                        transaction['transaction_date'],
-                        transaction['description'][:255],  # Limita lunghezza
-                        transaction['amount'],
-                        transaction['type'],
-                        transaction['category'][:100]  # Limita lunghezza
-                    ))
-                    saved_count += 1
-                    
-                except Error as e:
-                    errors.append(f"Transazione {i+1}: {str(e)}")
-                    continue
+                    if rows:
+                        cursor.executemany(insert_query, rows)
+                    chunk_saved = len(rows)
+                    saved = [transaction for _, transaction in pending]
+                except Error:
+                    # Un errore su una riga annulla il blocco: lo si ripete riga per riga
+                    # per salvare le altre e riportare quali sono fallite
+                    connection.rollback()
+                    chunk_saved = 0
+                    saved = []
+                    for (index, transaction), values in zip(pending, rows):
+                        try:
+                            cursor.execute(insert_query, values)
+                            chunk_saved += 1
+                            saved.append(transaction)
+                        except Error as e:
+                            errors.append(f"Transazione {index + 1}: {str(e)}")
+                
+                # Contatori dei budget e checkpoint nella stessa transazione degli INSERT
+                BudgetService.apply_spent_deltas(connection, user_id, [
+                    (None, transaction.transaction_date, transaction.amount)
+                    for transaction in saved if transaction.type == 'expense'
+                ])
+                if upload_id is not None:
+                    UploadJobService.checkpoint(connection, upload_id, claim_token,
+                                                chunk_start + len(chunk), chunk_saved)
+                
+                connection.commit()
+                saved_count += chunk_saved
+                committed_rows = chunk_start + len(chunk)
             
-            connection.commit()
             cursor.close()
             connection.close()
             
@@ -136,20 +174,117 @@ class TransactionService:
                 'success': True,
                 'saved_count': saved_count,
                 'total_count': len(transactions),
-                'errors': errors
+                'committed_rows': committed_rows,
+                'errors': errors,
+                'duplicates_skipped': len(duplicates),
+                'categories': sorted({
+                    transaction.category
+                    for index, transaction in enumerate(transactions[start_row:], start_row)
+                    if index not in duplicates
+                })
             }
             
         except Error as e:
-            logger.error(f"Errore salvataggio transazioni: {e}")
+            logger.error(f"Errore salvataggio transazioni (righe committate: {committed_rows}): {e}")
             if connection:
+                connection.rollback()
                 connection.close()
             return {
                 'success': False,
                 'error': str(e),
-                'saved_count': 0
+                'saved_count': saved_count,
+                'committed_rows': committed_rows
             }
     
-    def get_user_transactions(self, user_id: int, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    def _build_filters(self, user_id: int, filters: Optional[Dict[str, Any]]) -> tuple:
+        """Costruisce la clausola WHERE condivisa dalle query sulla lista transazioni"""
+        where = "WHERE user_id = %s"
+        params = [user_id]
+        
+        if filters:
+            if filters.get('start_date'):
+                where += " AND transaction_date >= %s"
+                params.append(filters['start_date'])
+            
+            if filters.get('end_date'):
+                where += " AND transaction_date <= %s"
+                params.append(filters['end_date'])
+            
+            if filters.get('type'):
+                where += " AND type = %s"
+                params.append(filters['type'])
+            
+            if filters.get('category'):
+                where += " AND category = %s"
+                params.append(filters['category'])
+            
+            if filters.get('min_amount'):
+                where += " AND amount >= %s"
+                params.append(filters['min_amount'])
+            
+            if filters.get('max_amount'):
+                where += " AND amount <= %s"
+                params.append(filters['max_amount'])
+            
+            if filters.get('upload_id'):
+                where += " AND upload_id = %s"
+                params.append(filters['upload_id'])
+        
+        return where, params
+    
+    def build_list_query(self, user_id: int, filters: Optional[Dict[str, Any]],
+                         fields: Optional[List[str]] = None, stable_order: bool = False) -> tuple:
+        """Query della lista transazioni; stable_order ordina per id invece che per created_at"""
+        where, params = self._build_filters(user_id, filters)
+        query = f"SELECT {_select_columns(fields)} FROM transactions {where}"
+        
+        # Aggiungi ordinamento
+        if stable_order:
+            query += " ORDER BY transaction_date DESC, id DESC"
+        else:
+            query += " ORDER BY transaction_date DESC, created_at DESC"
+        
+        # Aggiungi limite se specificato
+        if filters and filters.get('limit'):
+            query += " LIMIT %s"
+            params.append(filters['limit'])
+        
+        return query, params
+    
+    def build_count_query(self, user_id: int, filters: Optional[Dict[str, Any]]) -> tuple:
+        """Conteggio totale per la paginazione"""
+        where, params = self._build_filters(user_id, filters)
+        return f"SELECT COUNT(*) as total FROM transactions {where}", params
+    
+    def build_page_query(self, user_id: int, filters: Optional[Dict[str, Any]], page_size: int,
+                         position: Optional[tuple], fields: Optional[List[str]] = None) -> tuple:
+        """Query keyset di una pagina: chiede page_size + 1 righe dopo la posizione data"""
+        where, params = self._build_filters(user_id, filters)
+        
+        # id e transaction_date servono sempre per costruire il cursore successivo
+        query = f"SELECT {_select_columns(fields, ['id', 'transaction_date'])} FROM transactions {where}"
+        if position:
+            query += " AND (transaction_date < %s OR (transaction_date = %s AND id < %s))"
+            params.extend([position[0], position[0], position[1]])
+        
+        # Una riga in più per sapere se esiste una pagina successiva
+        query += " ORDER BY transaction_date DESC, id DESC LIMIT %s"
+        params.append(page_size + 1)
+        
+        return query, params
+    
+    @staticmethod
+    def finish_page(transactions: List[Dict[str, Any]], page_size: int) -> tuple:
+        """Tronca la riga in più e calcola il cursore della pagina successiva"""
+        next_cursor = None
+        if len(transactions) > page_size:
+            transactions = transactions[:page_size]
+            last = transactions[-1]
+            next_cursor = encode_cursor(last['transaction_date'], last['id'])
+        return transactions, next_cursor
+    
+    def get_user_transactions(self, user_id: int, filters: Optional[Dict[str, Any]] = None,
+                              fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """Recupera le transazioni di un utente con filtri opzionali"""
         connection = self.get_db_connection()
         if not connection:
@@ -158,57 +293,96 @@ class TransactionService:
         try:
             cursor = connection.cursor(dictionary=True)
             
-            # Costruisci la query base
-            query = "SELECT * FROM transactions WHERE user_id = %s"
-            params = [user_id]
+            query, params = self.build_list_query(user_id, filters, fields)
+            cursor.execute(query, params)
+            transactions = cursor.fetchall()
             
-            # Aggiungi filtri
-            if filters:
-                if filters.get('start_date'):
-                    query += " AND transaction_date >= %s"
-                    params.append(filters['start_date'])
-                
-                if filters.get('end_date'):
-                    query += " AND transaction_date <= %s"
-                    params.append(filters['end_date'])
-                
-                if filters.get('type'):
-                    query += " AND type = %s"
-                    params.append(filters['type'])
-                
-                if filters.get('category'):
-                    query += " AND category = %s"
-                    params.append(filters['category'])
-                
-                if filters.get('min_amount'):
-                    query += " AND amount >= %s"
-                    params.append(filters['min_amount'])
-                
-                if filters.get('max_amount'):
-                    query += " AND amount <= %s"
-                    params.append(filters['max_amount'])
+            cursor.close()
+            connection.close()
             
-            # Aggiungi ordinamento
-            query += " ORDER BY transaction_date DESC, created_at DESC"
+            return transactions
+            
+        except Error as e:
+            logger.error(f"Errore recupero transazioni: {e}")
+            if connection:
+                connection.close()
+            return []
+    
+    def iter_user_transactions(self, user_id: int, filters: Optional[Dict[str, Any]] = None,
+                               fields: Optional[List[str]] = None, chunk_size: int = 500):
+        """Itera le transazioni a blocchi da un cursore non bufferizzato (memoria costante).
+        
+        La connessione resta aperta finché il generatore non è esaurito o chiuso.
+        Un errore del database, anche a metà, viene rilanciato: chi serializza lo
+        stream deve poterlo distinguere dalla fine dei dati.
+        """
+        connection = self.get_db_connection()
+        if not connection:
+            raise Error("Connessione al database non disponibile")
+        
+        exhausted = False
+        try:
+            # Cursore non bufferizzato: le righe arrivano dal server man mano che si leggono
+            cursor = connection.cursor(dictionary=True, buffered=False)
+            query, params = self.build_list_query(user_id, filters, fields, stable_order=True)
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                yield rows
+            exhausted = True
+            cursor.close()
+                
+        except Error as e:
+            logger.error(f"Errore streaming transazioni: {e}")
+            raise
+        finally:
+            if exhausted:
+                connection.close()
+            else:
+                # Client disconnesso o errore: le righe non lette restano sul socket
+                discard_connection(connection)
+    
+    def get_user_transactions_page(self, user_id: int, filters: Optional[Dict[str, Any]] = None,
+                                   page_size: int = 100, cursor_token: Optional[str] = None,
+                                   fields: Optional[List[str]] = None,
+                                   include_total: bool = False) -> Dict[str, Any]:
+        """Recupera una pagina di transazioni con paginazione keyset su (transaction_date, id).
+        
+        Solleva ValueError se il cursore non è valido.
+        """
+        page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+        position = decode_cursor(cursor_token) if cursor_token else None
+        
+        connection = self.get_db_connection()
+        if not connection:
+            return {'transactions': [], 'next_cursor': None}
+        
+        try:
+            cursor = connection.cursor(dictionary=True)
             
-            # Aggiungi limite se specificato
-            if filters and filters.get('limit'):
-                query += " LIMIT %s"
-                params.append(filters['limit'])
+            result = {}
+            if include_total:
+                count_query, count_params = self.build_count_query(user_id, filters)
+                cursor.execute(count_query, count_params)
+                result['total'] = cursor.fetchone()['total']
             
+            query, params = self.build_page_query(user_id, filters, page_size, position, fields)
             cursor.execute(query, params)
             transactions = cursor.fetchall()
             
             cursor.close()
             connection.close()
             
-            return transactions
+            result['transactions'], result['next_cursor'] = self.finish_page(transactions, page_size)
+            return result
             
         except Error as e:
-            logger.error(f"Errore recupero transazioni: {e}")
+            logger.error(f"Errore recupero pagina transazioni: {e}")
             if connection:
                 connection.close()
-            return []
+            return {'transactions': [], 'next_cursor': None}
     
     def get_transaction_stats(self, user_id: int, period: str = 'month') -> Dict[str, Any]:
         """Recupera statistiche delle transazioni"""
@@ -293,43 +467,143 @@ class TransactionService:
                 connection.close()
             return {}
     
-    def delete_user_transactions(self, user_id: int, transaction_ids: Optional[List[int]] = None) -> bool:
-        """Elimina transazioni di un utente"""
+    def count_user_transactions(self, user_id: int, filters: Optional[Dict[str, Any]] = None) -> int:
+        """Numero di transazioni che soddisfano i filtri (per scegliere eliminazione sincrona o in background)"""
         connection = self.get_db_connection()
         if not connection:
-            return False
+            return 0
+        try:
+            cursor = connection.cursor()
+            cursor.execute(*self.build_count_query(user_id, filters))
+            total = cursor.fetchone()[0]
+            cursor.close()
+            connection.close()
+            return total
+        except Error as e:
+            logger.error(f"Errore conteggio transazioni: {e}")
+            connection.close()
+            return 0
+    
+    def delete_user_transactions(self, user_id: int, transaction_ids: Optional[List[int]] = None,
+                                 filters: Optional[Dict[str, Any]] = None,
+                                 batch_size: int = DELETE_BATCH_SIZE,
+                                 on_batch: Optional[Callable[[Any, int], None]] = None) -> Optional[int]:
+        """Elimina transazioni di un utente a blocchi, una transazione breve per blocco.
+
+        Con `transaction_ids` elimina quegli id; altrimenti le transazioni che
+        soddisfano `filters` (start_date, end_date, upload_id, ...; nessun filtro =
+        tutte). Ogni blocco di al massimo `batch_size` righe blocca, elimina per
+        chiave primaria e scala i contatori dei budget, poi fa commit: i lock durano
+        un blocco e un'interruzione lascia dati e contatori coerenti. `on_batch`
+        riceve la connessione e il totale eliminato, blocco corrente compreso, dopo
+        ogni blocco non vuoto e prima del suo commit: può scrivere l'avanzamento
+        nella stessa transazione o sollevare Error per annullare il blocco.
+
+        Restituisce il numero di transazioni eliminate, None in caso di errore.
+        """
+        connection = self.get_db_connection()
+        if not connection:
+            return None
+        
+        deleted_count = 0
+        
+        def before_commit(rows):
+            if on_batch:
+                on_batch(connection, deleted_count + rows)
         
         try:
             cursor = connection.cursor()
             
             if transaction_ids:
-                # Elimina transazioni specifiche
-                placeholders = ','.join(['%s'] * len(transaction_ids))
-                query = f"DELETE FROM transactions WHERE user_id = %s AND id IN ({placeholders})"
-                params = [user_id] + transaction_ids
+                for chunk_start in range(0, len(transaction_ids), batch_size):
+                    chunk = transaction_ids[chunk_start:chunk_start + batch_size]
+                    placeholders = ','.join(['%s'] * len(chunk))
+                    deleted_count += len(self._delete_batch(
+                        cursor, connection, user_id,
+                        f"WHERE user_id = %s AND id IN ({placeholders})", [user_id] + chunk,
+                        before_commit
+                    ))
             else:
-                # Elimina tutte le transazioni dell'utente
-                query = "DELETE FROM transactions WHERE user_id = %s"
-                params = [user_id]
-            
-            cursor.execute(query, params)
-            deleted_count = cursor.rowcount
+                # Keyset sull'ordine dell'indice usato dal filtro: ogni blocco riparte dopo
+                # l'ultima riga eliminata invece di riscandire le voci già cancellate
+                by_upload = bool(filters and filters.get('upload_id'))
+                position = None
+                while True:
+                    where, params = self._build_filters(user_id, filters)
+                    if by_upload:
+                        if position:
+                            where += " AND id > %s"
+                            params.append(position[1])
+                        order = "ORDER BY id"
+                    else:
+                        if position:
+                            where += " AND (transaction_date > %s OR (transaction_date = %s AND id > %s))"
+                            params.extend([position[0], position[0], position[1]])
+                        order = "ORDER BY transaction_date, id"
+                    
+                    rows = self._delete_batch(cursor, connection, user_id,
+                                              f"{where} {order} LIMIT %s", params + [batch_size],
+                                              before_commit)
+                    deleted_count += len(rows)
+                    if len(rows) < batch_size:
+                        break
+                    position = (rows[-1][2], rows[-1][0])
             
-            connection.commit()
             cursor.close()
             connection.close()
             
             logger.info(f"Eliminate {deleted_count} transazioni per utente {user_id}")
-            return True
+            return deleted_count
             
         except Error as e:
-            logger.error(f"Errore eliminazione transazioni: {e}")
+            logger.error(f"Errore eliminazione transazioni (già eliminate: {deleted_count}): {e}")
             if connection:
+                connection.rollback()
                 connection.close()
-            return False
+            return None
+    
+    @staticmethod
+    def _delete_batch(cursor, connection, user_id: int, where: str, params: list,
+                      before_commit: Optional[Callable[[int], None]] = None) -> list:
+        """Blocca, elimina e scala dai budget le righe selezionate da `where`; fa commit.
+
+        `before_commit` riceve il numero di righe eliminate, nella stessa transazione.
+        """
+        cursor.execute(f"""
+            SELECT id, category_id, transaction_date, amount, type FROM transactions
+            {where} FOR UPDATE
+        """, params)
+        rows = cursor.fetchall()
+        if rows:
+            placeholders = ','.join(['%s'] * len(rows))
+            cursor.execute(f"DELETE FROM transactions WHERE user_id = %s AND id IN ({placeholders})",
+                           [user_id] + [row[0] for row in rows])
+            # Spese rimosse da scalare dai contatori dei budget, nella stessa transazione
+            BudgetService.apply_spent_deltas(connection, user_id, [
+                (category_id, transaction_date, -amount)
+                for _, category_id, transaction_date, amount, transaction_type in rows
+                if transaction_type == 'expense'
+            ])
+            if before_commit:
+                before_commit(len(rows))
+        connection.commit()
+        return rows
     
     def update_transaction(self, user_id: int, transaction_id: int, updates: Dict[str, Any]) -> bool:
         """Aggiorna una transazione specifica"""
+        # Costruisci query di aggiornamento prima di prendere una connessione dal pool
+        set_clauses = []
+        params = []
+        
+        allowed_fields = ['description', 'amount', 'type', 'category']
+        for field, value in updates.items():
+            if field in allowed_fields:
+                set_clauses.append(f"{field} = %s")
+                params.append(value)
+        
+        if not set_clauses:
+            return False
+        
         connection = self.get_db_connection()
         if not connection:
             return False
@@ -337,18 +611,12 @@ class TransactionService:
         try:
             cursor = connection.cursor()
             
-            # Costruisci query di aggiornamento
-            set_clauses = []
-            params = []
-            
-            allowed_fields = ['description', 'amount', 'type', 'category']
-            for field, value in updates.items():
-                if field in allowed_fields:
-                    set_clauses.append(f"{field} = %s")
-                    params.append(value)
-            
-            if not set_clauses:
-                return False
+            # Stato precedente per aggiornare i contatori dei budget
+            cursor.execute("""
+                SELECT category_id, transaction_date, amount, type FROM transactions
+                WHERE id = %s AND user_id = %s FOR UPDATE
+            """, (transaction_id, user_id))
+            previous = cursor.fetchone()
             
             query = f"UPDATE transactions SET {', '.join(set_clauses)} WHERE id = %s AND user_id = %s"
             params.extend([transaction_id, user_id])
@@ -356,6 +624,17 @@ class TransactionService:
             cursor.execute(query, params)
             updated = cursor.rowcount > 0
             
+            if updated and previous and ('amount' in updates or 'type' in updates):
+                category_id, transaction_date, old_amount, old_type = previous
+                new_amount = updates.get('amount', old_amount)
+                new_type = updates.get('type', old_type)
+                budget_deltas = []
+                if old_type == 'expense':
+                    budget_deltas.append((category_id, transaction_date, -old_amount))
+                if new_type == 'expense':
+                    budget_deltas.append((category_id, transaction_date, new_amount))
+                BudgetService.apply_spent_deltas(connection, user_id, budget_deltas)
+            
             connection.commit()
             cursor.close()
             connection.close()
@@ -378,49 +657,44 @@ class TransactionService:
             cursor = connection.cursor(dictionary=True)
             
             # Get total income, expenses, and transaction count
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_transactions,
-                    SUM(CASE WHEN type = 'income' THEN amount ELSE 0 END) as total_income,
-                    SUM(CASE WHEN type = 'expense' THEN amount ELSE 0 END) as total_expenses,
-                    AVG(CASE WHEN type = 'expense' THEN amount END) as avg_expense,
-                    MIN(transaction_date) as first_transaction,
-                    MAX(transaction_date) as last_transaction
-                FROM transactions 
-                WHERE user_id = %s
-            """, (user_id,))
+            cursor.execute(GENERAL_STATS_SQL, (user_id,))
             
             stats = cursor.fetchone()
             
             cursor.close()
             connection.close()
             
-            if not stats:
-                return {
-                    'total_transactions': 0,
-                    'total_income': 0,
-                    'total_expenses': 0,
-                    'net_amount': 0,
-                    'avg_expense': 0,
-                    'first_transaction': None,
-                    'last_transaction': None
-                }
-            
-            # Calculate net amount
-            net_amount = (stats['total_income'] or 0) - (stats['total_expenses'] or 0)
-            
-            return {
-                'total_transactions': stats['total_transactions'] or 0,
-                'total_income': float(stats['total_income'] or 0),
-                'total_expenses': float(stats['total_expenses'] or 0),
-                'net_amount': float(net_amount),
-                'avg_expense': float(stats['avg_expense'] or 0),
-                'first_transaction': stats['first_transaction'].isoformat() if stats['first_transaction'] else None,
-                'last_transaction': stats['last_transaction'].isoformat() if stats['last_transaction'] else None
-            }
+            return self.format_general_stats(stats)
             
         except Error as e:
             logger.error(f"Error getting general stats for user {user_id}: {e}")
             if connection:
                 connection.close()
             return {}
+    
+    @staticmethod
+    def format_general_stats(stats: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Build the general stats payload from the aggregate row"""
+        if not stats:
+            return {
+                'total_transactions': 0,
+                'total_income': 0,
+                'total_expenses': 0,
+                'net_amount': 0,
+                'avg_expense': 0,
+                'first_transaction': None,
+                'last_transaction': None
+            }
+        
+        # Calculate net amount
+        net_amount = (stats['total_income'] or 0) - (stats['total_expenses'] or 0)
+        
+        return {
+            'total_transactions': stats['total_transactions'] or 0,
+            'total_income': float(stats['total_income'] or 0),
+            'total_expenses': float(stats['total_expenses'] or 0),
+            'net_amount': float(net_amount),
+            'avg_expense': float(stats['avg_expense'] or 0),
+            'first_transaction': stats['first_transaction'].isoformat() if stats['first_transaction'] else None,
+            'last_transaction': stats['last_transaction'].isoformat() if stats['last_transaction'] else None
+        }
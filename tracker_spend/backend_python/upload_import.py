@@ -0,0 +1,181 @@
+"""Pipeline di import di un file su disco, condivisa dalle route di upload e da job_worker.py.
+
+import_file prende in carico (o ritrova) l'upload job ed elabora il file nella
+richiesta; run_queued_upload elabora nel job worker un upload a blocchi messo
+in coda dal finalize (vedi upload_sessions.py).
+"""
+import logging
+import uuid
+from typing import Any, Dict, Tuple
+
+from memory_profile import ImportMemoryTracker
+from services import get_csv_parser, get_transaction_service, get_upload_job_service, get_upload_session_store
+from upload_job_service import UploadJobConflict
+from upload_sessions import UploadSessionError, file_sha256
+
+logger = logging.getLogger(__name__)
+
+def import_file(user_id, file_path, filename, mode='partial', idempotency_key=None, memory=None,
+                 sha256=None, skip_duplicates=True):
+    """Pipeline di import di un file su disco: job -> detect -> parse -> validate -> save a blocchi.
+
+    Restituisce (corpo della risposta, status HTTP). Senza idempotency key ne viene
+    generata una, così ogni upload ha un job riprendibile con /api/uploads/<id>/resume.
+    `sha256` evita di rileggere il file quando il checksum è già stato verificato.
+    Con `skip_duplicates=False` le righe già presenti nel database vengono importate.
+    """
+    memory = memory or ImportMemoryTracker(enabled=False)
+    
+    try:
+        job = get_upload_job_service().start_job(
+            user_id, idempotency_key or uuid.uuid4().hex, filename, sha256 or file_sha256(file_path)
+        )
+    except UploadJobConflict as conflict:
+        return {'error': str(conflict)}, 409
+    
+    if job['status'] == 'completed':
+        logger.info(f"Upload {job['id']} già completato: restituisco il risultato salvato")
+        return {**(job['result'] or {}), 'upload_id': job['id'], 'replayed': True}, 200
+    
+    # Il lease del job viene rinnovato per tutta l'elaborazione, fasi lunghe comprese
+    with get_upload_job_service().keep_alive(job):
+        return run_upload_job(user_id, job, file_path, filename, mode, memory, skip_duplicates)
+
+def run_upload_job(user_id, job, file_path, filename, mode, memory, skip_duplicates=True):
+    """Elabora un job preso in carico da start_job; restituisce (corpo, status HTTP)"""
+    try:
+        logger.info("=== INIZIO PROCESSING UPLOAD ===")
+        logger.info(f"File ricevuto: {filename} (upload {job['id']})")
+        logger.info(f"Path temporaneo: {file_path}")
+        
+        # Parsa il file (CSV o Excel)
+        logger.info(f"1. Parsing file: {filename}")
+        try:
+            with memory.stage('detect'):
+                format_type = get_csv_parser().detect_format(file_path)
+            with memory.stage('parse'):
+                transactions = get_csv_parser().parse_file(file_path, format_type)
+            memory.rows = len(transactions)
+            logger.info(f"2. Transazioni parsate: {len(transactions)}")
+            if transactions:
+                logger.info(f"3. Prima transazione: {transactions[0]}")
+            else:
+                logger.warning("3. Nessuna transazione parsata!")
+        except Exception as parse_error:
+            logger.error(f"Errore durante il parsing: {parse_error}")
+            get_upload_job_service().fail_job(job, f"Errore durante il parsing: {parse_error}")
+            return {
+                'error': 'Errore durante il parsing del file',
+                'details': [str(parse_error)],
+                'upload_id': job['id']
+            }, 400
+        
+        # Valida le transazioni
+        logger.info("4. Inizio validazione transazioni")
+        with memory.stage('validate'):
+            validation_result = get_csv_parser().validate_transactions(transactions)
+        stats = validation_result.get('stats', {})
+        logger.info(f"5. Validazione: {stats.get('total_transactions', 0)} valide, "
+                    f"{stats.get('errors_count', 0)} scartate {stats.get('errors_by_reason', {})}")
+        
+        # In modalità strict basta uno scarto per rifiutare il file; in modalità
+        # partial si salvano le righe valide e si restituisce il report degli scarti
+        if not validation_result['transactions'] or (mode == 'strict' and not validation_result['valid']):
+            logger.error(f"8. Validazione fallita: {stats.get('errors', validation_result.get('error'))}")
+            get_upload_job_service().fail_job(job, 'Errore nella validazione del file')
+            return {
+                'error': 'Errore nella validazione del file',
+                'details': stats.get('errors') or [validation_result.get('error', 'Errore sconosciuto')],
+                'errors_by_reason': stats.get('errors_by_reason', {}),
+                'rejected': validation_result.get('rejected', []),
+                'upload_id': job['id']
+            }, 400
+        
+        logger.info("10. Validazione completata con successo")
+        valid_transactions = validation_result['transactions']
+        get_upload_job_service().set_total_rows(job, len(valid_transactions), stats['errors_count'])
+        
+        # Salva nel database a blocchi, riprendendo dal checkpoint di un tentativo precedente
+        if job['committed_rows']:
+            logger.info(f"11. Ripresa upload {job['id']} dalla riga {job['committed_rows']}")
+        else:
+            logger.info("11. Inizio salvataggio nel database")
+        with memory.stage('save'):
+            save_result = get_transaction_service().save_transactions(
+                user_id, valid_transactions, upload_id=job['id'], start_row=job['committed_rows'],
+                claim_token=job['claim_token'], skip_duplicates=skip_duplicates
+            )
+        logger.info(f"12. Risultato salvataggio: {save_result}")
+        
+        if not save_result['success']:
+            logger.error(f"13. Salvataggio fallito: {save_result}")
+            get_upload_job_service().fail_job(job, save_result.get('error', 'Errore sconosciuto'))
+            return {
+                'error': 'Errore nel salvataggio delle transazioni',
+                'details': save_result.get('error', 'Errore sconosciuto'),
+                'upload_id': job['id'],
+                'committed_rows': save_result['committed_rows'],
+                'resumable': True
+            }, 500
+        
+        logger.info("14. Salvataggio completato con successo")
+        
+        # Le categorie assegnate dalle regole al salvataggio si aggiungono a quelle del file
+        stats['categories'] = sorted(set(stats.get('categories', [])) | set(save_result.get('categories', [])))
+        
+        # Prepara risposta (i conteggi includono le righe salvate dai tentativi precedenti)
+        logger.info("15. Preparazione risposta")
+        saved_count = job['saved_count'] + save_result['saved_count']
+        response_data = {
+            'success': True,
+            'message': f'Caricati {saved_count} transazioni con successo',
+            'stats': stats,
+            'saved_count': saved_count,
+            'total_count': save_result['total_count'],
+            'errors': save_result.get('errors', []),
+            'mode': mode,
+            'rejected_count': stats['errors_count'],
+            'rejected': validation_result['rejected'],
+            'duplicates_skipped': save_result.get('duplicates_skipped', 0),
+            'upload_id': job['id'],
+            'resumed_from': job['committed_rows']
+        }
+        # Il report di memoria resta nel risultato del job: per gli upload in coda
+        # è l'unico posto da cui leggerlo (GET /api/uploads/<id>)
+        if memory.enabled:
+            response_data['memory'] = memory.report()
+        get_upload_job_service().complete_job(job, response_data)
+        
+        logger.info(f"16. Upload completato per utente {user_id}: {saved_count} transazioni salvate")
+        logger.info("=== FINE PROCESSING UPLOAD ===")
+        return response_data, 200
+        
+    except Exception as e:
+        get_upload_job_service().fail_job(job, str(e))
+        raise
+
+def run_queued_upload(job: Dict[str, Any]) -> Tuple[Dict[str, Any], int]:
+    """Importa il file della sessione di un job preso in carico con claim_next_queued_job.
+
+    Il checksum viene verificato di nuovo sul file in disco. Se l'import è
+    concluso (successo o file rifiutato) la sessione viene rimossa; dopo un
+    errore di salvataggio resta, e un nuovo finalize rimette il job in coda.
+    """
+    store = get_upload_session_store()
+    # Misura dei picchi di memoria per fase, solo con IMPORT_MEMORY_DEBUG (come l'upload diretto)
+    with ImportMemoryTracker() as memory:
+        try:
+            with memory.stage('read'):
+                session = store.verify(job['user_id'], job['session_id'], job['file_sha256'])
+        except UploadSessionError as e:
+            get_upload_job_service().fail_job(job, f"Sessione di upload non utilizzabile: {e}")
+            return {'error': str(e), 'upload_id': job['id']}, e.status
+
+        with get_upload_job_service().keep_alive(job):
+            body, status = run_upload_job(job['user_id'], job, session['path'], session['filename'],
+                                          session['mode'], memory, session.get('skip_duplicates', True))
+    if body.get('memory'):
+        logger.info(f"Upload {job['id']}: memoria per fase {body['memory']}")
+    if status in (200, 400):
+        store.delete(job['session_id'])
+    return body, status
@@ -0,0 +1,356 @@
+import json
+import logging
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+from mysql.connector import Error
+
+from db import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Un job 'processing' non aggiornato da così tanti secondi è considerato
+# abbandonato (worker terminato a metà) e può essere ripreso
+STALE_JOB_SECONDS = 300
+
+# Intervallo dell'heartbeat del worker che ha il job, ben sotto STALE_JOB_SECONDS
+HEARTBEAT_SECONDS = 60
+
+JOB_FIELDS = """
+    id, user_id, idempotency_key, status, filename, file_sha256, session_id, total_rows,
+    committed_rows, saved_count, rejected_count, result, error, created_at, updated_at
+"""
+
+class UploadJobConflict(Exception):
+    """Idempotency key già usata per un file diverso, o job in corso su un altro worker"""
+
+class UploadJobLost(Error):
+    """Il job è stato preso in carico da un altro worker: il blocco in corso va annullato.
+
+    È un Error di mysql.connector perché i salvataggi lo gestiscano come un errore
+    SQL del blocco (rollback, checkpoint fermo all'ultimo commit).
+    """
+
+class UploadJobService:
+    """Job di upload idempotenti e riprendibili (tabella upload_jobs)"""
+
+    def __init__(self, db_config: Dict[str, Any]):
+        self.db_config = db_config
+
+    def get_db_connection(self):
+        """Crea connessione al database"""
+        try:
+            connection = get_connection(self.db_config)
+            return connection
+        except Error as e:
+            logger.error(f"Errore connessione MySQL: {e}")
+            return None
+
+    @staticmethod
+    def _format_job(job: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        if job and isinstance(job.get('result'), (str, bytes)):
+            job['result'] = json.loads(job['result'])
+        return job
+
+    def _fetch_job(self, cursor, job_id: int) -> Optional[Dict[str, Any]]:
+        cursor.execute(f"SELECT {JOB_FIELDS} FROM upload_jobs WHERE id = %s", (job_id,))
+        return self._format_job(cursor.fetchone())
+
+    def _upsert_job(self, cursor, connection, user_id: int, idempotency_key: Optional[str],
+                    filename: str, file_sha256: str) -> Dict[str, Any]:
+        """Crea il job o ritrova quello con la stessa idempotency key (stesso file)"""
+        # LAST_INSERT_ID(id) restituisce l'id della riga esistente in caso di chiave duplicata
+        cursor.execute("""
+            INSERT INTO upload_jobs (user_id, idempotency_key, filename, file_sha256)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE id = LAST_INSERT_ID(id)
+        """, (user_id, idempotency_key, filename[:255] if filename else None, file_sha256))
+        job_id = cursor.lastrowid
+        connection.commit()
+
+        job = self._fetch_job(cursor, job_id)
+        if job['file_sha256'] and job['file_sha256'] != file_sha256:
+            raise UploadJobConflict("Idempotency key già usata per un file diverso")
+        return job
+
+    def _claim(self, cursor, connection, job_id: int) -> Optional[Dict[str, Any]]:
+        """Presa in carico atomica; None se un altro worker sta già elaborando il job.
+
+        Il token nuovo invalida quello di un eventuale worker precedente ancora vivo.
+        """
+        claim_token = uuid.uuid4().hex
+        cursor.execute("""
+            UPDATE upload_jobs
+            SET status = 'processing', error = NULL, claim_token = %s, updated_at = NOW()
+            WHERE id = %s AND (
+                status IN ('pending', 'failed')
+                OR (status = 'processing' AND updated_at < NOW() - INTERVAL %s SECOND)
+            )
+        """, (claim_token, job_id, STALE_JOB_SECONDS))
+        claimed = cursor.rowcount == 1
+        connection.commit()
+        if not claimed:
+            return None
+        job = self._fetch_job(cursor, job_id)
+        job['claim_token'] = claim_token
+        return job
+
+    def start_job(self, user_id: int, idempotency_key: Optional[str], filename: str,
+                  file_sha256: str) -> Dict[str, Any]:
+        """Crea il job o ritrova quello con la stessa idempotency key, e lo prende in carico.
+
+        Un job già completato viene restituito così com'è (il chiamante risponde con
+        il risultato salvato); uno fallito o abbandonato viene ripreso dal checkpoint.
+        Il job preso in carico ha `claim_token`, da passare a checkpoint e agli
+        aggiornamenti di stato. Solleva UploadJobConflict se la chiave appartiene a
+        un altro file o se il job è in corso altrove.
+        """
+        connection = self.get_db_connection()
+        if not connection:
+            raise Error("Errore connessione database")
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+            job = self._upsert_job(cursor, connection, user_id, idempotency_key, filename, file_sha256)
+            if job['status'] != 'completed':
+                job = self._claim(cursor, connection, job['id'])
+                if job is None:
+                    raise UploadJobConflict("Upload già in corso")
+            cursor.close()
+            connection.close()
+            return job
+
+        except Exception:
+            connection.rollback()
+            connection.close()
+            raise
+
+    def enqueue_job(self, user_id: int, idempotency_key: Optional[str], filename: str,
+                    file_sha256: str, session_id: str) -> Dict[str, Any]:
+        """Come start_job, ma il job viene messo in coda per job_worker.py.
+
+        Un job nuovo, fallito o abbandonato torna 'pending' con il session_id del
+        file da importare; uno completato o in corso viene restituito com'è.
+        Solleva UploadJobConflict se la chiave appartiene a un altro file.
+        """
+        connection = self.get_db_connection()
+        if not connection:
+            raise Error("Errore connessione database")
+
+        try:
+            cursor = connection.cursor(dictionary=True)
+            job = self._upsert_job(cursor, connection, user_id, idempotency_key, filename, file_sha256)
+            if job['status'] != 'completed':
+                cursor.execute("""
+                    UPDATE upload_jobs
+                    SET status = 'pending', session_id = %s, error = NULL, claim_token = NULL
+                    WHERE id = %s AND (
+                        status IN ('pending', 'failed')
+                        OR (status = 'processing' AND updated_at < NOW() - INTERVAL %s SECOND)
+                    )
+                """, (session_id, job['id'], STALE_JOB_SECONDS))
+                connection.commit()
+                job = self._fetch_job(cursor, job['id'])
+            cursor.close()
+            connection.close()
+            return job
+
+        except Exception:
+            connection.rollback()
+            connection.close()
+            raise
+
+    def claim_next_queued_job(self) -> Optional[Dict[str, Any]]:
+        """Prende in carico il prossimo upload in coda (o abbandonato dal job worker); None se non ce ne sono"""
+        connection = self.get_db_connection()
+        if not connection:
+            return None
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT id FROM upload_jobs
+                WHERE session_id IS NOT NULL AND (
+                    status = 'pending'
+                    OR (status = 'processing' AND updated_at < NOW() - INTERVAL %s SECOND)
+                )
+                ORDER BY id LIMIT 10
+            """, (STALE_JOB_SECONDS,))
+            candidates = [row['id'] for row in cursor.fetchall()]
+            job = None
+            # Con più worker un candidato può essere preso da un altro nel frattempo
+            for job_id in candidates:
+                job = self._claim(cursor, connection, job_id)
+                if job:
+                    break
+            cursor.close()
+            connection.close()
+            return job
+        except Error as e:
+            logger.error(f"Errore ricerca upload in coda: {e}")
+            connection.close()
+            return None
+
+    @staticmethod
+    def checkpoint(connection, job_id: int, claim_token: str, committed_rows: int, saved_delta: int) -> None:
+        """Avanza il checkpoint sulla connessione del chiamante, senza commit.
+
+        Va eseguito nella stessa transazione degli INSERT del blocco, così il
+        checkpoint non può mai essere più avanti o più indietro dei dati committati.
+        Solleva UploadJobLost se il job non è più di questo worker: committed_rows
+        cresce a ogni blocco, quindi nessuna riga aggiornata vuol dire token diverso.
+        """
+        cursor = connection.cursor()
+        cursor.execute("""
+            UPDATE upload_jobs
+            SET committed_rows = %s, saved_count = saved_count + %s, updated_at = NOW()
+            WHERE id = %s AND claim_token = %s
+        """, (committed_rows, saved_delta, job_id, claim_token))
+        owned = cursor.rowcount == 1
+        cursor.close()
+        if not owned:
+            raise UploadJobLost(f"Upload job {job_id} preso in carico da un altro worker")
+
+    def heartbeat(self, job_id: int, claim_token: str) -> bool:
+        """Rinnova il lease del job; False se non è più di questo worker"""
+        connection = self.get_db_connection()
+        if not connection:
+            return True
+        try:
+            cursor = connection.cursor()
+            cursor.execute("""
+                UPDATE upload_jobs SET updated_at = NOW()
+                WHERE id = %s AND claim_token = %s AND status = 'processing'
+            """, (job_id, claim_token))
+            # rowcount è 0 anche se updated_at non cambia nello stesso secondo: si rilegge il token
+            cursor.execute("SELECT claim_token, status FROM upload_jobs WHERE id = %s", (job_id,))
+            row = cursor.fetchone()
+            connection.commit()
+            cursor.close()
+            connection.close()
+            return row is not None and row[0] == claim_token and row[1] == 'processing'
+        except Error as e:
+            logger.error(f"Errore heartbeat upload job {job_id}: {e}")
+            connection.close()
+            return True
+
+    @contextmanager
+    def keep_alive(self, job: Dict[str, Any]):
+        """Rinnova il lease ogni HEARTBEAT_SECONDS finché il blocco è in esecuzione.
+
+        Copre le fasi lunghe che non scrivono checkpoint (parsing, LOAD DATA,
+        UPDATE di categorizzazione e dedup): senza heartbeat un retry potrebbe
+        riprendere il job mentre questo worker lo sta ancora elaborando.
+        """
+        stop = threading.Event()
+
+        def beat():
+            while not stop.wait(HEARTBEAT_SECONDS):
+                if not self.heartbeat(job['id'], job['claim_token']):
+                    logger.warning(f"Upload job {job['id']} preso in carico da un altro worker")
+                    return
+
+        thread = threading.Thread(target=beat, name=f"upload-job-{job['id']}-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+
+    def set_total_rows(self, job: Dict[str, Any], total_rows: int, rejected_count: int) -> None:
+        """Registra il numero di righe valide e scartate del file"""
+        self._update(job, "total_rows = %s, rejected_count = %s", (total_rows, rejected_count))
+
+    def complete_job(self, job: Dict[str, Any], result: Dict[str, Any]) -> bool:
+        """Segna il job come completato e salva la risposta da restituire ai retry"""
+        completed = self._update(job, "status = 'completed', result = %s, error = NULL, claim_token = NULL",
+                                 (json.dumps(result, default=str),))
+        if not completed:
+            logger.warning(f"Upload job {job['id']} non completato: preso in carico da un altro worker")
+        return completed
+
+    def fail_job(self, job: Dict[str, Any], error: str) -> bool:
+        """Segna il job come fallito; il checkpoint resta per la ripresa"""
+        return self._update(job, "status = 'failed', error = %s, claim_token = NULL", (error[:2000],))
+
+    def _update(self, job: Dict[str, Any], assignments: str, params: tuple) -> bool:
+        """Aggiorna il job solo se è ancora di questo worker (stesso claim_token).
+
+        Restituisce True se la riga è cambiata.
+        """
+        connection = self.get_db_connection()
+        if not connection:
+            return False
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"UPDATE upload_jobs SET {assignments} WHERE id = %s AND claim_token = %s",
+                           params + (job['id'], job['claim_token']))
+            updated = cursor.rowcount == 1
+            connection.commit()
+            cursor.close()
+            connection.close()
+            return updated
+        except Error as e:
+            logger.error(f"Errore aggiornamento upload job {job['id']}: {e}")
+            connection.close()
+            return False
+
+    def get_job(self, user_id: int, job_id: int) -> Optional[Dict[str, Any]]:
+        """Stato di un job dell'utente"""
+        connection = self.get_db_connection()
+        if not connection:
+            return None
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(f"SELECT {JOB_FIELDS} FROM upload_jobs WHERE id = %s AND user_id = %s",
+                           (job_id, user_id))
+            job = self._format_job(cursor.fetchone())
+            cursor.close()
+            connection.close()
+            return job
+        except Error as e:
+            logger.error(f"Errore recupero upload job {job_id}: {e}")
+            connection.close()
+            return None
+
+    def find_job(self, user_id: int, idempotency_key: str) -> Optional[Dict[str, Any]]:
+        """Job dell'utente con questa idempotency key"""
+        connection = self.get_db_connection()
+        if not connection:
+            return None
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute(f"SELECT {JOB_FIELDS} FROM upload_jobs WHERE user_id = %s AND idempotency_key = %s",
+                           (user_id, idempotency_key))
+            job = self._format_job(cursor.fetchone())
+            cursor.close()
+            connection.close()
+            return job
+        except Error as e:
+            logger.error(f"Errore ricerca upload job: {e}")
+            connection.close()
+            return None
+
+    def list_jobs(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Ultimi job dell'utente, senza il risultato completo"""
+        connection = self.get_db_connection()
+        if not connection:
+            return []
+        try:
+            cursor = connection.cursor(dictionary=True)
+            cursor.execute("""
+                SELECT id, idempotency_key, status, filename, total_rows, committed_rows,
+                       saved_count, rejected_count, error, created_at, updated_at
+                FROM upload_jobs WHERE user_id = %s
+                ORDER BY created_at DESC LIMIT %s
+            """, (user_id, limit))
+            jobs = cursor.fetchall()
+            cursor.close()
+            connection.close()
+            return jobs
+        except Error as e:
+            logger.error(f"Errore lista upload job: {e}")
+            connection.close()
+            return []
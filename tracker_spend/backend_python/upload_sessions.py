@@ -0,0 +1,238 @@
+"""Upload a blocchi: init -> PUT dei blocchi con offset -> finalize.
+
+Il file viene assemblato su disco un blocco alla volta, leggendo il corpo
+della richiesta a pezzi da UPLOAD_COPY_BUFFER byte: la memoria del worker non
+dipende dalla dimensione del file né da quella del blocco, quindi il limite
+UPLOAD_MAX_BYTES può essere molto più alto di quello dell'upload multipart.
+
+Lo stato di una sessione è tutto su disco (UPLOAD_SESSION_DIR/<id>/):
+meta.json con i dati dichiarati all'init e data.csv/data.xlsx con i byte
+ricevuti. I byte ricevuti sono la dimensione del file dati, quindi non c'è
+un contatore da tenere allineato e un blocco rimandato dopo un timeout
+sovrascrive gli stessi byte.
+Con più worker UPLOAD_SESSION_DIR deve essere condivisa tra i processi (stesso
+host o volume condiviso).
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import Dict, Any, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+UPLOAD_SESSION_DIR = os.environ.get(
+    'UPLOAD_SESSION_DIR', os.path.join(tempfile.gettempdir(), 'tracker_spend_uploads')
+)
+UPLOAD_MAX_BYTES = int(os.environ.get('UPLOAD_MAX_BYTES', 200 * 1024 * 1024))
+UPLOAD_CHUNK_BYTES = int(os.environ.get('UPLOAD_CHUNK_BYTES', 8 * 1024 * 1024))
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 60 * 60))
+
+# Il corpo di un PUT viene copiato su disco a pezzi di questa dimensione
+UPLOAD_COPY_BUFFER = 64 * 1024
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+_SESSION_ID = re.compile(r'^[0-9a-f]{32}$')
+_SHA256 = re.compile(r'^[0-9a-f]{64}$')
+
+class UploadSessionError(Exception):
+    """Richiesta non valida per la sessione; `status` è lo status HTTP da restituire"""
+
+    def __init__(self, message: str, status: int = 400, **details):
+        super().__init__(message)
+        self.status = status
+        self.details = details
+
+class UploadSessionStore:
+    """Sessioni di upload a blocchi salvate in una directory"""
+
+    def __init__(self, root: str = UPLOAD_SESSION_DIR, max_bytes: int = UPLOAD_MAX_BYTES,
+                 chunk_bytes: int = UPLOAD_CHUNK_BYTES, ttl: int = UPLOAD_SESSION_TTL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.chunk_bytes = chunk_bytes
+        self.ttl = ttl
+
+    def _dir(self, session_id: str) -> str:
+        # L'id finisce in un path: solo esadecimale, niente '..' o separatori
+        if not _SESSION_ID.match(session_id or ''):
+            raise UploadSessionError('Sessione di upload non trovata', 404)
+        return os.path.join(self.root, session_id)
+
+    def _data_path(self, meta: Dict[str, Any]) -> str:
+        return os.path.join(self._dir(meta['session_id']), meta['data_file'])
+
+    def create(self, user_id: int, filename: str, size: int, sha256: Optional[str] = None,
+               mode: str = 'partial', idempotency_key: Optional[str] = None,
+               skip_duplicates: bool = True) -> Dict[str, Any]:
+        """Apre una sessione per un file di `size` byte"""
+        if not filename or not filename.lower().endswith(SUPPORTED_EXTENSIONS):
+            raise UploadSessionError('Solo file CSV e Excel (.csv, .xlsx, .xls) sono supportati')
+        if not isinstance(size, int) or size <= 0:
+            raise UploadSessionError('Dimensione del file mancante o non valida')
+        if size > self.max_bytes:
+            raise UploadSessionError(f"File troppo grande (massimo {self.max_bytes} byte)", 413,
+                                     max_bytes=self.max_bytes)
+        if sha256 is not None and not _SHA256.match(sha256.lower()):
+            raise UploadSessionError('sha256 non valido: atteso esadecimale di 64 caratteri')
+
+        self.purge_expired()
+
+        session_id = uuid.uuid4().hex
+        directory = self._dir(session_id)
+        os.makedirs(directory)
+        meta = {
+            'session_id': session_id,
+            # Il parser riconosce Excel dall'estensione del path
+            'data_file': 'data.csv' if filename.lower().endswith('.csv') else 'data.xlsx',
+            'user_id': user_id,
+            'filename': os.path.basename(filename)[:255],
+            'size': size,
+            'sha256': sha256.lower() if sha256 else None,
+            'mode': mode,
+            'skip_duplicates': skip_duplicates,
+            'idempotency_key': idempotency_key,
+            'created_at': time.time()
+        }
+        open(self._data_path(meta), 'wb').close()
+        with open(os.path.join(directory, 'meta.json'), 'w') as file:
+            json.dump(meta, file)
+        return self._describe(meta)
+
+    def get(self, user_id: int, session_id: str) -> Dict[str, Any]:
+        """Sessione dell'utente con i byte ricevuti (per riprendere dal primo mancante)"""
+        return self._describe(self._load(user_id, session_id))
+
+    def _load(self, user_id: int, session_id: str) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self._dir(session_id), 'meta.json')) as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            raise UploadSessionError('Sessione di upload non trovata', 404)
+        # Le sessioni di altri utenti non esistono, per chi chiede
+        if meta['user_id'] != user_id:
+            raise UploadSessionError('Sessione di upload non trovata', 404)
+        return meta
+
+    def _touch(self, meta: Dict[str, Any]) -> None:
+        """Segna attività sulla sessione: la scadenza conta dall'ultima attività"""
+        os.utime(os.path.join(self._dir(meta['session_id']), 'meta.json'))
+
+    def _describe(self, meta: Dict[str, Any]) -> Dict[str, Any]:
+        received = os.path.getsize(self._data_path(meta))
+        last_activity = os.path.getmtime(os.path.join(self._dir(meta['session_id']), 'meta.json'))
+        return {
+            'session_id': meta['session_id'],
+            'filename': meta['filename'],
+            'size': meta['size'],
+            'received': received,
+            'complete': received == meta['size'],
+            'chunk_size': self.chunk_bytes,
+            'mode': meta['mode'],
+            # Le sessioni aperte prima dell'opzione avevano sempre il dedup
+            'skip_duplicates': meta.get('skip_duplicates', True),
+            'expires_at': int(last_activity + self.ttl)
+        }
+
+    def write_chunk(self, user_id: int, session_id: str, offset: int, length: Optional[int],
+                    stream) -> Dict[str, Any]:
+        """Scrive `length` byte letti da `stream` a partire da `offset`.
+
+        L'offset può ripetere un blocco già ricevuto (retry dopo un timeout) ma
+        non lasciare buchi: deve essere al massimo uguale ai byte ricevuti.
+        """
+        meta = self._load(user_id, session_id)
+        if length is None:
+            raise UploadSessionError('Content-Length richiesto', 411)
+        if length <= 0 or length > self.chunk_bytes:
+            raise UploadSessionError(f"Blocco non valido (massimo {self.chunk_bytes} byte)", 413,
+                                     chunk_size=self.chunk_bytes)
+        if offset < 0 or offset + length > meta['size']:
+            raise UploadSessionError('Il blocco supera la dimensione dichiarata del file', 416,
+                                     size=meta['size'])
+
+        self._touch(meta)
+        with open(self._data_path(meta), 'r+b') as file:
+            # Due PUT concorrenti sulla stessa sessione si serializzano qui
+            if fcntl is not None:
+                fcntl.flock(file, fcntl.LOCK_EX)
+            received = os.fstat(file.fileno()).st_size
+            if offset > received:
+                raise UploadSessionError('Offset oltre i byte ricevuti', 409, received=received)
+
+            file.seek(offset)
+            remaining = length
+            while remaining > 0:
+                block = stream.read(min(UPLOAD_COPY_BUFFER, remaining))
+                if not block:
+                    break
+                file.write(block)
+                remaining -= len(block)
+            file.flush()
+
+        described = self._describe(meta)
+        if remaining:
+            # Connessione interrotta: i byte arrivati restano, il client riparte da `received`
+            raise UploadSessionError('Blocco incompleto', 400, received=described['received'])
+        return described
+
+    def verify(self, user_id: int, session_id: str, sha256: Optional[str] = None) -> Dict[str, Any]:
+        """Controlla che il file sia completo e che lo sha256 coincida.
+
+        Restituisce i metadati della sessione con `path` del file assemblato.
+        """
+        meta = self._load(user_id, session_id)
+        self._touch(meta)
+        expected = (sha256 or meta['sha256'] or '').lower()
+        if not expected:
+            raise UploadSessionError('sha256 richiesto (all\'init o al finalize)')
+        if meta['sha256'] and sha256 and meta['sha256'] != sha256.lower():
+            raise UploadSessionError('sha256 diverso da quello dichiarato all\'init', 409)
+
+        path = self._data_path(meta)
+        received = os.path.getsize(path)
+        if received != meta['size']:
+            raise UploadSessionError('File incompleto', 409, received=received, size=meta['size'])
+
+        actual = file_sha256(path)
+        if actual != expected:
+            raise UploadSessionError('Checksum non corrispondente: rimandare il file', 422,
+                                     expected=expected, actual=actual)
+        return {**meta, 'sha256': actual, 'path': path}
+
+    def delete(self, session_id: str) -> None:
+        shutil.rmtree(self._dir(session_id), ignore_errors=True)
+
+    def purge_expired(self) -> int:
+        """Rimuove le sessioni senza attività (blocchi, finalize) da UPLOAD_SESSION_TTL"""
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - self.ttl
+        purged = 0
+        for entry in os.scandir(self.root):
+            if not entry.is_dir() or not _SESSION_ID.match(entry.name):
+                continue
+            try:
+                expired = os.path.getmtime(os.path.join(entry.path, 'meta.json')) < cutoff
+            except OSError:
+                expired = True
+            if expired:
+                shutil.rmtree(entry.path, ignore_errors=True)
+                purged += 1
+        return purged
+
+def file_sha256(path: str) -> str:
+    """sha256 esadecimale di un file, letto a blocchi da 1 MiB"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
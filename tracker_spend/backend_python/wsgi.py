@@ -0,0 +1,20 @@
+"""Entry point WSGI per la produzione: gunicorn -c gunicorn.conf.py wsgi:app
+
+L'app (e il controllo della versione dello schema, che apre una connessione
+MySQL) viene creata qui e non all'import di app.py: test e script usano
+create_app(check_schema=False) senza toccare il database.
+"""
+import logging
+
+from app import create_app
+from import_pipeline import prepare_bulk_load_dir, BulkLoadUnavailable
+
+app = create_app()
+
+try:
+    prepare_bulk_load_dir()
+except BulkLoadUnavailable as e:
+    # Gli upload grandi useranno il salvataggio riga per riga
+    logging.getLogger(__name__).error(str(e))
+
+__all__ = ['app']
@@ -61,6 +61,7 @@ CREATE TABLE IF NOT EXISTS budgets (
     start_date DATE NOT NULL,
     end_date DATE,
     is_active BOOLEAN DEFAULT TRUE,
+    spent_amount DECIMAL(10,2) NOT NULL DEFAULT 0.00,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
@@ -128,8 +129,10 @@ INSERT IGNORE INTO categories (name, description, type, color, icon, is_default)
 ('Altri', 'Altre spese', 'expense', '#607D8B', 'more_horiz', TRUE);
 
 -- Create indexes for better performance
-CREATE INDEX idx_transactions_user_date ON transactions(user_id, transaction_date);
-CREATE INDEX idx_transactions_category ON transactions(category_id);
+-- Gli altri indici di transactions (idx_user_type_date, idx_user_category_date)
+-- li crea backend_python/migrations.py: dopo l'inizializzazione eseguire
+-- `python migrations.py upgrade`, come fa start.sh a ogni avvio
+CREATE INDEX idx_user_date ON transactions(user_id, transaction_date);
 CREATE INDEX idx_budgets_user_period ON budgets(user_id, period);
 CREATE INDEX idx_goals_user_status ON goals(user_id, status);
 CREATE INDEX idx_user_sessions_token ON user_sessions(token);
@@ -514,8 +514,30 @@ export class ApiService {
     });
   }
 
-  static async exportTransactions(): Promise<ApiResponse<{ filePath: string }>> {
-    return this.request('/transactions/export');
+  static async exportTransactions(format: 'csv' | 'xlsx' | 'parquet' = 'csv'): Promise<ApiResponse<{ filePath: string }>> {
+    try {
+      const token = localStorage.getItem('authToken') || sessionStorage.getItem('authToken');
+      const response = await fetch(`${API_BASE_URL}/transactions/export?format=${format}`, {
+        headers: { 'Authorization': `Bearer ${token}` },
+      });
+
+      if (!response.ok) {
+        const errorData = await response.json().catch(() => ({}));
+        return { error: errorData.error || `HTTP ${response.status}` };
+      }
+
+      // Download the streamed file
+      const filePath = `transactions.${format}`;
+      const blob = await response.blob();
+      const link = document.createElement('a');
+      link.href = URL.createObjectURL(blob);
+      link.download = filePath;
+      link.click();
+      URL.revokeObjectURL(link.href);
+      return { data: { filePath } };
+    } catch (error) {
+      return { error: error instanceof Error ? error.message : 'Unknown error' };
+    }
   }
 
   static async getBudgetStatistics(id: string): Promise<ApiResponse<any>> {
@@ -525,6 +547,12 @@ export class ApiService {
   static async getBudgetRecommendations(id: string): Promise<ApiResponse<any>> {
     return this.request(`/budgets/${id}/recommendations`);
   }
+
+  // Progress, statistics and recommendations for many budgets in one request
+  static async getBudgetsProgress(ids?: number[]): Promise<ApiResponse<any[]>> {
+    const query = ids && ids.length ? `?ids=${ids.join(',')}` : '';
+    return this.request(`/budgets/progress${query}`);
+  }
 }
 
 // Hook per gestire lo stato di connessione
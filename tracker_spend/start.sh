@@ -11,6 +11,10 @@ if [ ! -d "frontend/dist" ]; then
     cd ..
 fi
 
-# Avvia il backend
+# Applica le migrazioni dello schema prima di avviare l'app
+echo "🗄️ Applying database migrations..."
+python3 backend_python/migrations.py upgrade || exit 1
+
+# Avvia il backend: job worker, gunicorn e hypercorn (vedi backend_python/serve.sh)
 echo "🐍 Starting Python backend..."
-python3 backend_python/app.py
+exec bash backend_python/serve.sh